@@ -44,9 +44,12 @@ INSTALLED_APPS = [
     'django.contrib.humanize',
 
     'ledger.apps.LedgerConfig',
+    'outline.apps.OutlineConfig',
 ]
 
 MIDDLEWARE = [
+    # opt in with REQUEST_PROFILING below
+    'ledger.profiling.RequestProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -90,6 +93,19 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# holds the rendered account trees; entries are versioned per company, so each server process may keep its
+# own. Use 'django.core.cache.backends.filebased.FileBasedCache' with a directory LOCATION to share them.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ledger',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -134,3 +150,34 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Per-request query count and SQL/template/Python timings in a Server-Timing header, an in-page panel
+# and a rolling JSON log (summarize it with `python manage.py profile_summary`); set REQUEST_PROFILING=1 in .env
+REQUEST_PROFILING = os.environ.get('REQUEST_PROFILING') == '1'
+REQUEST_PROFILE_LOG = BASE_DIR / 'request_profile.jsonl'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '{message}', 'style': '{'},
+    },
+    'handlers': {
+        'request_profile': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': REQUEST_PROFILE_LOG,
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 3,
+            'formatter': 'message',
+            # the file is only created once a request is profiled
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'ledger.profiling': {
+            'handlers': ['request_profile'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,69 @@
+import csv
+import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Iterator, NamedTuple
+
+from .models import Account, Detail
+
+ACTIVITY_PAGE_SIZE = 100
+
+
+class ActivityCursor(NamedTuple):
+    # position of the last row of a page and the running balance at that row
+    date: datetime.date
+    pk: int
+    balance: Decimal
+
+    def encode(self) -> str:
+        return f'{self.date.isoformat()}_{self.pk}_{self.balance}'
+
+    @classmethod
+    def decode(cls, value: str) -> 'ActivityCursor':
+        try:
+            date, pk, balance = value.split('_')
+            return cls(datetime.date.fromisoformat(date), int(pk), Decimal(balance))
+        except (ValueError, InvalidOperation):
+            raise ValueError(f'Invalid activity cursor: {value!r}')
+
+
+def get_activity_page(
+    account: Account,
+    cursor: ActivityCursor | None = None,
+    page_size: int = ACTIVITY_PAGE_SIZE,
+    until: datetime.date | None = None,
+) -> tuple[list[Detail], ActivityCursor | None]:
+    """Return one page of account activity up to `until` and the cursor for the next page (None on the last page)."""
+    if cursor is None:
+        activity = account.get_activity(until=until)
+    else:
+        activity = account.get_activity(after=(cursor.date, cursor.pk), opening_balance=cursor.balance, until=until)
+
+    rows = list(activity[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, ActivityCursor(last.transaction.date, last.pk, last.running_balance)
+
+
+class Echo:
+    # file-like object for csv.writer that hands each written line straight back
+    def write(self, value: str) -> str:
+        return value
+
+
+def iter_activity_csv(account: Account, chunk_size: int = 2000) -> Iterator[str]:
+    """Yield the full activity of an account as CSV lines, streaming rows from a server-side iterator."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(['Account', 'Date', 'Credit', 'Debit', 'Balance', 'Notes', 'Transaction'])
+    for row in account.get_activity().iterator(chunk_size=chunk_size):
+        yield writer.writerow([
+            str(row.account),
+            row.transaction.date.isoformat(),
+            row.credit,
+            row.debit,
+            row.running_balance,
+            row.notes or '',
+            row.transaction_id,
+        ])
@@ -0,0 +1,156 @@
+import json
+from decimal import Decimal, InvalidOperation
+from typing import Any
+
+from django.core.exceptions import ValidationError
+from django.http import HttpRequest, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_GET, require_POST
+
+from .caching import cached_account_tree
+from .models import Company
+from .money import CENT
+from .posting import DetailEntry, TransactionEntry, post_transactions
+from .tree import AccountNode
+from .views import parse_as_of
+
+# no whitespace between tokens
+COMPACT_JSON = {'separators': (',', ':')}
+# Detail amounts are MoneyField(max_digits=12): ten integer digits and cents
+MAX_AMOUNT = Decimal(10) ** 10
+# largest BigAutoField primary key; bigger ids overflow the SQL parameter
+MAX_PK = 2 ** 63 - 1
+ACCOUNT_FIELDS = ['id', 'parent', 'key', 'description', 'kind', 'balance']
+
+
+def error_response(messages: list[str], status: int = 400) -> JsonResponse:
+    return JsonResponse({'errors': messages}, status=status, json_dumps_params=COMPACT_JSON)
+
+
+def parse_amount(value: Any) -> Decimal:
+    # numbers arrive as Decimal (floats are parsed as Decimal), int or string
+    if isinstance(value, bool) or not isinstance(value, (Decimal, int, str)):
+        raise ValidationError(f'Invalid amount: {value!r}')
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        raise ValidationError(f'Invalid amount: {value!r}')
+    if not amount.is_finite() or amount.as_tuple().exponent < -2 or abs(amount) >= MAX_AMOUNT:
+        raise ValidationError(f'Invalid amount: {value!r}')
+    return amount
+
+
+def parse_account(value: Any) -> int:
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValidationError('Every detail line needs an integer "account".')
+    if not 0 < value <= MAX_PK:
+        raise ValidationError(f'Unknown account: {value}')
+    return value
+
+
+def parse_notes(value: Any) -> str | None:
+    if value is not None and not isinstance(value, str):
+        raise ValidationError('"notes" must be a string.')
+    return value or None
+
+
+def parse_transaction(data: Any) -> TransactionEntry:
+    if not isinstance(data, dict):
+        raise ValidationError('A transaction must be an object.')
+    try:
+        date = parse_date(data['date']) if isinstance(data.get('date'), str) else None
+    except ValueError:
+        date = None
+    if date is None:
+        raise ValidationError('A transaction needs a "date" (YYYY-MM-DD).')
+    if not isinstance(data.get('details'), list):
+        raise ValidationError('A transaction needs a "details" array.')
+
+    details = []
+    for line in data['details']:
+        if not isinstance(line, dict):
+            raise ValidationError('Every detail line must be an object.')
+        details.append(DetailEntry(
+            account_id=parse_account(line.get('account')),
+            debit=parse_amount(line.get('debit', 0)),
+            credit=parse_amount(line.get('credit', 0)),
+            notes=parse_notes(line.get('notes')),
+        ))
+    return TransactionEntry(date=date, details=details, notes=parse_notes(data.get('notes')))
+
+
+def parse_transactions(body: bytes) -> list[TransactionEntry]:
+    """Parse a JSON array of transactions; raises ValidationError with one message per bad entry."""
+    try:
+        data = json.loads(body, parse_float=Decimal)
+    except ValueError as e:
+        raise ValidationError(f'Invalid JSON: {e}')
+    if not isinstance(data, list) or not data:
+        raise ValidationError('Expected a non-empty array of transactions.')
+
+    entries = []
+    errors = []
+    for number, item in enumerate(data, start=1):
+        try:
+            entries.append(parse_transaction(item))
+        except ValidationError as e:
+            errors.append(ValidationError(f'Entry {number}: {"; ".join(e.messages)}'))
+    if errors:
+        raise ValidationError(errors)
+    return entries
+
+
+# API view to post an array of transactions at once. Scripts have no CSRF token, so the body must be declared as
+# JSON instead: browsers only send that content type cross-site after a CORS preflight, which this app never grants
+@csrf_exempt
+@require_POST
+def submit_transactions(request: HttpRequest, company_pk: int) -> JsonResponse:
+    if request.content_type != 'application/json':
+        return error_response(['Transactions must be sent with Content-Type: application/json.'], status=415)
+    company = get_object_or_404(Company, pk=company_pk)
+    try:
+        transactions = post_transactions(company, parse_transactions(request.body))
+    except ValidationError as e:
+        return error_response(e.messages)
+
+    return JsonResponse({'transactions': [transaction.pk for transaction in transactions]}, status=201, json_dumps_params=COMPACT_JSON)
+
+
+def account_tree_etag(request: HttpRequest, company_pk: int) -> str | None:
+    # the tree only changes with the company's tree version; bad dates and unknown companies get no ETag
+    version = Company.objects.filter(pk=company_pk).values_list('tree_version', flat=True).first()
+    try:
+        as_of = parse_as_of(request)
+    except ValueError:
+        return None
+    if version is None:
+        return None
+    return f'{version}-{as_of.isoformat() if as_of else "current"}'
+
+
+def account_rows(nodes: list[AccountNode], parent_id: int | None = None) -> list[list[Any]]:
+    # parents before children, in ACCOUNT_FIELDS order
+    rows = []
+    for node in nodes:
+        account = node.account
+        rows.append([account.pk, parent_id, account.key, account.description, account.kind, node.balance.quantize(CENT)])
+        rows.extend(account_rows(node.children, account.pk))
+    return rows
+
+
+# API view of every account with its subtree balance; answers 304 when If-None-Match still matches
+@require_GET
+@condition(etag_func=account_tree_etag)
+def account_tree(request: HttpRequest, company_pk: int) -> JsonResponse:
+    company = get_object_or_404(Company, pk=company_pk)
+    try:
+        as_of = parse_as_of(request)
+    except ValueError as e:
+        return error_response([str(e)])
+
+    return JsonResponse(
+        {'as_of': as_of, 'fields': ACCOUNT_FIELDS, 'accounts': account_rows(cached_account_tree(company, as_of))},
+        json_dumps_params=COMPACT_JSON,
+    )
@@ -0,0 +1,147 @@
+from typing import Any, Iterable, NamedTuple
+
+from django.core.exceptions import ValidationError
+from django.db import transaction as db_transaction
+from django.db.models import Count, F, QuerySet, Sum
+
+from .models import Company, Detail, UserDefinedAttribute, UserDefinedAttributeDetailThrough, UserDefinedAttributeItem
+from .money import Money
+
+Kind = UserDefinedAttribute.AttributeKind
+
+# operator -> field lookup on the typed column
+FILTER_LOOKUPS = {
+    'eq': 'exact',
+    'lt': 'lt',
+    'lte': 'lte',
+    'gt': 'gt',
+    'gte': 'gte',
+    'has': 'exact',
+}
+# operators that make sense for each kind; ARRAY values are matched element by element
+KIND_OPERATORS = {
+    Kind.TEXT: {'eq'},
+    Kind.CHOICE: {'eq'},
+    Kind.NUMBER: {'eq', 'lt', 'lte', 'gt', 'gte'},
+    Kind.DATE: {'eq', 'lt', 'lte', 'gt', 'gte'},
+    Kind.ARRAY: {'has'},
+}
+TYPED_COLUMNS = {
+    Kind.TEXT: 'text_value',
+    Kind.CHOICE: 'text_value',
+    Kind.NUMBER: 'number_value',
+    Kind.DATE: 'date_value',
+}
+REBUILD_CHUNK_SIZE = 2000
+# matching lines listed on the attribute report; the totals always cover all of them
+ATTRIBUTE_REPORT_LINES = 100
+
+
+class AttributeFilter(NamedTuple):
+    attribute: UserDefinedAttribute
+    # a key of FILTER_LOOKUPS
+    operator: str
+    # as a user would enter it; ARRAY filters take a single element
+    value: str
+
+
+def build_items(values: Iterable[UserDefinedAttributeDetailThrough]) -> list[UserDefinedAttributeItem]:
+    # one row per element of saved ARRAY values; call set_typed_value first
+    items = []
+    for value in values:
+        if value.attribute.kind != Kind.ARRAY:
+            continue
+        try:
+            elements = value.attribute.parse_value(value.value).items
+        except ValidationError:
+            continue
+        items.extend(UserDefinedAttributeItem(value=value, attribute_id=value.attribute_id, item=element) for element in elements)
+    return items
+
+
+def bulk_create_attribute_values(values: list[UserDefinedAttributeDetailThrough], batch_size: int = 1000) -> None:
+    """bulk_create attribute values with their typed columns and array items; `attribute` must be loaded on each."""
+    for value in values:
+        value.set_typed_value()
+    with db_transaction.atomic():
+        UserDefinedAttributeDetailThrough.objects.bulk_create(values, batch_size=batch_size)
+        UserDefinedAttributeItem.objects.bulk_create(build_items(values), batch_size=batch_size)
+
+
+def rebuild_attribute_values(attributes: Iterable[UserDefinedAttribute] | None = None) -> None:
+    """Recompute the typed columns and array items of some attributes' values (default all), e.g. after a restore."""
+    values = UserDefinedAttributeDetailThrough.objects.select_related('attribute').order_by('pk')
+    items = UserDefinedAttributeItem.objects.all()
+    if attributes is not None:
+        attribute_ids = [attribute.pk for attribute in attributes]
+        values = values.filter(attribute__in=attribute_ids)
+        items = items.filter(attribute__in=attribute_ids)
+
+    with db_transaction.atomic():
+        items.delete()
+        # keyset chunks rather than iterator(): SQLite does not isolate a read cursor from writes to its table
+        last_pk = 0
+        while chunk := list(values.filter(pk__gt=last_pk)[:REBUILD_CHUNK_SIZE]):
+            for value in chunk:
+                value.set_typed_value()
+            # `modified` is left alone: typed columns are derived, backups need not pick the rows up again
+            UserDefinedAttributeDetailThrough.objects.bulk_update(chunk, ['text_value', 'number_value', 'date_value'])
+            UserDefinedAttributeItem.objects.bulk_create(build_items(chunk))
+            last_pk = chunk[-1].pk
+
+
+def matching_detail_ids(attribute_filter: AttributeFilter) -> QuerySet:
+    """Ids of the details an attribute filter matches, as a subquery that is a single index range scan."""
+    attribute, operator, raw = attribute_filter
+    if operator not in KIND_OPERATORS[attribute.kind]:
+        raise ValidationError(f'{attribute.name} cannot be filtered with {operator!r}.')
+
+    lookup = FILTER_LOOKUPS[operator]
+    if attribute.kind == Kind.ARRAY:
+        return UserDefinedAttributeItem.objects.filter(attribute=attribute, **{f'item__{lookup}': raw}).values('value__detail_id')
+
+    typed = attribute.parse_value(raw)
+    column = TYPED_COLUMNS[attribute.kind]
+    operand = {'text_value': typed.text, 'number_value': typed.number, 'date_value': typed.date}[column]
+    return UserDefinedAttributeDetailThrough.objects.filter(attribute=attribute, **{f'{column}__{lookup}': operand}).values('detail_id')
+
+
+def filter_details(company: Company, filters: Iterable[AttributeFilter]) -> QuerySet[Detail]:
+    """Details of a company matching every filter. Raises ValidationError for a value or operator that does not fit."""
+    filters = list(filters)
+    if not filters:
+        return Detail.objects.filter(transaction__company=company)
+
+    # attribute values only tag details of their attribute's company (UserDefinedAttributeDetailThrough.clean), so
+    # the filters select the company; a company condition would make SQLite scan all of its transactions instead
+    details = Detail.objects.all()
+    for attribute_filter in filters:
+        if attribute_filter.attribute.company_id != company.pk:
+            raise ValidationError(f'{attribute_filter.attribute.name} belongs to another company.')
+        details = details.filter(pk__in=matching_detail_ids(attribute_filter))
+    return details
+
+
+def summarize_details(details: QuerySet[Detail], group_by: UserDefinedAttribute | None = None) -> list[dict[str, Any]]:
+    """
+    Line count and debit/credit totals of some details, computed in SQL.
+
+    With `group_by`, one row per value of that attribute (per element for ARRAY attributes, so a line
+    tagged twice counts in both groups), smallest value first; lines without the attribute are left out.
+    """
+    totals = {'lines': Count('pk'), 'debit': Sum('debit'), 'credit': Sum('credit')}
+    if group_by is None:
+        row = details.aggregate(**totals)
+        return [{'group': None, 'lines': row['lines'], 'debit': row['debit'] or Money(0), 'credit': row['credit'] or Money(0)}]
+
+    if group_by.kind == Kind.ARRAY:
+        rows = UserDefinedAttributeItem.objects.filter(attribute=group_by, value__detail__in=details).values(group=F('item'))
+        prefix = 'value__detail__'
+    else:
+        rows = UserDefinedAttributeDetailThrough.objects.filter(attribute=group_by, detail__in=details).values(group=F(TYPED_COLUMNS[group_by.kind]))
+        prefix = 'detail__'
+    return list(
+        rows
+        .annotate(lines=Count('pk'), debit=Sum(f'{prefix}debit'), credit=Sum(f'{prefix}credit'))
+        .order_by('group')
+    )
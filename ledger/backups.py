@@ -0,0 +1,280 @@
+import bisect
+import datetime
+import gzip
+import itertools
+import json
+from pathlib import Path
+from typing import IO, Any, Iterable, Iterator
+
+from django.apps import apps
+from django.core import serializers
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, models
+from django.db import transaction as db_transaction
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
+
+from .attributes import rebuild_attribute_values
+from .balances import rebuild_balance_snapshots
+from .caching import bump_tree_version
+from .history import rebuild_balance_history, write_checkpoints
+from .models import Company
+from .tree import rebuild_account_links
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst', 'none': ''}
+CHUNK_SIZE = 2000
+# `modified` is set when a row is saved, not when it commits: an increment starts this long before the previous
+# backup was taken so rows committed after that backup's snapshot are not skipped. Rows sent twice are replaced.
+INCREMENT_OVERLAP = datetime.timedelta(minutes=10)
+
+
+def open_backup(path: Path, mode: str) -> IO[str]:
+    """Open a backup file for text reading ('rt') or writing ('wt'), compressed according to its suffix."""
+    match path.suffix:
+        case '.gz':
+            return gzip.open(path, mode, encoding='utf-8')
+        case '.zst':
+            if zstandard is None:
+                raise ImproperlyConfigured('zstd compressed backups need the zstandard package.')
+            return zstandard.open(path, mode, encoding='utf-8')
+        case _:
+            return path.open(mode[0], encoding='utf-8')
+
+
+def backup_models() -> list[type[models.Model]]:
+    """
+    Return the models a backup holds: every installed model with a `modified` timestamp, apps in INSTALLED_APPS
+    order and models in definition order, which puts dependencies first.
+
+    Derived tables (AccountBalance, AccountClosure, AccountPeriodDelta, BalanceCheckpoint and
+    UserDefinedAttributeItem) have no timestamp and are rebuilt on restore.
+    """
+    return [model for model in apps.get_models() if any(field.name == 'modified' for field in model._meta.concrete_fields)]
+
+
+def write_line(stream: IO[str], data: dict[str, Any]) -> None:
+    stream.write(json.dumps(data, cls=DjangoJSONEncoder) + '\n')
+
+
+def is_jsonl_backup(path: Path) -> bool:
+    return '.jsonl' in path.suffixes
+
+
+def read_backup_header(path: Path) -> dict[str, Any]:
+    with open_backup(path, 'rt') as stream:
+        return json.loads(stream.readline())['meta']
+
+
+def list_backups(directory: Path) -> list[Path]:
+    """Return the JSON Lines backups in a directory, oldest first."""
+    backups = [path for path in directory.glob('*.jsonl*') if path.is_file()]
+    return sorted(backups, key=lambda path: read_backup_header(path)['taken_at'])
+
+
+def backup_chain(path: Path) -> list[Path]:
+    """Return the full backup that `path` builds on followed by every increment up to `path`."""
+    if not is_jsonl_backup(path):
+        # dumpdata style backups and fixtures stand on their own
+        return [path]
+
+    chain = [path]
+    while (base := read_backup_header(chain[0])['base']) is not None:
+        chain.insert(0, path.parent / base)
+    return chain
+
+
+def iter_json_array(stream: IO[str], buffer: str = '', read_size: int = 1 << 16) -> Iterator[dict[str, Any]]:
+    # incrementally decode the objects of a top level JSON array (dumpdata output) without loading the whole file
+    decoder = json.JSONDecoder()
+    started = False
+    while True:
+        buffer = buffer.lstrip()
+        if started and buffer.startswith(','):
+            buffer = buffer[1:].lstrip()
+        if not started and buffer.startswith('['):
+            started = True
+            buffer = buffer[1:].lstrip()
+        if started and buffer.startswith(']'):
+            return
+
+        try:
+            if not started or not buffer:
+                raise json.JSONDecodeError('Need more data', buffer, 0)
+            obj, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            more = stream.read(read_size)
+            if not more:
+                raise ValueError('Unexpected end of JSON backup.')
+            buffer += more
+            continue
+
+        yield obj
+        buffer = buffer[end:]
+
+
+def iter_backup_records(stream: IO[str]) -> Iterator[dict[str, Any]]:
+    """Yield the records of a JSON Lines backup or of a dumpdata style JSON array, one at a time."""
+    first = stream.read(1)
+    while first.isspace():
+        first = stream.read(1)
+
+    if first == '[':
+        yield from iter_json_array(stream, buffer=first)
+        return
+
+    for line in itertools.chain([first + stream.readline()], stream):
+        if line.strip():
+            yield json.loads(line)
+
+
+def pk_ranges(pks: Iterable[int]) -> list[list[int]]:
+    # run-length encode ascending primary keys as [first, last] pairs
+    ranges: list[list[int]] = []
+    for pk in pks:
+        if ranges and ranges[-1][1] + 1 == pk:
+            ranges[-1][1] = pk
+        else:
+            ranges.append([pk, pk])
+    return ranges
+
+
+def in_ranges(pk: int, ranges: list[list[int]], starts: list[int]) -> bool:
+    index = bisect.bisect_right(starts, pk) - 1
+    return index >= 0 and ranges[index][0] <= pk <= ranges[index][1]
+
+
+def write_backup(directory: Path, migration: str, incremental: bool = False, compression: str = 'gzip') -> Path:
+    """
+    Stream the ledger to a compressed JSON Lines file.
+
+    The first line holds the backup metadata; incremental backups only contain rows modified since the
+    previous backup was taken (less INCREMENT_OVERLAP). Every backup ends with the live primary keys of each
+    model so a restore can drop rows that were deleted in the meantime. All of it is read in one transaction,
+    so the rows and the live keys agree.
+    """
+    previous = since = None
+    if incremental:
+        backups = list_backups(directory)
+        if not backups:
+            raise FileNotFoundError(f'No previous backup in {directory} to build an incremental backup on.')
+        previous = backups[-1]
+        since = parse_datetime(read_backup_header(previous)['taken_at']) - INCREMENT_OVERLAP
+
+    kind = 'incremental' if incremental else 'full'
+    backed_up = backup_models()
+    with db_transaction.atomic():
+        # every read below sees the snapshot SQLite opens on the first one
+        taken_at = now()
+        path = directory / f'{migration[:4]}_{taken_at.isoformat()}_{kind}.jsonl{COMPRESSION_SUFFIXES[compression]}'
+        with open_backup(path, 'wt') as stream:
+            write_line(stream, {'meta': {
+                'kind': kind,
+                'migration': migration,
+                'taken_at': taken_at,
+                'since': since,
+                'base': previous.name if previous is not None else None,
+            }})
+            for model in backed_up:
+                queryset = model._base_manager.order_by('pk')
+                if since is not None:
+                    queryset = queryset.filter(modified__gte=since)
+                serializers.serialize('jsonl', queryset.iterator(chunk_size=CHUNK_SIZE), stream=stream)
+
+            for model in backed_up:
+                pks = model._base_manager.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=CHUNK_SIZE)
+                write_line(stream, {'live': model._meta.label_lower, 'pks': pk_ranges(pks)})
+
+    return path
+
+
+def insert_records(model: type[models.Model], records: list[dict[str, Any]]) -> None:
+    """
+    Write deserialized records with multi-row INSERTs, replacing rows that already exist.
+
+    Rows are inserted raw (like loaddata) so stored values such as `modified` are kept as they are.
+    """
+    objs = [deserialized.object for deserialized in serializers.deserialize('python', records, ignorenonexistent=True)]
+    fields = model._meta.concrete_fields
+    for field in fields:
+        # rows from backups taken before a timestamp field existed
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+            for obj in objs:
+                if getattr(obj, field.attname) is None:
+                    field.pre_save(obj, add=True)
+
+    model._base_manager.filter(pk__in=[obj.pk for obj in objs])._raw_delete(connection.alias)
+    batch_size = max(connection.ops.bulk_batch_size(fields, objs), 1)
+    for index in range(0, len(objs), batch_size):
+        model._base_manager._insert(objs[index:index + batch_size], fields=fields, raw=True, using=connection.alias)
+
+
+def restore_backups(paths: list[Path], chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Replay a full backup and its increments, then rebuild derived tables. Returns the number of rows written.
+
+    Records are buffered per model and flushed in dependency order every `chunk_size` records. Model signals
+    are skipped and foreign keys are only checked once everything has been written.
+    """
+    backed_up = backup_models()
+    models_by_label = {model._meta.label_lower: model for model in backed_up}
+    count = 0
+    with db_transaction.atomic(), connection.constraint_checks_disabled():
+        for path in paths:
+            live = {}
+            buffers: dict[type[models.Model], list[dict[str, Any]]] = {model: [] for model in backed_up}
+            buffered = 0
+
+            def flush() -> None:
+                for model, records in buffers.items():
+                    if records:
+                        insert_records(model, records)
+                        records.clear()
+
+            with open_backup(path, 'rt') as stream:
+                for record in iter_backup_records(stream):
+                    if 'meta' in record:
+                        continue
+                    if 'live' in record:
+                        live[record['live']] = record['pks']
+                        continue
+
+                    model = models_by_label.get(record['model'])
+                    if model is None:
+                        # derived tables are rebuilt below
+                        continue
+                    buffers[model].append(record)
+                    buffered += 1
+                    count += 1
+                    if buffered >= chunk_size:
+                        flush()
+                        buffered = 0
+            flush()
+
+            # drop rows that no longer existed when this backup was taken, dependants first
+            for label, ranges in reversed(list(live.items())):
+                model = models_by_label[label]
+                starts = [start for start, _ in ranges]
+                stale = [
+                    pk
+                    for pk in model._base_manager.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=CHUNK_SIZE)
+                    if not in_ranges(pk, ranges, starts)
+                ]
+                for index in range(0, len(stale), CHUNK_SIZE):
+                    model._base_manager.filter(pk__in=stale[index:index + CHUNK_SIZE]).delete()
+
+        connection.check_constraints()
+        rebuild_account_links()
+        rebuild_balance_snapshots()
+        rebuild_balance_history()
+        rebuild_attribute_values()
+        for company in Company.objects.all():
+            write_checkpoints(company)
+        bump_tree_version(Company.objects.values_list('pk', flat=True))
+
+    return count
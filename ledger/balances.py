@@ -0,0 +1,116 @@
+from collections import defaultdict
+from decimal import Decimal
+from typing import Iterable
+
+from django.db import transaction as db_transaction
+from django.db.models import Case, F, Sum, When
+
+from .models import Account, AccountBalance, AccountClosure, Company, Detail
+from .money import money_value
+
+# (account_id, debit, credit)
+DetailDelta = tuple[int, Decimal, Decimal]
+
+
+def get_lineage(account_ids: Iterable[int]) -> dict[int, list[int]]:
+    """Map each account id to a list of itself followed by its ancestors."""
+    links = (
+        AccountClosure.objects
+        .filter(descendant_id__in=set(account_ids))
+        .order_by('depth')
+        .values_list('descendant_id', 'ancestor_id')
+    )
+    lineage = defaultdict(list)
+    for descendant_id, ancestor_id in links:
+        lineage[descendant_id].append(ancestor_id)
+    return lineage
+
+
+def apply_detail_deltas(deltas: list[DetailDelta]) -> None:
+    """Add debit/credit deltas to the snapshots of each account and all of its ancestors."""
+    deltas = [delta for delta in deltas if delta[1] or delta[2]]
+    if not deltas:
+        return
+
+    lineage = get_lineage({account_id for account_id, _, _ in deltas})
+    totals: dict[int, list[Decimal]] = defaultdict(lambda: [Decimal(0), Decimal(0)])
+    for account_id, debit, credit in deltas:
+        for ancestor_id in lineage.get(account_id, []):
+            totals[ancestor_id][0] += debit
+            totals[ancestor_id][1] += credit
+
+    with db_transaction.atomic():
+        AccountBalance.objects.bulk_create(
+            [AccountBalance(account_id=account_id) for account_id in totals],
+            ignore_conflicts=True,
+        )
+        changed = [(account_id, debit, credit) for account_id, (debit, credit) in totals.items() if debit or credit]
+        if changed:
+            # one UPDATE for all affected snapshots
+            AccountBalance.objects.filter(account_id__in=[account_id for account_id, _, _ in changed]).update(
+                debit=Case(*[When(account_id=account_id, then=F('debit') + money_value(debit)) for account_id, debit, _ in changed], default=F('debit')),
+                credit=Case(*[When(account_id=account_id, then=F('credit') + money_value(credit)) for account_id, _, credit in changed], default=F('credit')),
+            )
+
+
+def move_subtree_balance(account: Account, old_parent_id: int | None) -> None:
+    """Shift an account's subtree totals from its old ancestors to its new ones."""
+    snapshot = AccountBalance.objects.filter(account_id=account.pk).values_list('debit', 'credit').first()
+    if snapshot is None:
+        return
+
+    debit, credit = snapshot
+    deltas = []
+    if old_parent_id is not None:
+        deltas.append((old_parent_id, -debit, -credit))
+    if account.parent_id is not None:
+        deltas.append((account.parent_id, debit, credit))
+    apply_detail_deltas(deltas)
+
+
+def compute_subtree_totals(company: Company | None = None) -> dict[int, tuple[Decimal, Decimal]]:
+    """Compute (debit, credit) totals for every account's subtree straight from the Detail table."""
+    accounts = Account.objects.all()
+    details = Detail.objects.all()
+    if company is not None:
+        accounts = accounts.filter(company=company)
+        details = details.filter(account__company=company)
+
+    parents = dict(accounts.values_list('pk', 'parent_id'))
+    totals = {account_id: [Decimal(0), Decimal(0)] for account_id in parents}
+    own_totals = details.order_by().values_list('account_id').annotate(debit=Sum('debit'), credit=Sum('credit'))
+    for account_id, debit, credit in own_totals:
+        current = account_id
+        while current is not None:
+            totals[current][0] += debit
+            totals[current][1] += credit
+            current = parents.get(current)
+
+    return {account_id: (debit, credit) for account_id, (debit, credit) in totals.items()}
+
+
+def rebuild_balance_snapshots(company: Company | None = None, commit: bool = True) -> list[tuple[int, tuple[Decimal, Decimal], tuple[Decimal, Decimal]]]:
+    """
+    Recompute every snapshot from scratch.
+
+    Returns (account_id, expected, stored) for each snapshot that was out of date.
+    """
+    expected = compute_subtree_totals(company)
+    snapshots = AccountBalance.objects.filter(account_id__in=expected)
+    stored = {account_id: (debit, credit) for account_id, debit, credit in snapshots.values_list('account_id', 'debit', 'credit')}
+
+    mismatches = [
+        (account_id, totals, stored.get(account_id, (Decimal(0), Decimal(0))))
+        for account_id, totals in expected.items()
+        if totals != stored.get(account_id, (Decimal(0), Decimal(0)))
+    ]
+
+    if commit:
+        with db_transaction.atomic():
+            snapshots.delete()
+            AccountBalance.objects.bulk_create([
+                AccountBalance(account_id=account_id, debit=debit, credit=credit)
+                for account_id, (debit, credit) in expected.items()
+            ])
+
+    return mismatches
@@ -0,0 +1,163 @@
+import json
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+from django.db import connection, reset_queries
+from django.http import HttpResponse
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, reverse
+
+from . import urls
+from .models import Account, Company, RecurringTransaction, Transaction
+
+# which object a bare <int:pk> refers to on each page; every new URL with a pk needs an entry
+PK_TARGETS = {
+    'account_overview': 'account',
+    'export_account_activity': 'account',
+    'account_balance_history': 'account',
+    'transaction_detail': 'transaction',
+    'create_rec_trans': 'transaction',
+}
+# pages that answer a GET with 405; a benchmark of them would only measure the refusal
+POST_ONLY = {'ledger:api_submit_transactions'}
+# an absolute slack for timings so sub-millisecond pages do not fail on noise
+TIME_FLOOR = 0.01
+
+
+def iter_url_names(patterns: Iterable[URLPattern | URLResolver], prefix: str = 'ledger') -> Iterator[tuple[str, list[str]]]:
+    """Yield (namespaced URL name, route parameter names) for every named ledger URL."""
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            for name, params in iter_url_names(pattern.url_patterns, prefix):
+                yield name, list(pattern.pattern.converters) + params
+        elif pattern.name is not None:
+            yield f'{prefix}:{pattern.name}', list(pattern.pattern.converters)
+
+
+def benchmark_urls(company: Company) -> dict[str, str]:
+    """Resolve every ledger URL against the objects of a company."""
+    targets = {
+        'company': company,
+        # the root asset account has the widest subtree
+        'account': Account.objects.prefetch_related(None).filter(company=company, parent=None).order_by('key').first(),
+        'transaction': Transaction.objects.filter(company=company).order_by('pk').first(),
+        'recurring': RecurringTransaction.objects.filter(company=company).order_by('pk').first(),
+    }
+    params = {
+        'company_pk': 'company',
+        'transaction_pk': 'transaction',
+        'rec_trans_pk': 'recurring',
+    }
+
+    resolved = {}
+    for name, route_params in iter_url_names(urls.urlpatterns):
+        kwargs = {}
+        short_name = name.split(':')[-1]
+        for param in route_params:
+            target = PK_TARGETS.get(short_name) if param == 'pk' else params.get(param)
+            if target is None:
+                raise KeyError(f'No benchmark target for the {param!r} parameter of {name}.')
+            kwargs[param] = targets[target].pk
+        resolved[name] = reverse(name, kwargs=kwargs)
+    return resolved
+
+
+def fetch(client: Client, url: str) -> HttpResponse:
+    response = client.get(url)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def measure(client: Client, url: str, repeat: int = 3, trace_memory: bool = True) -> dict[str, Any]:
+    """
+    Request a page `repeat` times; returns its status, query count, median wall time and peak memory.
+
+    Memory is traced in one extra request of its own, since tracing slows everything down.
+    """
+    timings = []
+    for _ in range(repeat):
+        # the query log is capped; start from an empty one so it cannot be full already
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = fetch(client, url)
+            timings.append(time.perf_counter() - started)
+        # the log is sliced lazily and the next request clears it, so count now
+        query_count = len(queries)
+
+    peak = 0
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            fetch(client, url)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'status': response.status_code,
+        'queries': query_count,
+        'seconds': round(statistics.median(timings), 6),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(
+    company: Company,
+    repeat: int = 3,
+    skip: Iterable[str] = (),
+    client: Client | None = None,
+    trace_memory: bool = True,
+) -> dict[str, dict[str, Any]]:
+    """Measure every ledger page for a company, keyed by URL name. Pages that raise are recorded as a 500."""
+    client = client or Client(raise_request_exception=False)
+    skip = set(skip) | POST_ONLY
+    return {
+        name: measure(client, url, repeat, trace_memory)
+        for name, url in benchmark_urls(company).items()
+        if name not in skip
+    }
+
+
+def compare_results(
+    baseline: dict[str, dict[str, Any]],
+    results: dict[str, dict[str, Any]],
+    time_tolerance: float = 1.0,
+    memory_tolerance: float = 0.5,
+) -> list[str]:
+    """
+    Return a description of every regression against a baseline.
+
+    Query counts must not grow at all; wall time and peak memory may grow by the given fraction.
+    """
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+
+        if result['status'] >= 400 and expected['status'] < 400:
+            regressions.append(f'{name}: status {expected["status"]} -> {result["status"]}')
+        if result['queries'] > expected['queries']:
+            regressions.append(f'{name}: {expected["queries"]} -> {result["queries"]} queries')
+        if result['seconds'] > expected['seconds'] * (1 + time_tolerance) + TIME_FLOOR:
+            regressions.append(f'{name}: {expected["seconds"]:.4f}s -> {result["seconds"]:.4f}s')
+        if result['peak_kib'] > expected['peak_kib'] * (1 + memory_tolerance):
+            regressions.append(f'{name}: {expected["peak_kib"]} KiB -> {result["peak_kib"]} KiB peak memory')
+    return regressions
+
+
+def write_baseline(path: Path, scale: dict[str, int], results: dict[str, dict[str, Any]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({'scale': scale, 'results': results}, indent=2, sort_keys=True) + '\n')
+
+
+def read_baseline(path: Path) -> tuple[dict[str, int], dict[str, dict[str, Any]]]:
+    data = json.loads(path.read_text())
+    return data['scale'], data['results']
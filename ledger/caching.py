@@ -0,0 +1,34 @@
+import datetime
+import time
+from typing import Iterable
+
+from django.core.cache import cache
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from .models import Company
+from .tree import AccountNode, build_account_tree
+
+# entries are keyed by version, so stale ones are never read; the timeout only bounds how long they linger
+TREE_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def bump_tree_version(company_ids: Iterable[int]) -> None:
+    """
+    Invalidate the cached account trees of some companies.
+
+    The version lives on the company row, so it changes in the same DB transaction as the data and is
+    shared by every server process. It moves to the clock (or one past its old value), so a version never
+    repeats, not even after a backup with older versions is restored.
+    """
+    Company.objects.filter(pk__in=set(company_ids)).update(tree_version=Greatest(F('tree_version') + 1, Value(time.time_ns())))
+
+
+def cached_account_tree(company: Company, as_of: datetime.date | None = None) -> list[AccountNode]:
+    """build_account_tree, cached until anything of the company changes."""
+    key = f'ledger:account-tree:{company.pk}:{as_of.isoformat() if as_of else "current"}'
+    root_nodes = cache.get(key, version=company.tree_version)
+    if root_nodes is None:
+        root_nodes = build_account_tree(company, as_of)
+        cache.set(key, root_nodes, timeout=TREE_CACHE_TIMEOUT, version=company.tree_version)
+    return root_nodes
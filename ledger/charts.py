@@ -0,0 +1,22 @@
+import datetime
+from decimal import Decimal
+
+from bokeh.embed import components
+from bokeh.models import NumeralTickFormatter
+from bokeh.plotting import figure
+from bokeh.resources import CDN
+
+
+def balance_history_chart(title: str, history: list[tuple[datetime.date, Decimal]]) -> dict[str, str]:
+    """Render a balance history as a step chart; returns the template context for embedding it."""
+    plot = figure(title=title, x_axis_type='datetime', height=400, sizing_mode='stretch_width', tools='pan,wheel_zoom,box_zoom,reset,hover')
+    plot.step(
+        [period for period, _ in history],
+        [float(balance) for _, balance in history],
+        mode='after',
+        line_width=2,
+    )
+    plot.yaxis.formatter = NumeralTickFormatter(format='$0,0.00')
+
+    script, div = components(plot)
+    return {'bokeh_resources': CDN.render(), 'chart_script': script, 'chart_div': div}
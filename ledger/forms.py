@@ -1,6 +1,13 @@
+from typing import Any, NamedTuple
+
 from django import forms
+from django.db import models
+from django.utils.functional import cached_property
 
-from .models import Company, Detail, QuickTransaction, Account, RecurringTransaction, RecurringTransactionDetail, Transaction
+from .attributes import KIND_OPERATORS, AttributeFilter
+from .models import Company, Detail, QuickTransaction, Account, RecurringTransaction, RecurringTransactionDetail, Transaction, UserDefinedAttribute
+from .reports import FREQUENCIES, ReportKind
+from .validation import AccountInfo, DetailLine, validate_detail_lines
 
 # form to create a quick transaction
 class CreateQuickTransaction(forms.ModelForm):
@@ -30,8 +37,90 @@ class SubmitQuickTransaction(forms.Form):
         super().__init__(*args, **kwargs)
         self.fields['quick_transaction'].queryset = QuickTransaction.objects.filter(company=company)
 
+# form for one line of a batch of quick transactions; choices are loaded once per formset
+class BatchQuickTransactionForm(forms.Form):
+    date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    quick_transaction = forms.TypedChoiceField(coerce=int)
+    amount = forms.DecimalField(decimal_places=2, max_digits=12, min_value=0)
+    notes = forms.CharField(widget=forms.TextInput(), required=False)
+
+    def __init__(self, *args, quick_transaction_choices: list[tuple[Any, str]], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['quick_transaction'].choices = quick_transaction_choices
+
+
+BatchQuickTransactionFormset = forms.formset_factory(
+    form=BatchQuickTransactionForm,
+    extra=10,
+    min_num=1,
+)
+
+
+def get_quick_transaction_choices(company: Company) -> list[tuple[Any, str]]:
+    return [('', '---------')] + [
+        (pk, name)
+        for pk, name in QuickTransaction.objects.filter(company=company).values_list('pk', 'name')
+    ]
+
+
+# form to import a bank statement
+class ImportStatementForm(forms.Form):
+    class StatementFormat(models.TextChoices):
+        CSV = 'csv', 'CSV (date, amount, description columns)'
+        OFX = 'ofx', 'OFX'
+
+    file = forms.FileField()
+    statement_format = forms.ChoiceField(choices=StatementFormat.choices)
+    withdrawal_template = forms.ModelChoiceField(None, required=False)
+    deposit_template = forms.ModelChoiceField(None, required=False)
+
+    def __init__(self, *args, company: Company, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['withdrawal_template'].queryset = QuickTransaction.objects.filter(company=company)
+        self.fields['deposit_template'].queryset = QuickTransaction.objects.filter(company=company)
+
+    def clean(self) -> dict[str, Any]:
+        cleaned_data = super().clean()
+        if not cleaned_data.get('withdrawal_template') and not cleaned_data.get('deposit_template'):
+            raise forms.ValidationError('Choose a withdrawal or deposit template.')
+        return cleaned_data
+
+
+class AccountChoices(NamedTuple):
+    # leaf accounts of a company by pk and the select options for them, loaded once per formset
+    accounts: dict[int, Account]
+    choices: list[tuple[Any, str]]
+
+
+def get_account_choices(company_id: int) -> AccountChoices:
+    # without the default manager's prefetches, which would load every account's children and details
+    accounts = {account.pk: account for account in Account.objects.filter(company_id=company_id, is_leaf=True).prefetch_related(None)}
+    return AccountChoices(accounts, [('', '---------')] + [(pk, str(account)) for pk, account in accounts.items()])
+
+
+class AccountChoiceField(forms.ModelChoiceField):
+    # renders and validates against shared AccountChoices instead of querying once per form
+    def __init__(self, **kwargs) -> None:
+        super().__init__(queryset=Account.objects.none(), **kwargs)
+        self.accounts: dict[int, Account] = {}
+
+    def set_account_choices(self, account_choices: AccountChoices) -> None:
+        self.accounts = account_choices.accounts
+        self.choices = account_choices.choices
+
+    def to_python(self, value: Any) -> Account | None:
+        if value in self.empty_values:
+            return None
+        try:
+            return self.accounts[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value})
+
+
 # form to submit a transaction
 class DetailForm(forms.ModelForm):
+    account = AccountChoiceField()
+
     class Meta:
         model = Detail
         fields = [
@@ -44,41 +133,66 @@ class DetailForm(forms.ModelForm):
             'notes': forms.TextInput()
         }
 
-    def __init__(self, *args, company: Company, **kwargs) -> None:
+    def __init__(self, *args, account_choices: AccountChoices, **kwargs) -> None:
         super().__init__(*args, **kwargs)
-        self.fields['account'].queryset = Account.objects.filter(company=company, is_leaf=True)
+        self.fields['account'].set_account_choices(account_choices)
+
+
+class BalancedDetailFormset(forms.BaseInlineFormSet):
+    # checks the accounting equation on the submitted lines before anything is written; every row
+    # shares the account choices of the company, loaded once
+    def __init__(self, *args, company: Company | None = None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.company_id = company.pk if company is not None else self.instance.company_id
+
+    @cached_property
+    def account_choices(self) -> AccountChoices:
+        return get_account_choices(self.company_id)
+
+    def get_form_kwargs(self, index: int | None) -> dict[str, Any]:
+        return {**super().get_form_kwargs(index), 'account_choices': self.account_choices}
+
+    def clean(self) -> None:
+        super().clean()
+        if any(self.errors):
+            return
 
+        lines = []
+        accounts = {}
+        for form in self.forms:
+            if not form.cleaned_data or self._should_delete_form(form):
+                continue
+            account: Account = form.cleaned_data['account']
+            accounts[account.pk] = AccountInfo(account.company_id, account.kind)
+            lines.append(DetailLine(account.pk, form.cleaned_data['debit'], form.cleaned_data['credit']))
 
+        validate_detail_lines(lines, accounts, self.company_id)
+
+
+# rows beyond the minimum are added in the browser from the formset's empty form
 TransactionDetailFormset = forms.inlineformset_factory(
     parent_model=Transaction,
     model=Detail,
     form=DetailForm,
-    extra=10,
+    formset=BalancedDetailFormset,
+    extra=0,
     exclude=[],
     can_delete=True,
     min_num=2,
 )
 
 
-class RecurringTransactionDetailForm(forms.ModelForm):
-    class Meta:
+class RecurringTransactionDetailForm(DetailForm):
+    class Meta(DetailForm.Meta):
         model = RecurringTransactionDetail
-        fields = [
-            'account',
-            'credit',
-            'debit',
-            'notes',
-        ]
-        widgets = {
-            'notes': forms.TextInput()
-        }
 
 
 RecurringTransactionDetailFormset = forms.inlineformset_factory(
     parent_model=RecurringTransaction,
     model=RecurringTransactionDetail,
     form=RecurringTransactionDetailForm,
-    extra=10,
+    formset=BalancedDetailFormset,
+    extra=0,
     exclude=[],
     can_delete=True,
     min_num=2,
@@ -103,7 +217,9 @@ class RecurringTransactionForm(forms.ModelForm):
             'company',
         ]
         widgets = {
-            'name': forms.TextInput()
+            'name': forms.TextInput(),
+            'starts_on': forms.DateInput(attrs={'type': 'date'}),
+            'next_due': forms.DateInput(attrs={'type': 'date'}),
         }
 
 
@@ -120,15 +236,16 @@ class CreateAccount(forms.ModelForm):
 
     def __init__(self, *args, company: Company, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['parent'].queryset = Account.objects.filter(is_leaf=False, company=company)
+        self.fields['parent'].queryset = Account.objects.filter(is_leaf=False, company=company).prefetch_related(None)
 
 
 class CreateRecurringTransaction(forms.ModelForm):
     class Meta:
         model = RecurringTransaction
-        fields = ['name']
+        fields = ['name', 'cadence', 'starts_on']
         widgets = {
-            'name': forms.TextInput()
+            'name': forms.TextInput(),
+            'starts_on': forms.DateInput(attrs={'type': 'date'}),
         }
 
 
@@ -139,3 +256,78 @@ class CompanyForm(forms.ModelForm):
         widgets = {
             'name': forms.TextInput()
         }
+
+
+class ReportForm(forms.Form):
+    kind = forms.ChoiceField(choices=ReportKind.choices)
+    start = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    end = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    freq = forms.ChoiceField(choices=FREQUENCIES, label='Period')
+
+    def clean(self) -> dict[str, Any]:
+        cleaned_data = super().clean()
+        if cleaned_data.get('start') and cleaned_data.get('end') and cleaned_data['start'] > cleaned_data['end']:
+            raise forms.ValidationError('Start date must not be after end date.')
+        return cleaned_data
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(label='Search notes', max_length=200)
+    account = forms.ModelChoiceField(queryset=Account.objects.none(), required=False, help_text='Only lines in this account or below it')
+    start = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    end = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def __init__(self, *args, company: Company, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['account'].queryset = Account.objects.filter(company=company).prefetch_related(None).order_by('key')
+
+    def clean(self) -> dict[str, Any]:
+        cleaned_data = super().clean()
+        if cleaned_data.get('start') and cleaned_data.get('end') and cleaned_data['start'] > cleaned_data['end']:
+            raise forms.ValidationError('Start date must not be after end date.')
+        return cleaned_data
+
+
+class AttributeFilterForm(forms.Form):
+    attribute = forms.TypedChoiceField(coerce=int)
+    operator = forms.ChoiceField(choices=[
+        ('', '---------'),
+        ('eq', 'is'),
+        ('lt', 'is below'),
+        ('lte', 'is at most'),
+        ('gt', 'is above'),
+        ('gte', 'is at least'),
+        ('has', 'contains'),
+    ])
+    value = forms.CharField(max_length=200)
+
+    def __init__(self, *args, attributes: dict[int, UserDefinedAttribute], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.attributes = attributes
+        self.fields['attribute'].choices = [('', '---------')] + [(pk, attribute.name) for pk, attribute in attributes.items()]
+
+    def clean(self) -> dict[str, Any]:
+        cleaned_data = super().clean()
+        attribute = self.attributes.get(cleaned_data.get('attribute'))
+        if attribute is None or not cleaned_data.get('operator') or 'value' not in cleaned_data:
+            return cleaned_data
+        if cleaned_data['operator'] not in KIND_OPERATORS[attribute.kind]:
+            raise forms.ValidationError(f'{attribute.name} cannot be compared that way.')
+        if attribute.kind != UserDefinedAttribute.AttributeKind.ARRAY:
+            attribute.parse_value(cleaned_data['value'])
+        cleaned_data['filter'] = AttributeFilter(attribute, cleaned_data['operator'], cleaned_data['value'])
+        return cleaned_data
+
+
+AttributeFilterFormset = forms.formset_factory(
+    form=AttributeFilterForm,
+    extra=3,
+)
+
+
+class AttributeReportForm(forms.Form):
+    group_by = forms.TypedChoiceField(coerce=int, required=False, empty_value=None)
+
+    def __init__(self, *args, attributes: dict[int, UserDefinedAttribute], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['group_by'].choices = [('', '---------')] + [(pk, attribute.name) for pk, attribute in attributes.items()]
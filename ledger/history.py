@@ -0,0 +1,266 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+from typing import Iterable
+
+from django.db import transaction as db_transaction
+from django.db.models import Case, F, Max, Q, QuerySet, Sum, When
+
+from .models import Account, AccountClosure, AccountPeriodDelta, BalanceCheckpoint, Company, Detail
+from .money import money_value
+
+Granularity = AccountPeriodDelta.Granularity
+
+# (account_id, transaction date, debit, credit)
+HistoryDelta = tuple[int, datetime.date, Decimal, Decimal]
+UPDATE_BATCH_SIZE = 200
+# (debit, credit)
+Totals = tuple[Decimal, Decimal]
+
+
+def period_start(date: datetime.date, granularity: str) -> datetime.date:
+    if granularity == Granularity.MONTH:
+        return date.replace(day=1)
+    return date
+
+
+def next_month(date: datetime.date) -> datetime.date:
+    return (date.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def bucket_deltas(deltas: Iterable[HistoryDelta]) -> dict[tuple[int, str, datetime.date], list[Decimal]]:
+    """Sum deltas into (account_id, granularity, period) buckets for every granularity."""
+    buckets: dict[tuple[int, str, datetime.date], list[Decimal]] = defaultdict(lambda: [Decimal(0), Decimal(0)])
+    for account_id, date, debit, credit in deltas:
+        for granularity in Granularity.values:
+            bucket = buckets[account_id, granularity, period_start(date, granularity)]
+            bucket[0] += debit
+            bucket[1] += credit
+    return buckets
+
+
+def apply_history_deltas(deltas: list[HistoryDelta]) -> None:
+    """Add debit/credit deltas to the day and month buckets they fall in; other buckets are left alone."""
+    buckets = bucket_deltas(delta for delta in deltas if delta[2] or delta[3])
+    if not buckets:
+        return
+
+    with db_transaction.atomic():
+        AccountPeriodDelta.objects.bulk_create(
+            [
+                AccountPeriodDelta(account_id=account_id, granularity=granularity, period=period)
+                for account_id, granularity, period in buckets
+            ],
+            ignore_conflicts=True,
+        )
+        rows = AccountPeriodDelta.objects.filter(
+            account_id__in={account_id for account_id, _, _ in buckets},
+            period__in={period for _, _, period in buckets},
+        ).values_list('pk', 'account_id', 'granularity', 'period')
+        changes = [
+            (pk, buckets[account_id, granularity, period])
+            for pk, account_id, granularity, period in rows
+            if any(buckets.get((account_id, granularity, period), ()))
+        ]
+
+        # one UPDATE per batch of buckets rather than one per bucket
+        for index in range(0, len(changes), UPDATE_BATCH_SIZE):
+            batch = changes[index:index + UPDATE_BATCH_SIZE]
+            AccountPeriodDelta.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+                debit=Case(*[When(pk=pk, then=F('debit') + money_value(debit)) for pk, (debit, _) in batch], default=F('debit')),
+                credit=Case(*[When(pk=pk, then=F('credit') + money_value(credit)) for pk, (_, credit) in batch], default=F('credit')),
+            )
+
+        invalidate_checkpoints(
+            {account_id for account_id, _, _ in buckets},
+            min(period for _, _, period in buckets),
+        )
+
+
+def move_history_date(transaction_id: int, old_date: datetime.date, new_date: datetime.date) -> None:
+    """Move the details of a re-dated transaction from the buckets of `old_date` to those of `new_date`."""
+    deltas = []
+    for account_id, debit, credit in Detail.objects.filter(transaction_id=transaction_id).values_list('account_id', 'debit', 'credit'):
+        deltas.append((account_id, old_date, -debit, -credit))
+        deltas.append((account_id, new_date, debit, credit))
+    apply_history_deltas(deltas)
+
+
+def rebuild_balance_history(company: Company | None = None) -> int:
+    """Recompute every bucket from the Detail table. Returns the number of buckets written."""
+    details = Detail.objects.all()
+    stale = AccountPeriodDelta.objects.all()
+    if company is not None:
+        details = details.filter(account__company=company)
+        stale = stale.filter(account__company=company)
+
+    daily = details.order_by().values_list('account_id', 'transaction__date').annotate(debit=Sum('debit'), credit=Sum('credit'))
+    buckets = bucket_deltas(daily)
+    with db_transaction.atomic():
+        stale.delete()
+        # checkpoints were derived from the old buckets
+        checkpoints = BalanceCheckpoint.objects.all()
+        if company is not None:
+            checkpoints = checkpoints.filter(account__company=company)
+        checkpoints.delete()
+        AccountPeriodDelta.objects.bulk_create(
+            [
+                AccountPeriodDelta(account_id=account_id, granularity=granularity, period=period, debit=debit, credit=credit)
+                for (account_id, granularity, period), (debit, credit) in buckets.items()
+            ],
+            batch_size=2000,
+        )
+    return len(buckets)
+
+
+def grouped_buckets(buckets: QuerySet, granularity: str, end: datetime.date | None) -> QuerySet:
+    buckets = buckets.filter(granularity=granularity)
+    if end is not None:
+        buckets = buckets.filter(period__lte=end)
+    return buckets.order_by('period').values_list('period').annotate(debit=Sum('debit'), credit=Sum('credit'))
+
+
+def cumulate(rows: Iterable[tuple[datetime.date, Decimal, Decimal]], kind: int, granularity: str, start: datetime.date | None) -> list[tuple[datetime.date, Decimal]]:
+    # running balance at the end of each bucket; buckets before `start` only feed the opening balance
+    first = period_start(start, granularity) if start is not None else None
+    history = []
+    debit_total = credit_total = Decimal(0)
+    for period, debit, credit in rows:
+        debit_total += debit
+        credit_total += credit
+        if first is None or period >= first:
+            history.append((period, Account.signed_total(kind, debit_total, credit_total)))
+    return history
+
+
+def get_balance_history(
+    account: Account,
+    granularity: str = Granularity.MONTH,
+    start: datetime.date | None = None,
+    end: datetime.date | None = None,
+) -> list[tuple[datetime.date, Decimal]]:
+    """
+    Return (period, balance at the end of the period) for an account and all of its descendants.
+
+    One grouped query over the buckets of the subtree, so the cost follows the number of periods
+    rather than the number of details.
+    """
+    buckets = AccountPeriodDelta.objects.filter(account__ancestor_links__ancestor=account)
+    return cumulate(grouped_buckets(buckets, granularity, end), account.kind, granularity, start)
+
+
+def get_net_worth_history(
+    company: Company,
+    granularity: str = Granularity.MONTH,
+    start: datetime.date | None = None,
+    end: datetime.date | None = None,
+) -> list[tuple[datetime.date, Decimal]]:
+    """Return (period, assets - liabilities at the end of the period) for a company."""
+    buckets = AccountPeriodDelta.objects.filter(
+        account__company=company,
+        account__kind__in=[Account.AccountKind.ASSET, Account.AccountKind.LIABILITY],
+    )
+    # debit - credit over assets and liabilities together is exactly assets - liabilities
+    return cumulate(grouped_buckets(buckets, granularity, end), Account.AccountKind.ASSET, granularity, start)
+
+
+def invalidate_checkpoints(account_ids: Iterable[int], since: datetime.date) -> None:
+    """
+    Drop the checkpoints after `since` of every company owning one of the accounts.
+
+    Whole companies are invalidated so all of a company's accounts always share the same checkpoint dates.
+    """
+    BalanceCheckpoint.objects.filter(
+        account__company_id__in=Account.objects.filter(pk__in=set(account_ids)).values('company_id'),
+        date__gt=since,
+    ).delete()
+
+
+def write_checkpoints(company: Company, through: datetime.date | None = None) -> int:
+    """
+    Write subtree checkpoints at the start of every month up to `through` (default today).
+
+    Continues from the latest checkpoint still standing, so running this periodically only adds
+    the months since the last run (or since the earliest backdated change). Returns the number of
+    rows written.
+    """
+    through = period_start(through or datetime.date.today(), Granularity.MONTH)
+    lineage: dict[int, list[int]] = defaultdict(list)
+    for descendant_id, ancestor_id in AccountClosure.objects.filter(descendant__company=company).values_list('descendant_id', 'ancestor_id'):
+        lineage[descendant_id].append(ancestor_id)
+
+    checkpoints = BalanceCheckpoint.objects.filter(account__company=company)
+    latest = checkpoints.aggregate(latest=Max('date'))['latest']
+    totals: dict[int, list[Decimal]] = defaultdict(lambda: [Decimal(0), Decimal(0)])
+    buckets = AccountPeriodDelta.objects.filter(account__company=company, granularity=Granularity.MONTH, period__lt=through)
+    if latest is not None:
+        for account_id, debit, credit in checkpoints.filter(date=latest).values_list('account_id', 'debit', 'credit'):
+            totals[account_id] = [debit, credit]
+        buckets = buckets.filter(period__gte=latest)
+
+    rows = iter(buckets.order_by('period').values_list('account_id', 'period', 'debit', 'credit'))
+    pending = next(rows, None)
+    if latest is not None:
+        month = next_month(latest)
+    elif pending is not None:
+        # the first checkpoint follows the first month with any activity
+        month = next_month(pending[1])
+    else:
+        return 0
+
+    new_checkpoints = []
+    while month <= through:
+        while pending is not None and pending[1] < month:
+            account_id, _, debit, credit = pending
+            for ancestor_id in lineage.get(account_id, []):
+                totals[ancestor_id][0] += debit
+                totals[ancestor_id][1] += credit
+            pending = next(rows, None)
+
+        new_checkpoints.extend(
+            BalanceCheckpoint(account_id=account_id, date=month, debit=debit, credit=credit)
+            for account_id, (debit, credit) in totals.items()
+        )
+        month = next_month(month)
+
+    BalanceCheckpoint.objects.bulk_create(new_checkpoints, batch_size=2000)
+    return len(new_checkpoints)
+
+
+def subtree_totals_as_of(company_id: int, as_of: datetime.date, account: Account | None = None) -> dict[int, Totals]:
+    """
+    Return subtree (debit, credit) totals over every detail dated on or before `as_of`, per account of
+    a company (or just for `account`).
+
+    Reads the nearest checkpoint at or before `as_of` and adds the month buckets of the whole months
+    and the day buckets of the partial month since then.
+    """
+    checkpoints = BalanceCheckpoint.objects.filter(account__company_id=company_id)
+    checkpoint_date = checkpoints.filter(date__lte=as_of + datetime.timedelta(days=1)).aggregate(date=Max('date'))['date']
+
+    totals: dict[int, list[Decimal]] = defaultdict(lambda: [Decimal(0), Decimal(0)])
+    if checkpoint_date is not None:
+        if account is not None:
+            checkpoints = checkpoints.filter(account=account)
+        for account_id, debit, credit in checkpoints.filter(date=checkpoint_date).values_list('account_id', 'debit', 'credit'):
+            totals[account_id] = [debit, credit]
+
+    month = period_start(as_of, Granularity.MONTH)
+    whole_months = Q(granularity=Granularity.MONTH, period__lt=month)
+    partial_month = Q(granularity=Granularity.DAY, period__gte=month, period__lte=as_of)
+    if checkpoint_date is not None:
+        whole_months &= Q(period__gte=checkpoint_date)
+        partial_month &= Q(period__gte=checkpoint_date)
+
+    buckets = AccountPeriodDelta.objects.filter(whole_months | partial_month)
+    if account is not None:
+        buckets = buckets.filter(account__ancestor_links__ancestor=account)
+    else:
+        buckets = buckets.filter(account__company_id=company_id)
+    # every bucket counts towards each of its account's ancestors (and the account itself)
+    since = buckets.order_by().values_list('account__ancestor_links__ancestor').annotate(debit=Sum('debit'), credit=Sum('credit'))
+    for account_id, debit, credit in since:
+        totals[account_id][0] += debit
+        totals[account_id][1] += credit
+
+    return {account_id: (debit, credit) for account_id, (debit, credit) in totals.items()}
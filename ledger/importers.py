@@ -0,0 +1,193 @@
+import csv
+import datetime
+import hashlib
+import itertools
+import re
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from typing import Iterable, Iterator, NamedTuple
+
+from django.core.exceptions import ValidationError
+from django.db import transaction as db_transaction
+
+from .models import Company, ImportedStatementLine, QuickTransaction, Transaction
+from .posting import bulk_post
+from .validation import DetailLine, load_account_info, validate_detail_lines
+
+IMPORT_CHUNK_SIZE = 500
+OFX_TAG_PATTERN = re.compile(r'<(/?\w+)>([^<\r\n]*)')
+
+
+class StatementLine(NamedTuple):
+    date: datetime.date
+    # negative for money leaving the account, positive for money coming in
+    amount: Decimal
+    description: str
+
+
+class ImportResult(NamedTuple):
+    created: int
+    duplicates: int
+    skipped: int
+
+
+def parse_amount(value: str) -> Decimal:
+    value = value.strip().replace('$', '').replace(',', '')
+    if value.startswith('(') and value.endswith(')'):
+        value = '-' + value[1:-1]
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValidationError(f'Invalid amount: {value!r}')
+
+
+def read_text(lines: Iterable[str]) -> Iterator[str]:
+    # an upload read through a TextIOWrapper only fails to decode once iteration reaches the bad bytes
+    try:
+        yield from lines
+    except UnicodeDecodeError:
+        raise ValidationError('The statement is not UTF-8 text.')
+
+
+def parse_csv(
+    lines: Iterable[str],
+    date_column: str = 'date',
+    amount_column: str = 'amount',
+    description_column: str = 'description',
+    date_format: str = '%Y-%m-%d',
+) -> Iterator[StatementLine]:
+    """Lazily parse a CSV statement with a header row."""
+    for number, row in enumerate(csv.DictReader(read_text(lines)), start=2):
+        try:
+            yield StatementLine(
+                date=datetime.datetime.strptime(row[date_column].strip(), date_format).date(),
+                amount=parse_amount(row[amount_column]),
+                description=(row.get(description_column) or '').strip(),
+            )
+        except ValidationError as e:
+            raise ValidationError(f'Line {number}: {"; ".join(e.messages)}')
+        except (KeyError, ValueError) as e:
+            raise ValidationError(f'Line {number}: {e}')
+        except (TypeError, AttributeError):
+            # DictReader fills the columns missing from a short row with None
+            raise ValidationError(f'Line {number}: missing columns')
+
+
+def parse_ofx(lines: Iterable[str]) -> Iterator[StatementLine]:
+    """Lazily parse the STMTTRN records of an OFX statement (SGML or XML flavoured)."""
+    record: dict[str, str] | None = None
+    for line in read_text(lines):
+        for tag, value in OFX_TAG_PATTERN.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                record = {}
+            elif tag == '/STMTTRN' and record is not None:
+                try:
+                    yield StatementLine(
+                        date=datetime.datetime.strptime(record['DTPOSTED'][:8], '%Y%m%d').date(),
+                        amount=parse_amount(record['TRNAMT']),
+                        description=' '.join(filter(None, [record.get('NAME'), record.get('MEMO')])),
+                    )
+                except (KeyError, ValueError) as e:
+                    raise ValidationError(f'Invalid OFX transaction {record}: {e}')
+                record = None
+            elif record is not None and not tag.startswith('/'):
+                record[tag] = value.strip()
+
+
+def hash_notes(notes: str) -> str:
+    return hashlib.sha256(notes.encode()).hexdigest()
+
+
+def import_statement(
+    company: Company,
+    lines: Iterable[StatementLine],
+    withdrawal_template: QuickTransaction | None = None,
+    deposit_template: QuickTransaction | None = None,
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+) -> ImportResult:
+    """
+    Post statement lines through quick transaction templates in chunks.
+
+    Withdrawals (negative amounts) use `withdrawal_template` and deposits use `deposit_template`;
+    lines without a template are skipped. Lines that were imported before are counted as duplicates.
+    Each chunk is committed on its own: when a line fails, the error names it and how many transactions
+    the chunks before it imported.
+    """
+    templates = [template for template in (withdrawal_template, deposit_template) if template is not None]
+    if not templates:
+        raise ValidationError('A withdrawal or deposit template is required.')
+    if any(template.company_id != company.pk for template in templates):
+        raise ValidationError('Templates must belong to the same company.')
+
+    accounts = load_account_info(
+        account_id
+        for template in templates
+        for account_id in (template.account_from_id, template.account_to_id)
+    )
+
+    created = duplicates = skipped = 0
+    occurrences: Counter[tuple[datetime.date, Decimal, str]] = Counter()
+    lines = iter(lines)
+    try:
+        while chunk := list(itertools.islice(lines, chunk_size)):
+            keyed = []
+            for line in chunk:
+                notes_hash = hash_notes(line.description)
+                key = (line.date, line.amount, notes_hash)
+                keyed.append((line, notes_hash, occurrences[key]))
+                occurrences[key] += 1
+
+            existing = set(
+                ImportedStatementLine.objects
+                .filter(company=company, date__in={line.date for line in chunk}, notes_hash__in={notes_hash for _, notes_hash, _ in keyed})
+                .values_list('date', 'amount', 'notes_hash', 'occurrence')
+            )
+
+            transactions = []
+            details = []
+            imported = []
+            for line, notes_hash, occurrence in keyed:
+                if (line.date, line.amount, notes_hash, occurrence) in existing:
+                    duplicates += 1
+                    continue
+
+                template = withdrawal_template if line.amount < 0 else deposit_template
+                if template is None or line.amount == 0:
+                    skipped += 1
+                    continue
+
+                notes = line.description or None
+                transaction = Transaction(date=line.date, notes=notes, company=company)
+                line_details = template.build_details(transaction, abs(line.amount), notes)
+                try:
+                    validate_detail_lines(
+                        [DetailLine(detail.account_id, detail.debit, detail.credit) for detail in line_details],
+                        accounts,
+                        company.pk,
+                    )
+                except ValidationError as e:
+                    raise ValidationError(f'{line.date} {line.amount} {line.description!r}: {"; ".join(e.messages)}')
+
+                transactions.append(transaction)
+                details.extend(line_details)
+                imported.append(ImportedStatementLine(
+                    company=company,
+                    transaction=transaction,
+                    date=line.date,
+                    amount=line.amount,
+                    notes_hash=notes_hash,
+                    occurrence=occurrence,
+                ))
+
+            with db_transaction.atomic():
+                bulk_post(transactions, details)
+                ImportedStatementLine.objects.bulk_create(imported)
+            created += len(transactions)
+    except ValidationError as e:
+        if not created:
+            raise
+        # earlier chunks stay committed; importing the corrected statement again skips them as duplicates
+        raise ValidationError([*e.messages, f'The {created} transactions before the failing line were imported.'])
+
+    return ImportResult(created, duplicates, skipped)
@@ -0,0 +1,43 @@
+import datetime
+from typing import Any, Optional
+
+from django.core.management import BaseCommand, CommandError
+
+from ledger.models import Account, Company
+from ledger.queryplans import full_scans, hot_queries
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN QUERY PLAN for the queries on the request path and fail if any of them scans a whole table.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--account', type=int, help='Explain the queries for the account with this pk (defaults to the first account).')
+        parser.add_argument('--date', type=datetime.date.fromisoformat, default=datetime.date.today(), help='Date used by date filtered queries (YYYY-MM-DD).')
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        accounts = Account.objects.prefetch_related(None).select_related('company')
+        if options['account'] is not None:
+            try:
+                account = accounts.get(pk=options['account'])
+            except Account.DoesNotExist:
+                raise CommandError(f'Account {options["account"]} does not exist.')
+        else:
+            # plans do not need rows, so an empty database can be audited with placeholder objects
+            account = accounts.order_by('pk').first() or Account(pk=0, company=Company(pk=0), kind=Account.AccountKind.ASSET)
+
+        failures = []
+        for name, queryset in hot_queries(account.company, account, options['date']).items():
+            plan = queryset.explain()
+            scans = full_scans(plan)
+            if scans:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f'{name}: full scan of {", ".join(scans)}'))
+            else:
+                self.stdout.write(f'{name}: ok')
+            if scans or options['verbosity'] > 1:
+                self.stdout.write(plan)
+
+        if failures:
+            raise CommandError(f'{len(failures)} hot query plan(s) scan whole tables: {", ".join(failures)}.')
+
+        self.stdout.write(self.style.SUCCESS('No full table scans on the request path.'))
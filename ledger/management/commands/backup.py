@@ -1,14 +1,21 @@
 from typing import Any, Optional
-from django.core.management import BaseCommand, call_command
-from django.utils.timezone import now
+from django.core.management import BaseCommand, CommandError
 from pathlib import Path
 from django.conf import settings
-import sys
 from django.db.migrations.recorder import MigrationRecorder
 from django.db import connection
 
+from ledger.backups import COMPRESSION_SUFFIXES, write_backup
+
 
 class Command(BaseCommand):
+    help = 'Write a compressed JSON Lines backup of the ledger, optionally only the rows changed since the last backup.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--incremental', action='store_true', help='Only write rows modified since the previous backup.')
+        parser.add_argument('--compression', choices=list(COMPRESSION_SUFFIXES), default='gzip')
+        parser.add_argument('--directory', type=Path, default=settings.BASE_DIR / 'backups')
+
     def handle(self, *args: Any, **options: Any) -> Optional[str]:
         recorder = MigrationRecorder(connection)
         recorded_migrations = recorder.applied_migrations()
@@ -18,9 +25,11 @@ class Command(BaseCommand):
             if app == 'ledger'
         ])
 
-        backups = settings.BASE_DIR / 'backups'
+        backups: Path = options['directory']
         backups.mkdir(exist_ok=True)
-        file_name = last_applied_migration[:4] + '_' + now().isoformat() + '.json'
-        file = backups / file_name
+        try:
+            file = write_backup(backups, last_applied_migration, incremental=options['incremental'], compression=options['compression'])
+        except FileNotFoundError as e:
+            raise CommandError(str(e))
 
-        call_command('dumpdata', 'ledger', indent=2, output=str(file))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS(f'Wrote {file}'))
@@ -0,0 +1,65 @@
+from pathlib import Path
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from ledger.benchmarks import compare_results, read_baseline, run_benchmarks, write_baseline
+from ledger.synthetic import LedgerScale, generate_ledger
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a synthetic ledger in a throwaway test database, request every ledger page and record '
+        'query counts, wall time and peak memory. Compares against a JSON baseline unless --save is given.'
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--companies', type=int, default=2)
+        parser.add_argument('--depth', type=int, default=3, help='Levels of the synthetic asset account tree.')
+        parser.add_argument('--transactions', type=int, default=1000, help='Transactions per company.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=3, help='Requests per page; the median time is kept.')
+        parser.add_argument('--skip', action='append', default=[], help='URL name (e.g. ledger:balance_history) to leave out; repeatable.')
+        parser.add_argument('--baseline', type=Path, default=settings.BASE_DIR / 'benchmarks' / 'baseline.json')
+        parser.add_argument('--save', action='store_true', help='Write the results as the new baseline.')
+        parser.add_argument('--time-tolerance', type=float, default=1.0, help='Allowed relative slowdown (1.0 = twice as slow).')
+        parser.add_argument('--memory-tolerance', type=float, default=0.5, help='Allowed relative growth of peak memory.')
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        scale = LedgerScale(options['companies'], options['depth'], options['transactions'])
+        if not options['save']:
+            if not options['baseline'].exists():
+                raise CommandError(f'No baseline at {options["baseline"]}; record one with --save.')
+            baseline_scale, baseline = read_baseline(options['baseline'])
+            if baseline_scale != scale._asdict():
+                raise CommandError(f'The baseline was recorded at {baseline_scale}, not {scale._asdict()}.')
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            companies = generate_ledger(scale, options['seed'])
+            results = run_benchmarks(companies[0], options['repeat'], options['skip'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:45} {result["status"]:>4} {result["queries"]:>4} queries '
+                f'{result["seconds"] * 1000:>9.1f} ms {result["peak_kib"]:>10.1f} KiB'
+            )
+
+        if options['save']:
+            write_baseline(options['baseline'], scale._asdict(), results)
+            self.stdout.write(self.style.SUCCESS(f'Wrote baseline to {options["baseline"]}.'))
+            return
+
+        regressions = compare_results(baseline, results, options['time_tolerance'], options['memory_tolerance'])
+        for regression in regressions:
+            self.stdout.write(self.style.ERROR(regression))
+        if regressions:
+            raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}.')
+
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
@@ -0,0 +1,28 @@
+import datetime
+from typing import Any, Optional
+
+from django.core.management import BaseCommand, CommandError
+
+from ledger.history import write_checkpoints
+from ledger.models import Company
+
+
+class Command(BaseCommand):
+    help = 'Write monthly balance checkpoints used by as-of balance queries. Meant to be run periodically.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--company', type=int, help='Only checkpoint the company with this pk.')
+        parser.add_argument('--through', type=datetime.date.fromisoformat, help='Last checkpoint date (YYYY-MM-DD); defaults to today.')
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        companies = Company.objects.all()
+        if options['company'] is not None:
+            companies = companies.filter(pk=options['company'])
+            if not companies.exists():
+                raise CommandError(f'Company {options["company"]} does not exist.')
+
+        for company in companies:
+            written = write_checkpoints(company, options['through'])
+            self.stdout.write(f'{company}: wrote {written} checkpoint(s).')
+
+        self.stdout.write(self.style.SUCCESS('Balance checkpoints are up to date.'))
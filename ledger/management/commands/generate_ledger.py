@@ -0,0 +1,36 @@
+import os
+import time
+from typing import Any, Optional
+
+from django.core.management import BaseCommand
+
+from ledger.models import Detail, Transaction
+from ledger.synthetic import LedgerScale, generate_ledger
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk insert synthetic companies for load testing: multi-level account trees, seasonal transactions, '
+        'quick and recurring transaction templates and user defined attributes. The same seed always produces '
+        'the same ledger.'
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--companies', type=int, default=1)
+        parser.add_argument('--depth', type=int, default=4, help='Levels of the synthetic asset account tree.')
+        parser.add_argument('--transactions', type=int, default=100000, help='Transactions per company (two details each).')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='Synthetic', help='Company names are the prefix and a number.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Processes generating companies in parallel (on SQLite they only plan; writes stay in one process).')
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        scale = LedgerScale(options['companies'], options['depth'], options['transactions'])
+        started = time.perf_counter()
+        companies = generate_ledger(scale, options['seed'], options['prefix'], options['workers'])
+        elapsed = time.perf_counter() - started
+
+        for company in companies:
+            transactions = Transaction.objects.filter(company=company).count()
+            details = Detail.objects.filter(transaction__company=company).count()
+            self.stdout.write(f'{company} (pk {company.pk}): {transactions} transactions, {details} details.')
+        self.stdout.write(self.style.SUCCESS(f'Generated {len(companies)} companies in {elapsed:.1f}s.'))
@@ -0,0 +1,64 @@
+from pathlib import Path
+from typing import Any, Optional
+
+from django.core.exceptions import ValidationError
+from django.core.management import BaseCommand, CommandError
+
+from ledger.importers import IMPORT_CHUNK_SIZE, import_statement, parse_csv, parse_ofx
+from ledger.models import Company, QuickTransaction
+
+
+class Command(BaseCommand):
+    help = 'Import a CSV or OFX bank statement through quick transaction templates.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('path', type=Path)
+        parser.add_argument('--company', type=int, required=True, help='Pk of the company to post into.')
+        parser.add_argument('--withdrawal-template', type=int, help='Pk of the quick transaction used for negative amounts.')
+        parser.add_argument('--deposit-template', type=int, help='Pk of the quick transaction used for positive amounts.')
+        parser.add_argument('--format', choices=['csv', 'ofx'], help='Statement format; defaults to the file extension.')
+        parser.add_argument('--date-column', default='date')
+        parser.add_argument('--amount-column', default='amount')
+        parser.add_argument('--description-column', default='description')
+        parser.add_argument('--date-format', default='%Y-%m-%d')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        try:
+            company = Company.objects.get(pk=options['company'])
+        except Company.DoesNotExist:
+            raise CommandError(f'Company {options["company"]} does not exist.')
+
+        templates = {}
+        for option in ('withdrawal_template', 'deposit_template'):
+            if options[option] is not None:
+                try:
+                    templates[option] = QuickTransaction.objects.get(pk=options[option], company=company)
+                except QuickTransaction.DoesNotExist:
+                    raise CommandError(f'Quick transaction {options[option]} does not exist for {company}.')
+
+        path: Path = options['path']
+        statement_format = options['format'] or path.suffix.lstrip('.').lower()
+        with path.open(newline='', encoding='utf-8-sig') as file:
+            match statement_format:
+                case 'csv':
+                    lines = parse_csv(
+                        file,
+                        date_column=options['date_column'],
+                        amount_column=options['amount_column'],
+                        description_column=options['description_column'],
+                        date_format=options['date_format'],
+                    )
+                case 'ofx':
+                    lines = parse_ofx(file)
+                case _:
+                    raise CommandError(f'Unknown statement format: {statement_format!r}')
+
+            try:
+                result = import_statement(company, lines, chunk_size=options['chunk_size'], **templates)
+            except ValidationError as e:
+                raise CommandError('; '.join(e.messages))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.created} transactions ({result.duplicates} duplicates, {result.skipped} skipped).'
+        ))
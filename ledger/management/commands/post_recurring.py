@@ -0,0 +1,32 @@
+import datetime
+from typing import Any, Optional
+
+from django.core.management import BaseCommand
+
+from ledger.models import RecurringTransaction
+from ledger.scheduling import post_due_recurring
+
+
+class Command(BaseCommand):
+    help = (
+        'Post every scheduled recurring transaction that is due, across companies, including missed periods. '
+        'Safe to run repeatedly (e.g. daily from cron).'
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--through', type=datetime.date.fromisoformat, help='Post due dates up to this day (YYYY-MM-DD); defaults to today.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be posted.')
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        result = post_due_recurring(options['through'], options['dry_run'])
+        names = dict(RecurringTransaction.objects.filter(pk__in=[*result.posted, *result.errors]).values_list('pk', 'name'))
+
+        verb = 'Would post' if options['dry_run'] else 'Posted'
+        for pk, dates in result.posted.items():
+            if dates:
+                self.stdout.write(f'{names[pk]} ({pk}): {verb.lower()} {len(dates)} from {dates[0]} through {dates[-1]}.')
+        for pk, error in result.errors.items():
+            self.stdout.write(self.style.ERROR(f'{names[pk]} ({pk}): skipped; {error}'))
+
+        total = sum(len(dates) for dates in result.posted.values())
+        self.stdout.write(self.style.SUCCESS(f'{verb} {total} recurring transaction(s).'))
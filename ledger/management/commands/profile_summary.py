@@ -0,0 +1,30 @@
+from pathlib import Path
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from ledger.profiling import read_profile_log, summarize_profiles
+
+SORT_KEYS = ['p95_ms', 'mean_ms', 'max_ms', 'mean_queries', 'max_duplicate_queries', 'requests']
+
+
+class Command(BaseCommand):
+    help = 'Summarize the request profile log (see REQUEST_PROFILING) as the slowest endpoints.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--log', type=Path, default=settings.REQUEST_PROFILE_LOG, help='Log file; rotated backups next to it are read too.')
+        parser.add_argument('--top', type=int, default=10)
+        parser.add_argument('--sort', choices=SORT_KEYS, default='p95_ms')
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        records = list(read_profile_log(options['log']))
+        if not records:
+            raise CommandError(f'No profiled requests in {options["log"]}; is REQUEST_PROFILING on?')
+
+        self.stdout.write(f'{"endpoint":45} {"requests":>8} {"mean ms":>9} {"p95 ms":>9} {"max ms":>9} {"queries":>8} {"dupes":>6} {"sql ms":>8}')
+        for row in summarize_profiles(records, options['top'], options['sort']):
+            self.stdout.write(
+                f'{row["endpoint"]:45} {row["requests"]:>8} {row["mean_ms"]:>9.1f} {row["p95_ms"]:>9.1f} {row["max_ms"]:>9.1f} '
+                f'{row["mean_queries"]:>8.1f} {row["max_duplicate_queries"]:>6} {row["mean_sql_ms"]:>8.1f}'
+            )
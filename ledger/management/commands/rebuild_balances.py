@@ -0,0 +1,41 @@
+from typing import Any, Optional
+
+from django.core.management import BaseCommand, CommandError
+
+from ledger.balances import rebuild_balance_snapshots
+from ledger.history import rebuild_balance_history
+from ledger.models import Company
+
+
+class Command(BaseCommand):
+    help = 'Rebuild account balance snapshots and balance history buckets from the Detail table.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('--company', type=int, help='Only rebuild accounts of the company with this pk.')
+        parser.add_argument('--check', action='store_true', help='Only verify the snapshots; exit with an error if any are stale.')
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        company = None
+        if options['company'] is not None:
+            try:
+                company = Company.objects.get(pk=options['company'])
+            except Company.DoesNotExist:
+                raise CommandError(f'Company {options["company"]} does not exist.')
+
+        mismatches = rebuild_balance_snapshots(company, commit=not options['check'])
+        for account_id, (debit, credit), (stored_debit, stored_credit) in mismatches:
+            self.stdout.write(
+                f'Account {account_id}: expected debit={debit} credit={credit}, '
+                f'found debit={stored_debit} credit={stored_credit}'
+            )
+
+        if options['check'] and mismatches:
+            raise CommandError(f'{len(mismatches)} balance snapshot(s) are out of date.')
+
+        if not options['check']:
+            buckets = rebuild_balance_history(company)
+            self.stdout.write(f'Rebuilt {buckets} balance history bucket(s).')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Verified" if options["check"] else "Rebuilt"} balance snapshots ({len(mismatches)} out of date).'
+        ))
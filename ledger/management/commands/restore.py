@@ -0,0 +1,32 @@
+from pathlib import Path
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from ledger.backups import CHUNK_SIZE, backup_chain, list_backups, restore_backups
+
+
+class Command(BaseCommand):
+    help = 'Restore the ledger from a backup, replaying the full backup it builds on and every increment in between.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('path', type=Path, nargs='?', help='Backup to restore up to; defaults to the latest one. dumpdata style .json files and fixtures are restored on their own.')
+        parser.add_argument('--directory', type=Path, default=settings.BASE_DIR / 'backups')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Number of rows buffered before they are inserted.')
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        path: Path | None = options['path']
+        if path is None:
+            backups = list_backups(options['directory'])
+            if not backups:
+                raise CommandError(f'No backups found in {options["directory"]}.')
+            path = backups[-1]
+
+        chain = backup_chain(path)
+        for file in chain:
+            if not file.exists():
+                raise CommandError(f'Missing backup file {file}.')
+
+        count = restore_backups(chain, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Restored {count} rows from {len(chain)} backup file(s).'))
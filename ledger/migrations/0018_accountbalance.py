@@ -0,0 +1,47 @@
+# Generated by Django 4.0.3 on 2026-10-18 04:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+from decimal import Decimal
+
+
+def populate_balances(apps, schema_editor):
+    Account = apps.get_model('ledger', 'Account')
+    AccountBalance = apps.get_model('ledger', 'AccountBalance')
+    Detail = apps.get_model('ledger', 'Detail')
+
+    parents = dict(Account.objects.values_list('pk', 'parent_id'))
+    totals = {account_id: [Decimal(0), Decimal(0)] for account_id in parents}
+    own_totals = Detail.objects.order_by().values_list('account_id').annotate(
+        debit=models.Sum('debit'), credit=models.Sum('credit'),
+    )
+    for account_id, debit, credit in own_totals:
+        current = account_id
+        while current is not None:
+            totals[current][0] += debit
+            totals[current][1] += credit
+            current = parents.get(current)
+
+    AccountBalance.objects.bulk_create([
+        AccountBalance(account_id=account_id, debit=debit, credit=credit)
+        for account_id, (debit, credit) in totals.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0017_alter_account_key_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountBalance',
+            fields=[
+                ('account', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance_snapshot', serialize=False, to='ledger.account')),
+                ('debit', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('credit', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+        ),
+        migrations.RunPython(populate_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.0.3 on 2026-10-18 04:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_closure(apps, schema_editor):
+    Account = apps.get_model('ledger', 'Account')
+    AccountClosure = apps.get_model('ledger', 'AccountClosure')
+
+    parents = dict(Account.objects.values_list('pk', 'parent_id'))
+    links = []
+    for account_id in parents:
+        ancestor_id, depth = account_id, 0
+        while ancestor_id is not None:
+            links.append(AccountClosure(ancestor_id=ancestor_id, descendant_id=account_id, depth=depth))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+
+    AccountClosure.objects.bulk_create(links, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0018_accountbalance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='ledger.account')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='ledger.account')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='accountclosure',
+            constraint=models.UniqueConstraint(fields=('ancestor', 'descendant'), name='account_closure_unique_pair'),
+        ),
+        migrations.RunPython(populate_closure, migrations.RunPython.noop),
+    ]
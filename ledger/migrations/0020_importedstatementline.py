@@ -0,0 +1,30 @@
+# Generated by Django 4.0.3 on 2026-10-18 04:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0019_accountclosure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportedStatementLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('notes_hash', models.CharField(max_length=64)),
+                ('occurrence', models.PositiveIntegerField(default=0)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='imported_statement_lines', to='ledger.company')),
+                ('transaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='statement_line', to='ledger.transaction')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='importedstatementline',
+            constraint=models.UniqueConstraint(fields=('company', 'date', 'amount', 'notes_hash', 'occurrence'), name='imported_statement_line_unique'),
+        ),
+    ]
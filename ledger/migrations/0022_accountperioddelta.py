@@ -0,0 +1,52 @@
+# Generated by Django 4.0.3 on 2026-10-18 09:12
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_history(apps, schema_editor):
+    AccountPeriodDelta = apps.get_model('ledger', 'AccountPeriodDelta')
+    Detail = apps.get_model('ledger', 'Detail')
+
+    buckets = defaultdict(lambda: [Decimal(0), Decimal(0)])
+    daily = Detail.objects.order_by().values_list('account_id', 'transaction__date').annotate(
+        debit=models.Sum('debit'), credit=models.Sum('credit'),
+    )
+    for account_id, date, debit, credit in daily:
+        for granularity, period in (('D', date), ('M', date.replace(day=1))):
+            buckets[account_id, granularity, period][0] += debit
+            buckets[account_id, granularity, period][1] += credit
+
+    AccountPeriodDelta.objects.bulk_create([
+        AccountPeriodDelta(account_id=account_id, granularity=granularity, period=period, debit=debit, credit=credit)
+        for (account_id, granularity, period), (debit, credit) in buckets.items()
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0021_modified_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountPeriodDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('D', 'Day'), ('M', 'Month')], max_length=1)),
+                ('period', models.DateField()),
+                ('debit', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('credit', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='period_deltas', to='ledger.account')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='accountperioddelta',
+            constraint=models.UniqueConstraint(fields=('account', 'granularity', 'period'), name='account_period_delta_unique_bucket'),
+        ),
+        migrations.RunPython(populate_history, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.0.3 on 2026-10-18 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0023_balancecheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='detail',
+            index=models.Index(fields=['account', 'transaction', 'debit', 'credit'], name='detail_account_covering_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['company', 'date'], name='transaction_company_date_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.0.3 on 2026-10-18 11:25
+
+from django.db import migrations, models
+import time
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0024_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='tree_version',
+            field=models.PositiveBigIntegerField(default=time.time_ns, editable=False),
+        ),
+    ]
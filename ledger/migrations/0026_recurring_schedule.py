@@ -0,0 +1,43 @@
+# Generated by Django 4.0.3 on 2026-10-18 12:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0025_company_tree_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recurringtransaction',
+            name='cadence',
+            field=models.SmallIntegerField(blank=True, choices=[(1, 'Weekly'), (2, 'Biweekly'), (3, 'Monthly'), (4, 'Quarterly'), (5, 'Yearly')], null=True),
+        ),
+        migrations.AddField(
+            model_name='recurringtransaction',
+            name='next_due',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='recurringtransaction',
+            name='starts_on',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='RecurringTransactionPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('due_date', models.DateField()),
+                ('modified', models.DateTimeField(auto_now=True, db_index=True)),
+                ('recurring_transaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='ledger.recurringtransaction')),
+                ('transaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_posting', to='ledger.transaction')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='recurringtransactionposting',
+            constraint=models.UniqueConstraint(fields=('recurring_transaction', 'due_date'), name='recurring_transaction_posting_unique'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.0.3 on 2026-10-18 14:05
+
+from django.db import migrations
+
+# content table -> FTS5 index of its notes. Django's SQLite schema editor alters a table by rebuilding it,
+# which drops its triggers: a later migration that alters one of these tables must recreate them.
+SEARCH_INDEXES = {
+    'ledger_transaction': 'ledger_transaction_search',
+    'ledger_detail': 'ledger_detail_search',
+    'ledger_recurringtransactiondetail': 'ledger_recurringtransactiondetail_search',
+}
+
+
+def create_trigger_sql(table, index):
+    # keep the index in step with inserts, deletes and notes updates of its table
+    return [
+        f"""CREATE TRIGGER {index}_insert AFTER INSERT ON {table} WHEN new.notes IS NOT NULL AND new.notes != '' BEGIN
+            INSERT INTO {index}(rowid, notes) VALUES (new.id, new.notes);
+        END""",
+        f"""CREATE TRIGGER {index}_delete AFTER DELETE ON {table} WHEN old.notes IS NOT NULL AND old.notes != '' BEGIN
+            INSERT INTO {index}({index}, rowid, notes) VALUES ('delete', old.id, old.notes);
+        END""",
+        f"""CREATE TRIGGER {index}_update AFTER UPDATE OF notes ON {table} WHEN old.notes IS NOT new.notes BEGIN
+            INSERT INTO {index}({index}, rowid, notes) SELECT 'delete', old.id, old.notes WHERE old.notes IS NOT NULL AND old.notes != '';
+            INSERT INTO {index}(rowid, notes) SELECT new.id, new.notes WHERE new.notes IS NOT NULL AND new.notes != '';
+        END""",
+    ]
+
+
+def create_index_sql(table, index):
+    # an external content index: notes are stored once, in the model table; rows without notes are never indexed
+    return [
+        f"CREATE VIRTUAL TABLE {index} USING fts5(notes, content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f"INSERT INTO {index}(rowid, notes) SELECT id, notes FROM {table} WHERE notes IS NOT NULL AND notes != ''",
+        *create_trigger_sql(table, index),
+    ]
+
+
+def drop_index_sql(table, index):
+    return [f'DROP TRIGGER {index}_{event}' for event in ('insert', 'delete', 'update')] + [f'DROP TABLE {index}']
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0026_recurring_schedule'),
+    ]
+
+    operations = [
+        migrations.RunSQL(create_index_sql(table, index), drop_index_sql(table, index))
+        for table, index in SEARCH_INDEXES.items()
+    ]
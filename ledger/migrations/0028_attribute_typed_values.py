@@ -0,0 +1,98 @@
+# Generated by Django 4.0.3 on 2026-10-18 14:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+import datetime
+import json
+from decimal import Decimal
+
+
+def populate_typed_values(apps, schema_editor):
+    # kinds: 0 TEXT, 1 NUMBER, 2 ARRAY, 3 CHOICE, 4 DATE; values that do not fit their kind keep empty typed columns
+    UserDefinedAttributeDetailThrough = apps.get_model('ledger', 'UserDefinedAttributeDetailThrough')
+    UserDefinedAttributeItem = apps.get_model('ledger', 'UserDefinedAttributeItem')
+
+    values = list(UserDefinedAttributeDetailThrough.objects.select_related('attribute'))
+    items = []
+    for value in values:
+        kind = value.attribute.kind
+        try:
+            if kind == 1:
+                number = Decimal(value.value.strip())
+                if number.is_finite() and abs(number) < Decimal(10) ** 14:
+                    value.number_value = number
+            elif kind == 2:
+                elements = json.loads(value.value)
+                if isinstance(elements, list) and all(isinstance(element, str) for element in elements):
+                    items.extend(
+                        UserDefinedAttributeItem(value=value, attribute_id=value.attribute_id, item=element)
+                        for element in dict.fromkeys(elements)
+                    )
+            elif kind == 4:
+                value.date_value = datetime.date.fromisoformat(value.value.strip())
+            elif kind == 0 or value.value in json.loads(value.attribute.metadata or '[]'):
+                value.text_value = value.value
+        except (ArithmeticError, ValueError):
+            pass
+
+    UserDefinedAttributeDetailThrough.objects.bulk_update(values, ['text_value', 'number_value', 'date_value'], batch_size=1000)
+    UserDefinedAttributeItem.objects.bulk_create(items, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0027_note_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDefinedAttributeItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item', models.TextField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='userdefinedattributedetailthrough',
+            name='date_value',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='userdefinedattributedetailthrough',
+            name='number_value',
+            field=models.DecimalField(decimal_places=6, editable=False, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='userdefinedattributedetailthrough',
+            name='text_value',
+            field=models.TextField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='userdefinedattributedetailthrough',
+            index=models.Index(fields=['attribute', 'text_value', 'detail'], name='attribute_text_value_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userdefinedattributedetailthrough',
+            index=models.Index(fields=['attribute', 'number_value', 'detail'], name='attribute_number_value_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userdefinedattributedetailthrough',
+            index=models.Index(fields=['attribute', 'date_value', 'detail'], name='attribute_date_value_idx'),
+        ),
+        migrations.AddField(
+            model_name='userdefinedattributeitem',
+            name='attribute',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ledger.userdefinedattribute'),
+        ),
+        migrations.AddField(
+            model_name='userdefinedattributeitem',
+            name='value',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='ledger.userdefinedattributedetailthrough'),
+        ),
+        migrations.AddIndex(
+            model_name='userdefinedattributeitem',
+            index=models.Index(fields=['attribute', 'item', 'value'], name='attribute_item_idx'),
+        ),
+        migrations.RunPython(populate_typed_values, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 4.0.3 on 2026-10-18 15:10
+
+import importlib
+
+import django.core.validators
+from django.db import migrations
+import ledger.money
+
+note_search = importlib.import_module('ledger.migrations.0027_note_search')
+
+# table -> amount columns, stored as integer cents from here on
+MONEY_COLUMNS = {
+    'ledger_detail': ['debit', 'credit'],
+    'ledger_recurringtransactiondetail': ['debit', 'credit'],
+    'ledger_accountbalance': ['debit', 'credit'],
+    'ledger_accountperioddelta': ['debit', 'credit'],
+    'ledger_balancecheckpoint': ['debit', 'credit'],
+    'ledger_importedstatementline': ['amount'],
+}
+# altering a column rebuilds its table, which drops the note search triggers (see 0027)
+REBUILT_SEARCH_TABLES = ['ledger_detail', 'ledger_recurringtransactiondetail']
+
+
+def to_cents_sql(table, columns):
+    return [f'UPDATE {table} SET ' + ', '.join(f'{column} = CAST(ROUND({column} * 100) AS INTEGER)' for column in columns)]
+
+
+def to_amounts_sql(table, columns):
+    return [f'UPDATE {table} SET ' + ', '.join(f'{column} = {column} / 100.0' for column in columns)]
+
+
+def search_trigger_sql():
+    return [sql for table in REBUILT_SEARCH_TABLES for sql in note_search.create_trigger_sql(table, note_search.SEARCH_INDEXES[table])]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0028_attribute_typed_values'),
+    ]
+
+    operations = [
+        # on the way back the columns are rebuilt last, so the triggers are recreated by the first operation
+        migrations.RunSQL(migrations.RunSQL.noop, search_trigger_sql()),
+    ] + [
+        migrations.RunSQL(to_cents_sql(table, columns), to_amounts_sql(table, columns))
+        for table, columns in MONEY_COLUMNS.items()
+    ] + [
+        migrations.AlterField(
+            model_name='accountbalance',
+            name='credit',
+            field=ledger.money.MoneyField(default=0, max_digits=16),
+        ),
+        migrations.AlterField(
+            model_name='accountbalance',
+            name='debit',
+            field=ledger.money.MoneyField(default=0, max_digits=16),
+        ),
+        migrations.AlterField(
+            model_name='accountperioddelta',
+            name='credit',
+            field=ledger.money.MoneyField(default=0, max_digits=16),
+        ),
+        migrations.AlterField(
+            model_name='accountperioddelta',
+            name='debit',
+            field=ledger.money.MoneyField(default=0, max_digits=16),
+        ),
+        migrations.AlterField(
+            model_name='balancecheckpoint',
+            name='credit',
+            field=ledger.money.MoneyField(default=0, max_digits=16),
+        ),
+        migrations.AlterField(
+            model_name='balancecheckpoint',
+            name='debit',
+            field=ledger.money.MoneyField(default=0, max_digits=16),
+        ),
+        migrations.AlterField(
+            model_name='detail',
+            name='credit',
+            field=ledger.money.MoneyField(max_digits=12, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='detail',
+            name='debit',
+            field=ledger.money.MoneyField(max_digits=12, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='importedstatementline',
+            name='amount',
+            field=ledger.money.MoneyField(max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='recurringtransactiondetail',
+            name='credit',
+            field=ledger.money.MoneyField(max_digits=12, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='recurringtransactiondetail',
+            name='debit',
+            field=ledger.money.MoneyField(max_digits=12, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.RunSQL(search_trigger_sql(), migrations.RunSQL.noop),
+    ]
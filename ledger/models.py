@@ -1,16 +1,25 @@
+import datetime
+import json
+import time
 from decimal import Decimal
-from typing import Any
+from typing import Any, NamedTuple
 from django.db import models
+from django.db import transaction as db_transaction
 from django.db.models import QuerySet
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 
+from .money import MoneyField, money_value
+
 # Create your models here.
 class Company(models.Model):
     class Meta:
         verbose_name_plural = 'companies'
 
     name = models.TextField(unique=True)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
+    # cache key version of the company's account tree; bumped on every change to its accounts or transactions
+    tree_version = models.PositiveBigIntegerField(default=time.time_ns, editable=False)
 
     def __str__(self) -> str:
         return self.name
@@ -44,24 +53,43 @@ class Account(models.Model):
     kind = models.SmallIntegerField(choices=AccountKind.choices)
     opening_date = models.DateField(auto_now_add=True)
     is_leaf = models.BooleanField(default=False)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
 
     @property
-    def balance(self):
-        match self.kind:
+    def balance(self) -> Decimal:
+        # snapshot already holds the totals for this account and all of its descendants
+        try:
+            snapshot = self.balance_snapshot
+        except AccountBalance.DoesNotExist:
+            return Decimal(0)
+
+        return snapshot.balance_for(self.kind)
+
+    @staticmethod
+    def signed_total(kind: int, debit: Decimal, credit: Decimal) -> Decimal:
+        match kind:
             case Account.AccountKind.ASSET:
-                total_expression = models.Sum(models.F('debit') - models.F('credit'))
+                return debit - credit
             case Account.AccountKind.LIABILITY | Account.AccountKind.EQUITY:
-                total_expression = models.Sum(models.F('credit') - models.F('debit'))
-        
-        return (
-            self.transaction_details.aggregate(balance=total_expression)['balance'] or 0
-        ) + sum([
-            child.balance
-            for child in self.children.iterator()
-        ])
+                return credit - debit
+
+    @staticmethod
+    def signed_amount_expression(kind: int, prefix: str = '') -> models.Expression:
+        # per-row signed amount of a Detail (or a relation to one through `prefix`)
+        debit, credit = models.F(f'{prefix}debit'), models.F(f'{prefix}credit')
+        match kind:
+            case Account.AccountKind.ASSET:
+                return models.ExpressionWrapper(debit - credit, output_field=MoneyField(max_digits=16))
+            case Account.AccountKind.LIABILITY | Account.AccountKind.EQUITY:
+                return models.ExpressionWrapper(credit - debit, output_field=MoneyField(max_digits=16))
 
     objects = AccountModelManager()
 
+    def save(self, *args, **kwargs) -> None:
+        # closure rows and balance snapshots are updated by signals; keep them in the same DB transaction
+        with db_transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self) -> str:
         return f'{self.key} - {self.description}'
 
@@ -69,18 +97,60 @@ class Account(models.Model):
         if self.parent is not None and self.parent.kind != self.kind:
             raise ValidationError('Account must be of same kind as parent account.')
 
+        if self.pk is not None and self.parent_id is not None \
+                and AccountClosure.objects.filter(ancestor_id=self.pk, descendant_id=self.parent_id).exists():
+            raise ValidationError('Account cannot be moved underneath itself.')
+
+    def get_descendants(self) -> QuerySet['Account']:
+        # includes the account itself
+        return Account.objects.prefetch_related(None).filter(ancestor_links__ancestor=self)
+
     def get_details(self) -> QuerySet['Detail']:
-        return Detail.objects.filter(account=self).union(
-            *[account.get_details() for account in self.children.all()]
+        return Detail.objects.filter(account__ancestor_links__ancestor=self)
+
+    def balance_as_of(self, as_of: datetime.date) -> Decimal:
+        # balance of this account and its descendants including every detail dated on or before `as_of`
+        from .history import subtree_totals_as_of
+
+        debit, credit = subtree_totals_as_of(self.company_id, as_of, self).get(self.pk, (Decimal(0), Decimal(0)))
+        return Account.signed_total(self.kind, debit, credit)
+
+    def get_activity(
+        self,
+        after: tuple[datetime.date, int] | None = None,
+        opening_balance: Decimal = Decimal(0),
+        until: datetime.date | None = None,
+    ) -> QuerySet['Detail']:
+        # details of the whole subtree in posting order with a running balance computed by the DB;
+        # `after` is a (date, detail pk) keyset cursor, `opening_balance` the balance at that cursor
+        # and `until` the last transaction date to include
+        ordering = [models.F('transaction__date').asc(), models.F('pk').asc()]
+        details = self.get_details()
+        if until is not None:
+            details = details.filter(transaction__date__lte=until)
+        if after is not None:
+            after_date, after_pk = after
+            details = details.filter(models.Q(transaction__date__gt=after_date) | models.Q(transaction__date=after_date, pk__gt=after_pk))
+
+        running_balance = models.Window(
+            expression=models.Sum(Account.signed_amount_expression(self.kind)),
+            order_by=ordering,
+            frame=models.RowRange(start=None, end=0),
+        )
+        return (
+            details
+            .select_related('account')
+            .annotate(running_balance=models.ExpressionWrapper(
+                money_value(opening_balance) + running_balance,
+                output_field=MoneyField(max_digits=16),
+            ))
+            .order_by(*ordering)
         )
 
     def get_all_opening_balance_details(self) -> list[dict[str, Any]]:
-        records = []
-        
-        for child in self.children.iterator():
-            records.extend(child.get_all_opening_balance_details())
-
-        return records
+        # opening balances are no longer stored on accounts (see migration 0009), so
+        # there is nothing to collect from the subtree
+        return []
 
     class Meta:
         ordering = ['key']
@@ -92,29 +162,53 @@ class Account(models.Model):
         ]
 
 
+class AccountClosure(models.Model):
+    # one row for every (ancestor, descendant) pair in the account tree, including (account, account)
+    ancestor = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['ancestor', 'descendant'],
+                name='account_closure_unique_pair',
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f'AccountClosure(ancestor={self.ancestor_id}, descendant={self.descendant_id}, depth={self.depth})'
+
+
 class Transaction(models.Model):
     date = models.DateField()
     notes = models.TextField(null=True, blank=True)
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='transactions')
+    modified = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # transactions of a company by date (reports, date range listings)
+            models.Index(fields=['company', 'date'], name='transaction_company_date_idx'),
+        ]
+
+    def save(self, *args, **kwargs) -> None:
+        # moving the date moves the details' balance history buckets (signals); keep them in the same DB transaction
+        with db_transaction.atomic():
+            super().save(*args, **kwargs)
 
     def clean(self) -> None:
-        assets = Decimal(0)
-        liabilities = Decimal(0)
-        equities = Decimal(0)
-        for detail in self.details.iterator():
-            if detail.account.company != self.company:
-                raise ValidationError('All detail lines must use accounts from the same company.')
-            
-            match detail.account.kind:
-                case Account.AccountKind.ASSET:
-                    assets += detail.debit - detail.credit
-                case Account.AccountKind.LIABILITY:
-                    liabilities += detail.credit - detail.debit
-                case Account.AccountKind.EQUITY:
-                    equities += detail.credit - detail.debit
-        
-        if assets - liabilities != equities:
-            raise ValidationError(f'Detail lines do not balance (i.e., ASSETS({assets}) - LIABILITIES({liabilities}) != EQUITIES({equities})).')
+        from .validation import AccountInfo, DetailLine, validate_detail_lines
+
+        # one query for every line together with its account's company and kind
+        rows = self.details.values_list('account_id', 'debit', 'credit', 'account__company_id', 'account__kind')
+        lines = []
+        accounts = {}
+        for account_id, debit, credit, company_id, kind in rows:
+            lines.append(DetailLine(account_id, debit, credit))
+            accounts[account_id] = AccountInfo(company_id, kind)
+
+        validate_detail_lines(lines, accounts, self.company_id)
 
     def __str__(self) -> str:
         return f'Transaction(date={self.date}, details={self.details.count()}, notes={(self.notes or "")[:20]}...)'
@@ -127,18 +221,115 @@ class DetailManager(models.Manager):
 
 class Detail(models.Model):
     transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='details')
-    credit = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(0)])
-    debit = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(0)])
+    credit = MoneyField(max_digits=12, validators=[MinValueValidator(0)])
+    debit = MoneyField(max_digits=12, validators=[MinValueValidator(0)])
     account = models.ForeignKey(Account, on_delete=models.PROTECT, related_name='transaction_details')
     notes = models.TextField(null=True, blank=True)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # covers per-account totals (account tree, snapshot rebuilds) and account -> transaction joins
+            models.Index(fields=['account', 'transaction', 'debit', 'credit'], name='detail_account_covering_idx'),
+        ]
 
     def clean(self) -> None:
         if self.credit != 0 and self.debit != 0:
             raise ValidationError('Detail must be credit or debit; not both.')
 
+    def save(self, *args, **kwargs) -> None:
+        # balance snapshots are updated by signals; keep them in the same DB transaction
+        with db_transaction.atomic():
+            super().save(*args, **kwargs)
+
     objects = DetailManager()
 
 
+class AccountBalance(models.Model):
+    # running totals for an account and all of its descendants
+    account = models.OneToOneField(Account, on_delete=models.CASCADE, primary_key=True, related_name='balance_snapshot')
+    debit = MoneyField(max_digits=16, default=0)
+    credit = MoneyField(max_digits=16, default=0)
+
+    def balance_for(self, kind: int) -> Decimal:
+        return Account.signed_total(kind, self.debit, self.credit)
+
+    def __str__(self) -> str:
+        return f'AccountBalance(account={self.account_id}, debit={self.debit}, credit={self.credit})'
+
+
+class AccountPeriodDelta(models.Model):
+    # debit/credit posted to one account (not its descendants) within a day or month, for balance history charts
+    class Granularity(models.TextChoices):
+        DAY = 'D', 'Day'
+        MONTH = 'M', 'Month'
+
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='period_deltas')
+    granularity = models.CharField(max_length=1, choices=Granularity.choices)
+    # first day of the bucket
+    period = models.DateField()
+    debit = MoneyField(max_digits=16, default=0)
+    credit = MoneyField(max_digits=16, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['account', 'granularity', 'period'],
+                name='account_period_delta_unique_bucket',
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f'AccountPeriodDelta(account={self.account_id}, {self.granularity}={self.period}, debit={self.debit}, credit={self.credit})'
+
+
+class BalanceCheckpoint(models.Model):
+    # debit/credit totals of an account and all of its descendants over every detail dated before `date`
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='balance_checkpoints')
+    date = models.DateField()
+    debit = MoneyField(max_digits=16, default=0)
+    credit = MoneyField(max_digits=16, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['account', 'date'],
+                name='balance_checkpoint_unique_date',
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f'BalanceCheckpoint(account={self.account_id}, date={self.date}, debit={self.debit}, credit={self.credit})'
+
+
+class ImportedStatementLine(models.Model):
+    # bank statement line that has been posted; makes re-importing the same statement a no-op
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='imported_statement_lines')
+    transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE, related_name='statement_line')
+    date = models.DateField()
+    amount = MoneyField(max_digits=12)
+    notes_hash = models.CharField(max_length=64)
+    # n-th line with the same date, amount and notes in a statement (e.g. two identical coffees in a day)
+    occurrence = models.PositiveIntegerField(default=0)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['company', 'date', 'amount', 'notes_hash', 'occurrence'],
+                name='imported_statement_line_unique',
+            )
+        ]
+
+
+class AttributeValue(NamedTuple):
+    # typed form of a user defined attribute value; which fields are set depends on the attribute's kind
+    text: str | None = None
+    number: Decimal | None = None
+    date: datetime.date | None = None
+    items: tuple[str, ...] = ()
+
+
 class UserDefinedAttribute(models.Model):
     class AttributeKind(models.IntegerChoices):
         TEXT = 0
@@ -149,17 +340,58 @@ class UserDefinedAttribute(models.Model):
         
     name = models.TextField()
     kind = models.SmallIntegerField(choices=AttributeKind.choices)
+    # CHOICE: JSON array of the allowed values
     metadata = models.TextField(null=True, editable=False)
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='udf_attributes')
+    modified = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self) -> str:
         return self.name
 
+    @property
+    def choices(self) -> list[str]:
+        return json.loads(self.metadata) if self.kind == self.AttributeKind.CHOICE and self.metadata else []
+
+    def parse_value(self, value: str) -> AttributeValue:
+        """The typed form of a value as entered; raises ValidationError when it does not fit the kind."""
+        match self.kind:
+            case self.AttributeKind.NUMBER:
+                try:
+                    number = Decimal(value.strip())
+                except ArithmeticError:
+                    raise ValidationError(f'{self.name} must be a number.')
+                # number_value holds 14 integer digits
+                if not number.is_finite() or abs(number) >= Decimal(10) ** 14:
+                    raise ValidationError(f'{self.name} must be a number below 10^14.')
+                return AttributeValue(number=number)
+            case self.AttributeKind.DATE:
+                try:
+                    return AttributeValue(date=datetime.date.fromisoformat(value.strip()))
+                except ValueError:
+                    raise ValidationError(f'{self.name} must be a date (YYYY-MM-DD).')
+            case self.AttributeKind.ARRAY:
+                try:
+                    items = json.loads(value)
+                except ValueError:
+                    items = None
+                if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+                    raise ValidationError(f'{self.name} must be a JSON array of strings.')
+                return AttributeValue(items=tuple(dict.fromkeys(items)))
+            case self.AttributeKind.CHOICE:
+                if value not in self.choices:
+                    raise ValidationError(f'{self.name} must be one of {", ".join(self.choices)}.')
+        return AttributeValue(text=value)
+
 
 class UserDefinedAttributeDetailThrough(models.Model):
     detail = models.ForeignKey(Detail, on_delete=models.CASCADE)
     attribute = models.ForeignKey(UserDefinedAttribute, on_delete=models.CASCADE)
+    # as entered; filters use the typed copies below, which are set on save and empty when the value does not parse
     value = models.TextField()
+    text_value = models.TextField(null=True, editable=False)
+    number_value = models.DecimalField(max_digits=20, decimal_places=6, null=True, editable=False)
+    date_value = models.DateField(null=True, editable=False)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         constraints = [
@@ -168,10 +400,40 @@ class UserDefinedAttributeDetailThrough(models.Model):
                 name='detail_attribute_unique_together'
             )
         ]
+        indexes = [
+            # every attribute filter is an index range scan yielding detail ids
+            models.Index(fields=['attribute', 'text_value', 'detail'], name='attribute_text_value_idx'),
+            models.Index(fields=['attribute', 'number_value', 'detail'], name='attribute_number_value_idx'),
+            models.Index(fields=['attribute', 'date_value', 'detail'], name='attribute_date_value_idx'),
+        ]
 
     def clean(self) -> None:
         if self.detail.account.company != self.attribute.company:
             raise ValidationError('Detail must be from same company as attribute.')
+        self.attribute.parse_value(self.value)
+
+    def set_typed_value(self) -> AttributeValue:
+        try:
+            typed = self.attribute.parse_value(self.value)
+        except ValidationError:
+            typed = AttributeValue()
+        self.text_value, self.number_value, self.date_value = typed.text, typed.number, typed.date
+        return typed
+
+
+class UserDefinedAttributeItem(models.Model):
+    # one element of an ARRAY attribute value, so "tagged X" is an index lookup; derived from the value and rebuilt on restore
+    value = models.ForeignKey(UserDefinedAttributeDetailThrough, on_delete=models.CASCADE, related_name='items')
+    attribute = models.ForeignKey(UserDefinedAttribute, on_delete=models.CASCADE, related_name='+')
+    item = models.TextField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['attribute', 'item', 'value'], name='attribute_item_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'UserDefinedAttributeItem(value={self.value_id}, item={self.item})'
 
 
 class QuickTransaction(models.Model):
@@ -185,6 +447,7 @@ class QuickTransaction(models.Model):
     account_to_charge_kind = models.SmallIntegerField(choices=ChargeKind.choices)
     name = models.TextField()
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='quick_transactions')
+    modified = models.DateTimeField(auto_now=True, db_index=True)
 
     def clean(self) -> None:
         if self.account_from.company != self.company or self.account_to.company != self.company:
@@ -208,30 +471,84 @@ class QuickTransaction(models.Model):
         if asset - liability != equity:
             raise ValidationError('Accounts do not balance (i.e. ASSETS - LIABILITIES != EQUITIES).')
 
+    def build_details(self, transaction: Transaction, amount: Decimal, notes: str | None = None) -> list[Detail]:
+        # unsaved from/to detail lines for posting `amount` through this template
+        return [
+            Detail(
+                transaction=transaction,
+                account_id=account_id,
+                credit=amount if charge_kind == QuickTransaction.ChargeKind.CREDIT else Decimal(0),
+                debit=amount if charge_kind == QuickTransaction.ChargeKind.DEBIT else Decimal(0),
+                notes=notes,
+            )
+            for account_id, charge_kind in [
+                (self.account_from_id, self.account_from_charge_kind),
+                (self.account_to_id, self.account_to_charge_kind),
+            ]
+        ]
+
     def __str__(self) -> str:
         return self.name
 
 
 class RecurringTransaction(models.Model):
+    class Cadence(models.IntegerChoices):
+        WEEKLY = 1
+        BIWEEKLY = 2
+        MONTHLY = 3
+        QUARTERLY = 4
+        YEARLY = 5
+
     name = models.TextField()
     company = models.ForeignKey(Company, models.CASCADE, related_name='recurring_transactions')
     notes = models.TextField(null=True, blank=True)
+    # templates without a cadence are only posted by hand
+    cadence = models.SmallIntegerField(choices=Cadence.choices, null=True, blank=True)
+    # first due date; later ones are counted from it so month ends do not drift
+    starts_on = models.DateField(null=True, blank=True)
+    # earliest due date that has not been posted yet
+    next_due = models.DateField(null=True, blank=True, db_index=True)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self) -> str:
         return self.name
 
     def clean(self) -> None:
+        if self.cadence is not None and self.starts_on is None:
+            raise ValidationError('A scheduled recurring transaction needs a start date.')
         # all detail accounts must be in company
         Transaction.clean(self)
 
+    def save(self, *args, **kwargs) -> None:
+        if self.cadence is not None and self.next_due is None:
+            self.next_due = self.starts_on
+        super().save(*args, **kwargs)
+
 
 class RecurringTransactionDetail(models.Model):
     parent = models.ForeignKey(RecurringTransaction, models.CASCADE, related_name='details')
-    credit = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(0)])
-    debit = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(0)])
+    credit = MoneyField(max_digits=12, validators=[MinValueValidator(0)])
+    debit = MoneyField(max_digits=12, validators=[MinValueValidator(0)])
     account = models.ForeignKey(Account, on_delete=models.PROTECT, related_name='recurring_transaction_details')
     notes = models.TextField(null=True, blank=True)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
 
     def clean(self) -> None:
         if self.credit != 0 and self.debit != 0:
             raise ValidationError('Detail must be credit or debit; not both.')
+
+
+class RecurringTransactionPosting(models.Model):
+    # due date of a recurring transaction that has been posted; makes re-running the scheduler a no-op
+    recurring_transaction = models.ForeignKey(RecurringTransaction, on_delete=models.CASCADE, related_name='postings')
+    due_date = models.DateField()
+    transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE, related_name='recurring_posting')
+    modified = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recurring_transaction', 'due_date'],
+                name='recurring_transaction_posting_unique',
+            )
+        ]
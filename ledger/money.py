@@ -0,0 +1,135 @@
+from decimal import Decimal
+from typing import Any
+
+from django import forms
+from django.core import exceptions, validators
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+from django.utils.functional import cached_property
+
+CENT = Decimal('0.01')
+
+
+class Money(Decimal):
+    """
+    An amount of whole cents. Behaves like the Decimal it is (templates, `as_currency`, JSON), and sums and
+    differences of Money stay Money.
+    """
+
+    def __new__(cls, value: Any = 0) -> 'Money':
+        amount = Decimal(repr(value)) if isinstance(value, float) else Decimal(value)
+        cents = amount.quantize(CENT)
+        if cents != amount:
+            raise ValueError(f'Not a whole number of cents: {value!r}')
+        return super().__new__(cls, cents)
+
+    @classmethod
+    def from_cents(cls, cents: int) -> 'Money':
+        return super().__new__(cls, Decimal(int(cents)).scaleb(-2))
+
+    @property
+    def cents(self) -> int:
+        return int(self.scaleb(2))
+
+    def __repr__(self) -> str:
+        return f"Money('{self}')"
+
+    def __add__(self, other: Any) -> Decimal:
+        return as_money(super().__add__(other))
+
+    def __radd__(self, other: Any) -> Decimal:
+        return as_money(super().__radd__(other))
+
+    def __sub__(self, other: Any) -> Decimal:
+        return as_money(super().__sub__(other))
+
+    def __rsub__(self, other: Any) -> Decimal:
+        return as_money(super().__rsub__(other))
+
+    def __neg__(self) -> 'Money':
+        return Money.from_cents(-self.cents)
+
+    def __pos__(self) -> 'Money':
+        return self
+
+    def __abs__(self) -> 'Money':
+        return Money.from_cents(abs(self.cents))
+
+
+def as_money(value: Any) -> Any:
+    # Money when `value` is a whole number of cents; anything else (a finer Decimal, NotImplemented) unchanged
+    if isinstance(value, Decimal) and not isinstance(value, Money):
+        try:
+            return Money(value)
+        except (ValueError, ArithmeticError):
+            pass
+    return value
+
+
+class MoneyAttribute(DeferredAttribute):
+    # converts amounts on assignment, so unsaved instances hold Money just like loaded ones; values that are
+    # not amounts (expressions, bad input) are kept for the ORM and validation to deal with
+    def __set__(self, instance: models.Model, value: Any) -> None:
+        if value is not None and not isinstance(value, Money):
+            try:
+                value = Money(value)
+            except (ValueError, TypeError, ArithmeticError):
+                pass
+        instance.__dict__[self.field.attname] = value
+
+
+class MoneyField(models.BigIntegerField):
+    """An amount of money, stored as an integer number of cents and loaded as Money."""
+
+    description = 'Amount of money (whole cents)'
+    descriptor_class = MoneyAttribute
+    default_error_messages = {
+        'invalid': '“%(value)s” value must be an amount with at most two decimal places.',
+    }
+
+    def __init__(self, *args: Any, max_digits: int = 12, **kwargs: Any) -> None:
+        # digits of the amount as entered, cents included
+        self.max_digits = max_digits
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self) -> tuple:
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['max_digits'] = self.max_digits
+        return name, path, args, kwargs
+
+    @cached_property
+    def validators(self) -> list:
+        return [*super().validators, validators.DecimalValidator(self.max_digits, 2)]
+
+    def from_db_value(self, value: int | None, expression: Any, connection: Any) -> Money | None:
+        return None if value is None else Money.from_cents(value)
+
+    def to_python(self, value: Any) -> Money | None:
+        if value is None or isinstance(value, Money):
+            return value
+        try:
+            return Money(value)
+        except (ValueError, TypeError, ArithmeticError):
+            raise exceptions.ValidationError(self.error_messages['invalid'], code='invalid', params={'value': value})
+
+    def get_prep_value(self, value: Any) -> int | None:
+        value = models.Field.get_prep_value(self, value)
+        return None if value is None else self.to_python(value).cents
+
+    def formfield(self, **kwargs: Any) -> forms.Field:
+        return models.Field.formfield(self, **{
+            'form_class': forms.DecimalField,
+            'max_digits': self.max_digits,
+            'decimal_places': 2,
+            **kwargs,
+        })
+
+
+def money_value(amount: Any) -> models.Value:
+    # an amount as an SQL parameter next to MoneyField columns; a bare Decimal would be bound in dollars
+    return models.Value(amount, output_field=MoneyField(max_digits=16))
+
+
+def as_cents(expression: models.Expression) -> models.ExpressionWrapper:
+    # the raw integer cents of a money expression, e.g. for NumPy arrays
+    return models.ExpressionWrapper(expression, output_field=models.BigIntegerField())
@@ -0,0 +1,135 @@
+import datetime
+from decimal import Decimal
+from typing import NamedTuple, Sequence
+
+from django.core.exceptions import ValidationError
+from django.db import transaction as db_transaction
+
+from .balances import apply_detail_deltas
+from .caching import bump_tree_version
+from .history import apply_history_deltas
+from .models import Company, Detail, QuickTransaction, Transaction
+from .validation import DetailLine, load_account_info, validate_detail_lines
+
+
+class DetailEntry(NamedTuple):
+    account_id: int
+    debit: Decimal
+    credit: Decimal
+    notes: str | None = None
+
+
+class TransactionEntry(NamedTuple):
+    date: datetime.date
+    details: list[DetailEntry]
+    notes: str | None = None
+
+
+class QuickTransactionEntry(NamedTuple):
+    quick_transaction_id: int
+    date: datetime.date
+    amount: Decimal
+    notes: str | None = None
+
+
+def bulk_post(transactions: Sequence[Transaction], details: Sequence[Detail], batch_size: int = 500) -> None:
+    """
+    Insert already validated transactions and their details with bulk_create.
+
+    bulk_create skips model signals, so the balance snapshots, history buckets and cached account trees
+    are updated here in the same DB transaction.
+    """
+    with db_transaction.atomic():
+        Transaction.objects.bulk_create(transactions, batch_size=batch_size)
+        Detail.objects.bulk_create(details, batch_size=batch_size)
+        apply_detail_deltas([(detail.account_id, detail.debit, detail.credit) for detail in details])
+        # assigning transaction_id during bulk_create drops the cached transaction, so look dates up by pk
+        dates = {transaction.pk: transaction.date for transaction in transactions}
+        apply_history_deltas([(detail.account_id, dates[detail.transaction_id], detail.debit, detail.credit) for detail in details])
+        bump_tree_version({transaction.company_id for transaction in transactions})
+
+
+def post_quick_transactions(company: Company, entries: Sequence[QuickTransactionEntry]) -> list[Transaction]:
+    """Validate a batch of quick transaction submissions in memory and post them all at once."""
+    quick_transactions = QuickTransaction.objects.filter(company=company, pk__in={entry.quick_transaction_id for entry in entries})
+    quick_transactions = {quick_transaction.pk: quick_transaction for quick_transaction in quick_transactions}
+    accounts = load_account_info(
+        account_id
+        for quick_transaction in quick_transactions.values()
+        for account_id in (quick_transaction.account_from_id, quick_transaction.account_to_id)
+    )
+
+    transactions = []
+    details = []
+    errors = []
+    for number, entry in enumerate(entries, start=1):
+        quick_transaction = quick_transactions.get(entry.quick_transaction_id)
+        if quick_transaction is None:
+            errors.append(ValidationError(f'Entry {number}: quick transaction {entry.quick_transaction_id} does not belong to {company}.'))
+            continue
+        if entry.amount < 0:
+            errors.append(ValidationError(f'Entry {number}: amount must not be negative.'))
+            continue
+
+        transaction = Transaction(date=entry.date, notes=entry.notes, company=company)
+        entry_details = quick_transaction.build_details(transaction, entry.amount, entry.notes)
+        try:
+            validate_detail_lines(
+                [DetailLine(detail.account_id, detail.debit, detail.credit) for detail in entry_details],
+                accounts,
+                company.pk,
+            )
+        except ValidationError as e:
+            errors.append(ValidationError(f'Entry {number}: {"; ".join(e.messages)}'))
+            continue
+
+        transactions.append(transaction)
+        details.extend(entry_details)
+
+    if errors:
+        raise ValidationError(errors)
+
+    bulk_post(transactions, details)
+    return transactions
+
+
+def post_transactions(company: Company, entries: Sequence[TransactionEntry]) -> list[Transaction]:
+    """
+    Validate a batch of transactions in memory, with the rules of Detail.clean and Transaction.clean,
+    and post them all at once. Nothing is posted if any entry is invalid.
+    """
+    accounts = load_account_info(detail.account_id for entry in entries for detail in entry.details)
+
+    transactions = []
+    details = []
+    errors = []
+    for number, entry in enumerate(entries, start=1):
+        try:
+            if len(entry.details) < 2:
+                raise ValidationError('A transaction needs at least two detail lines.')
+            for detail in entry.details:
+                if detail.debit < 0 or detail.credit < 0:
+                    raise ValidationError('Amounts must not be negative.')
+                if detail.debit != 0 and detail.credit != 0:
+                    raise ValidationError('Detail must be credit or debit; not both.')
+            validate_detail_lines(
+                [DetailLine(detail.account_id, detail.debit, detail.credit) for detail in entry.details],
+                accounts,
+                company.pk,
+            )
+        except ValidationError as e:
+            errors.append(ValidationError(f'Entry {number}: {"; ".join(e.messages)}'))
+            continue
+
+        transaction = Transaction(date=entry.date, notes=entry.notes, company=company)
+        transactions.append(transaction)
+        details.extend(
+            Detail(transaction=transaction, account_id=detail.account_id, debit=detail.debit, credit=detail.credit, notes=detail.notes)
+            for detail in entry.details
+        )
+
+    if errors:
+        raise ValidationError(errors)
+
+    bulk_post(transactions, details)
+    return transactions
@@ -0,0 +1,191 @@
+import json
+import logging
+import math
+import re
+import statistics
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpRequest, HttpResponse
+from django.template import Context, base as template_base
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+logger = logging.getLogger('ledger.profiling')
+
+# placeholder lists of any length ("IN (%s, %s)") share one fingerprint
+IN_LIST_PATTERN = re.compile(r'IN \((?:%s, )*%s\)')
+# duplicate query fingerprints shown in the panel
+PANEL_DUPLICATES = 10
+
+_active_profile: ContextVar['RequestProfile | None'] = ContextVar('active_profile', default=None)
+
+
+def fingerprint(sql: str) -> str:
+    """The statement with its IN lists collapsed; parameters are never part of it."""
+    return IN_LIST_PATTERN.sub('IN (...)', sql)
+
+
+@dataclass
+class RequestProfile:
+    started: float = field(default_factory=time.perf_counter)
+    total_seconds: float = 0.0
+    sql_seconds: float = 0.0
+    template_seconds: float = 0.0
+    queries: Counter = field(default_factory=Counter)
+    rendering: bool = False
+
+    @property
+    def query_count(self) -> int:
+        return sum(self.queries.values())
+
+    @property
+    def python_seconds(self) -> float:
+        return max(self.total_seconds - self.sql_seconds - self.template_seconds, 0.0)
+
+    def duplicates(self) -> list[tuple[str, int]]:
+        """Fingerprints run more than once, most repeated first; usually an N+1."""
+        return [(sql, count) for sql, count in self.queries.most_common() if count > 1]
+
+    def record_query(self, execute: Callable, sql: str, params: Any, many: bool, context: dict[str, Any]) -> Any:
+        # connection.execute_wrapper hook
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - started
+            self.queries[fingerprint(sql)] += 1
+
+    def server_timing(self) -> str:
+        return ', '.join([
+            f'sql;dur={self.sql_seconds * 1000:.1f};desc="{self.query_count} queries"',
+            f'tpl;dur={self.template_seconds * 1000:.1f};desc="Templates"',
+            f'py;dur={self.python_seconds * 1000:.1f};desc="Python"',
+            f'total;dur={self.total_seconds * 1000:.1f}',
+        ])
+
+    def as_record(self, request: HttpRequest, response: HttpResponse) -> dict[str, Any]:
+        match = request.resolver_match
+        return {
+            'time': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'endpoint': match.view_name if match is not None else request.path,
+            'status': response.status_code,
+            'queries': self.query_count,
+            'duplicate_queries': sum(count - 1 for _, count in self.duplicates()),
+            'total_ms': round(self.total_seconds * 1000, 2),
+            'sql_ms': round(self.sql_seconds * 1000, 2),
+            'template_ms': round(self.template_seconds * 1000, 2),
+            'python_ms': round(self.python_seconds * 1000, 2),
+        }
+
+
+_original_render = template_base.Template.render
+
+
+def timed_render(self: template_base.Template, context: Context) -> str:
+    """Template.render that adds the outermost render's time, less the SQL run inside it, to the active profile."""
+    profile = _active_profile.get()
+    if profile is None or profile.rendering:
+        return _original_render(self, context)
+
+    profile.rendering = True
+    started, sql_before = time.perf_counter(), profile.sql_seconds
+    try:
+        return _original_render(self, context)
+    finally:
+        profile.template_seconds += time.perf_counter() - started - (profile.sql_seconds - sql_before)
+        profile.rendering = False
+
+
+class RequestProfilerMiddleware:
+    """
+    Measure query count, SQL, template and Python time of every request when settings.REQUEST_PROFILING is on.
+
+    Results go out in a Server-Timing header, a panel appended to HTML pages and a JSON line on the
+    `ledger.profiling` logger. Place it first in MIDDLEWARE so the totals cover the other middleware too.
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        template_base.Template.render = timed_render
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        profile = RequestProfile()
+        token = _active_profile.set(profile)
+        try:
+            with connection.execute_wrapper(profile.record_query):
+                response = self.get_response(request)
+        finally:
+            _active_profile.reset(token)
+        profile.total_seconds = time.perf_counter() - profile.started
+
+        response['Server-Timing'] = profile.server_timing()
+        if not response.streaming and response.get('Content-Type', '').startswith('text/html'):
+            self.add_panel(response, profile)
+        logger.info(json.dumps(profile.as_record(request, response)))
+        return response
+
+    def add_panel(self, response: HttpResponse, profile: RequestProfile) -> None:
+        content = response.content.decode(response.charset)
+        end = content.rfind('</body>')
+        if end == -1:
+            return
+
+        panel = render_to_string('profile_panel.html', {
+            'profile': profile,
+            'duplicates': profile.duplicates()[:PANEL_DUPLICATES],
+        })
+        response.content = content[:end] + panel + content[end:]
+        if response.has_header('Content-Length'):
+            response['Content-Length'] = len(response.content)
+
+
+def log_paths(path: Path) -> list[Path]:
+    """The log file and its rotated backups (path.1, path.2, ...), oldest first."""
+    backups = [backup for backup in path.parent.glob(f'{path.name}.*') if backup.suffix[1:].isdigit()]
+    backups.sort(key=lambda backup: int(backup.suffix[1:]), reverse=True)
+    return backups + ([path] if path.exists() else [])
+
+
+def read_profile_log(path: Path) -> Iterator[dict[str, Any]]:
+    for log_path in log_paths(path):
+        with log_path.open() as stream:
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def summarize_profiles(records: Iterable[dict[str, Any]], top: int = 10, sort: str = 'p95_ms') -> list[dict[str, Any]]:
+    """Aggregate request records per endpoint; returns the `top` endpoints by `sort`, slowest first."""
+    by_endpoint: dict[str, list[dict[str, Any]]] = {}
+    for record in records:
+        by_endpoint.setdefault(record['endpoint'], []).append(record)
+
+    summary = []
+    for endpoint, rows in by_endpoint.items():
+        totals = sorted(row['total_ms'] for row in rows)
+        summary.append({
+            'endpoint': endpoint,
+            'requests': len(rows),
+            'mean_ms': round(statistics.fmean(totals), 2),
+            # nearest-rank percentile
+            'p95_ms': totals[math.ceil(0.95 * len(totals)) - 1],
+            'max_ms': totals[-1],
+            'mean_queries': round(statistics.fmean(row['queries'] for row in rows), 1),
+            'max_duplicate_queries': max(row['duplicate_queries'] for row in rows),
+            'mean_sql_ms': round(statistics.fmean(row['sql_ms'] for row in rows), 2),
+        })
+
+    summary.sort(key=lambda row: row[sort], reverse=True)
+    return summary[:top]
@@ -0,0 +1,33 @@
+import datetime
+import re
+
+from django.db.models import QuerySet
+
+from .activity import ACTIVITY_PAGE_SIZE
+from .history import Granularity, grouped_buckets
+from .models import Account, AccountPeriodDelta, Company, Transaction
+from .reports import report_details
+from .tree import account_totals
+
+# "SCAN ledger_detail" (or "SCAN ledger_detail USING COVERING INDEX ...") reads every row of the table;
+# "SEARCH ..." lines are index lookups and "SCAN (subquery-1)" / "SCAN CONSTANT ROW" are not table scans
+SCAN_PATTERN = re.compile(r'\bSCAN (?!CONSTANT ROW)(?!\()(\S+)')
+
+
+def hot_queries(company: Company, account: Account, date: datetime.date) -> dict[str, QuerySet]:
+    """The queries on the request path, as the views and services build them."""
+    return {
+        'account tree': account_totals(company),
+        'account snapshot': Account.objects.prefetch_related(None).select_related('parent', 'balance_snapshot').filter(pk=account.pk),
+        'account details': account.get_details(),
+        'activity first page': account.get_activity()[:ACTIVITY_PAGE_SIZE + 1],
+        'activity next page': account.get_activity(after=(date, 0), until=date)[:ACTIVITY_PAGE_SIZE + 1],
+        'company transactions by date': Transaction.objects.filter(company=company, date__lte=date).order_by('date'),
+        'report details': report_details(company, date.replace(day=1), date),
+        'balance history': grouped_buckets(AccountPeriodDelta.objects.filter(account__ancestor_links__ancestor=account), Granularity.MONTH, date),
+    }
+
+
+def full_scans(plan: str) -> list[str]:
+    """Return the tables an EXPLAIN QUERY PLAN output scans in full."""
+    return SCAN_PATTERN.findall(plan)
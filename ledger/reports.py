@@ -0,0 +1,129 @@
+import datetime
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+from django.db.models import F, Max, QuerySet
+
+from .models import Account, AccountClosure, Company, Detail
+from .money import as_cents
+
+
+class ReportKind:
+    BALANCE_SHEET = 'balance_sheet'
+    INCOME_STATEMENT = 'income_statement'
+
+    choices = [
+        (BALANCE_SHEET, 'Balance Sheet'),
+        (INCOME_STATEMENT, 'Income Statement'),
+    ]
+
+
+# period aliases understood by pandas.Period
+FREQUENCIES = [
+    ('M', 'Monthly'),
+    ('Q', 'Quarterly'),
+    ('Y', 'Yearly'),
+]
+
+# multiplier turning (debit - credit) into the natural balance of each account kind
+KIND_SIGNS = {
+    Account.AccountKind.ASSET: 1,
+    Account.AccountKind.LIABILITY: -1,
+    Account.AccountKind.EQUITY: -1,
+}
+
+
+class Report(NamedTuple):
+    kind: str
+    periods: list[str]
+    # one row per account in tree order: key, description, kind, depth, one column per period, change, change_pct
+    frame: pd.DataFrame
+
+
+def load_accounts_frame(company: Company) -> pd.DataFrame:
+    rows = (
+        Account.objects
+        .filter(company=company)
+        .prefetch_related(None)
+        .annotate(depth=Max('ancestor_links__depth'))
+        .values_list('pk', 'key', 'description', 'kind', 'depth')
+    )
+    frame = pd.DataFrame.from_records(list(rows), columns=['pk', 'key', 'description', 'kind', 'depth'])
+    return frame.set_index('pk')
+
+
+def load_closure_frame(company: Company) -> pd.DataFrame:
+    rows = AccountClosure.objects.filter(descendant__company=company).values_list('ancestor_id', 'descendant_id')
+    return pd.DataFrame.from_records(list(rows), columns=['ancestor_id', 'descendant_id'])
+
+
+def report_details(company: Company, start: datetime.date | None, end: datetime.date) -> QuerySet:
+    details = Detail.objects.filter(transaction__company=company, transaction__date__lte=end)
+    if start is not None:
+        details = details.filter(transaction__date__gte=start)
+    return details.order_by().values_list('transaction__date', 'account_id', as_cents(F('debit') - F('credit')))
+
+
+def load_details_frame(company: Company, start: datetime.date | None, end: datetime.date) -> pd.DataFrame:
+    """Load date, account and net debit in cents of every detail line of a company up to `end` in one query."""
+    rows = report_details(company, start, end)
+    frame = pd.DataFrame.from_records(list(rows), columns=['date', 'account_id', 'net'])
+    frame['net'] = frame['net'].astype('int64')
+    frame['date'] = pd.to_datetime(frame['date'])
+    return frame
+
+
+def rollup_periods(details: pd.DataFrame, closure: pd.DataFrame, periods: pd.PeriodIndex, freq: str) -> pd.DataFrame:
+    """Net debit in cents per account subtree (rows) and period (columns); integer sums, so exact."""
+    own = (
+        details
+        .assign(period=details['date'].dt.to_period(freq))
+        .groupby(['account_id', 'period'])['net']
+        .sum()
+        .reset_index()
+    )
+    subtree = (
+        own
+        .merge(closure, left_on='account_id', right_on='descendant_id')
+        .groupby(['ancestor_id', 'period'])['net']
+        .sum()
+        .unstack('period')
+    )
+    return subtree.reindex(columns=periods, fill_value=0).fillna(0).astype('int64')
+
+
+def build_report(company: Company, kind: str, start: datetime.date, end: datetime.date, freq: str = 'M') -> Report:
+    """
+    Build a balance sheet (balances at each period end) or an income statement (change of every
+    equity account within each period) for the periods between `start` and `end`.
+    """
+    periods = pd.period_range(start=start, end=end, freq=freq)
+    accounts = load_accounts_frame(company)
+    closure = load_closure_frame(company)
+
+    if kind == ReportKind.BALANCE_SHEET:
+        details = load_details_frame(company, None, end)
+        # everything before the first period is part of its opening balance
+        details['date'] = details['date'].clip(lower=periods[0].start_time)
+        totals = rollup_periods(details, closure, periods, freq).cumsum(axis=1)
+    else:
+        accounts = accounts[accounts['kind'] == Account.AccountKind.EQUITY]
+        details = load_details_frame(company, start, end)
+        totals = rollup_periods(details, closure, periods, freq)
+
+    totals = totals.reindex(index=accounts.index, fill_value=0).fillna(0).astype('int64')
+    totals = totals.mul(accounts['kind'].map(KIND_SIGNS), axis=0) / 100
+    labels = [str(period) for period in periods]
+    totals.columns = labels
+
+    frame = accounts.join(totals)
+    if len(labels) >= 2:
+        previous, current = frame[labels[-2]], frame[labels[-1]]
+        frame['change'] = (current - previous).round(2)
+        frame['change_pct'] = (frame['change'] / previous.abs().replace(0, np.nan) * 100).round(1)
+    else:
+        frame['change'] = np.nan
+        frame['change_pct'] = np.nan
+
+    return Report(kind, labels, frame.sort_values('key'))
@@ -0,0 +1,143 @@
+import calendar
+import datetime
+from typing import NamedTuple
+
+from django.core.exceptions import ValidationError
+from django.db import transaction as db_transaction
+from django.utils.timezone import now
+
+from .models import Detail, RecurringTransaction, RecurringTransactionPosting, Transaction
+from .posting import bulk_post
+from .validation import DetailLine, load_account_info, validate_detail_lines
+
+# transactions per DB transaction; a template's backlog is never split across two
+SCHEDULE_CHUNK_SIZE = 2000
+CADENCE_STEPS = {
+    RecurringTransaction.Cadence.WEEKLY: datetime.timedelta(weeks=1),
+    RecurringTransaction.Cadence.BIWEEKLY: datetime.timedelta(weeks=2),
+    RecurringTransaction.Cadence.MONTHLY: 1,
+    RecurringTransaction.Cadence.QUARTERLY: 3,
+    RecurringTransaction.Cadence.YEARLY: 12,
+}
+
+
+class ScheduleResult(NamedTuple):
+    # recurring transaction pk -> due dates posted
+    posted: dict[int, list[datetime.date]]
+    # recurring transaction pk -> why it was left alone
+    errors: dict[int, str]
+
+
+def add_months(date: datetime.date, months: int) -> datetime.date:
+    # the same day `months` later, or the last day of a shorter month
+    year, month = divmod(date.month - 1 + months, 12)
+    year += date.year
+    return date.replace(year=year, month=month + 1, day=min(date.day, calendar.monthrange(year, month + 1)[1]))
+
+
+def occurrence(starts_on: datetime.date, cadence: int, index: int) -> datetime.date:
+    step = CADENCE_STEPS[cadence]
+    if isinstance(step, datetime.timedelta):
+        return starts_on + step * index
+    return add_months(starts_on, step * index)
+
+
+def due_dates(starts_on: datetime.date, cadence: int, next_due: datetime.date, through: datetime.date) -> tuple[list[datetime.date], datetime.date]:
+    """Due dates from `next_due` through `through`, and the first due date after them."""
+    # start at (or just before) next_due rather than counting every period since starts_on
+    step = CADENCE_STEPS[cadence]
+    if isinstance(step, datetime.timedelta):
+        index = max((next_due - starts_on) // step, 0)
+    else:
+        index = max(((next_due.year - starts_on.year) * 12 + next_due.month - starts_on.month) // step - 1, 0)
+
+    dates = []
+    date = occurrence(starts_on, cadence, index)
+    while date <= through:
+        if date >= next_due:
+            dates.append(date)
+        index += 1
+        date = occurrence(starts_on, cadence, index)
+    return dates, date
+
+
+def post_due_recurring(through: datetime.date | None = None, dry_run: bool = False) -> ScheduleResult:
+    """
+    Post every scheduled recurring transaction due on or before `through` (default today), across companies.
+
+    Missed periods are expanded into one transaction each. Templates are validated in memory once and
+    posted with bulk_post; a template that does not balance is skipped and reported. Re-running is a
+    no-op: `next_due` moves past the posted dates in the same DB transaction, and a unique posting row
+    per due date turns a concurrent run into an IntegrityError rather than duplicates.
+    """
+    through = through or datetime.date.today()
+    templates = list(
+        RecurringTransaction.objects
+        .filter(cadence__isnull=False, next_due__lte=through)
+        .order_by('pk')
+        .prefetch_related('details')
+    )
+    accounts = load_account_info(detail.account_id for template in templates for detail in template.details.all())
+    # due dates posted before, e.g. when next_due was moved back by hand
+    already_posted = set()
+    if templates:
+        earliest = min(template.next_due for template in templates)
+        already_posted = set(
+            RecurringTransactionPosting.objects
+            .filter(recurring_transaction__in=templates, due_date__range=(earliest, through))
+            .values_list('recurring_transaction_id', 'due_date')
+        )
+
+    posted: dict[int, list[datetime.date]] = {}
+    errors: dict[int, str] = {}
+    pending: list[tuple[RecurringTransaction, list[datetime.date]]] = []
+    pending_count = 0
+    for template in templates:
+        details = template.details.all()
+        try:
+            if not details:
+                raise ValidationError('It has no detail lines.')
+            validate_detail_lines([DetailLine(detail.account_id, detail.debit, detail.credit) for detail in details], accounts, template.company_id)
+        except ValidationError as e:
+            errors[template.pk] = '; '.join(e.messages)
+            continue
+
+        dates, template.next_due = due_dates(template.starts_on, template.cadence, template.next_due, through)
+        dates = [date for date in dates if (template.pk, date) not in already_posted]
+        posted[template.pk] = dates
+        pending.append((template, dates))
+        pending_count += len(dates)
+        if pending_count >= SCHEDULE_CHUNK_SIZE:
+            if not dry_run:
+                write_postings(pending)
+            pending, pending_count = [], 0
+
+    if pending and not dry_run:
+        write_postings(pending)
+    return ScheduleResult(posted, errors)
+
+
+def write_postings(pending: list[tuple[RecurringTransaction, list[datetime.date]]]) -> None:
+    # one transaction per due date, a posting row for each and the templates' new next_due, all at once
+    transactions = []
+    details = []
+    postings = []
+    for template, dates in pending:
+        for date in dates:
+            transaction = Transaction(company_id=template.company_id, date=date, notes=template.notes or template.name)
+            transactions.append(transaction)
+            details.extend(
+                Detail(transaction=transaction, account_id=detail.account_id, debit=detail.debit, credit=detail.credit, notes=detail.notes)
+                for detail in template.details.all()
+            )
+            postings.append(RecurringTransactionPosting(recurring_transaction=template, due_date=date, transaction=transaction))
+
+    modified = now()
+    for template, _ in pending:
+        # bulk_update skips auto_now, and incremental backups go by `modified`
+        template.modified = modified
+
+    with db_transaction.atomic():
+        bulk_post(transactions, details)
+        RecurringTransactionPosting.objects.bulk_create(postings)
+        RecurringTransaction.objects.bulk_update([template for template, _ in pending], ['next_due', 'modified'])
@@ -0,0 +1,126 @@
+import datetime
+import re
+from typing import NamedTuple
+
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import SafeString, mark_safe
+
+from .models import Account, Company
+
+# hits returned per search
+SEARCH_LIMIT = 50
+# words around a match shown in a snippet
+SNIPPET_WORDS = 12
+# control characters cannot occur in escaped notes, so they mark matches safely until rendering
+MATCH_START, MATCH_END = '\x02', '\x03'
+SEARCH_TOKEN = re.compile(r'\w+')
+
+
+class SearchHit(NamedTuple):
+    # 'transaction', 'detail' or 'recurring'
+    kind: str
+    # the transaction, or for 'recurring' the recurring transaction, the notes belong to
+    object_id: int
+    date: datetime.date | None
+    account_id: int | None
+    snippet: str
+    # bm25; lower is better
+    rank: float
+
+    @property
+    def highlighted(self) -> SafeString:
+        return mark_safe(escape(self.snippet).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>'))
+
+
+def match_expression(text: str) -> str:
+    """
+    An FTS5 query matching notes that contain every word of `text` as a prefix ("plumb" finds "plumber").
+
+    Words are quoted, so user input can never be FTS5 syntax; empty when `text` has no words.
+    """
+    return ' '.join(f'"{token}"*' for token in SEARCH_TOKEN.findall(text))
+
+
+def search_notes(
+    company: Company,
+    text: str,
+    account: Account | None = None,
+    start: datetime.date | None = None,
+    end: datetime.date | None = None,
+    limit: int = SEARCH_LIMIT,
+) -> list[SearchHit]:
+    """
+    Search the notes of transactions, detail lines and recurring transaction lines, best matches first.
+
+    The FTS5 indexes created in migration 0027 are kept in sync by triggers, so bulk inserts and
+    queryset updates are searchable immediately. `account` restricts hits to its subtree; a date range
+    leaves out recurring transactions, which have no date.
+    """
+    match = match_expression(text)
+    if not match:
+        return []
+
+    subtree = 'SELECT descendant_id FROM ledger_accountclosure WHERE ancestor_id = %s'
+    queries = []
+
+    sql = '''
+        SELECT 'transaction', t.id, t.date, NULL, snippet(ledger_transaction_search, 0, %s, %s, '…', %s), bm25(ledger_transaction_search)
+        FROM ledger_transaction_search JOIN ledger_transaction t ON t.id = ledger_transaction_search.rowid
+        WHERE ledger_transaction_search MATCH %s AND t.company_id = %s
+    '''
+    params = [MATCH_START, MATCH_END, SNIPPET_WORDS, match, company.pk]
+    if account is not None:
+        sql += f' AND EXISTS (SELECT 1 FROM ledger_detail d WHERE d.transaction_id = t.id AND d.account_id IN ({subtree}))'
+        params.append(account.pk)
+    queries.append((sql, params))
+
+    sql = '''
+        SELECT 'detail', t.id, t.date, d.account_id, snippet(ledger_detail_search, 0, %s, %s, '…', %s), bm25(ledger_detail_search)
+        FROM ledger_detail_search
+        JOIN ledger_detail d ON d.id = ledger_detail_search.rowid
+        JOIN ledger_transaction t ON t.id = d.transaction_id
+        WHERE ledger_detail_search MATCH %s AND t.company_id = %s
+    '''
+    params = [MATCH_START, MATCH_END, SNIPPET_WORDS, match, company.pk]
+    if account is not None:
+        sql += f' AND d.account_id IN ({subtree})'
+        params.append(account.pk)
+    queries.append((sql, params))
+
+    for index, (sql, params) in enumerate(queries):
+        if start is not None:
+            sql += ' AND t.date >= %s'
+            params.append(start)
+        if end is not None:
+            sql += ' AND t.date <= %s'
+            params.append(end)
+        queries[index] = (sql, params)
+
+    if start is None and end is None:
+        sql = '''
+            SELECT 'recurring', r.id, NULL, d.account_id, snippet(ledger_recurringtransactiondetail_search, 0, %s, %s, '…', %s),
+                bm25(ledger_recurringtransactiondetail_search)
+            FROM ledger_recurringtransactiondetail_search
+            JOIN ledger_recurringtransactiondetail d ON d.id = ledger_recurringtransactiondetail_search.rowid
+            JOIN ledger_recurringtransaction r ON r.id = d.parent_id
+            WHERE ledger_recurringtransactiondetail_search MATCH %s AND r.company_id = %s
+        '''
+        params = [MATCH_START, MATCH_END, SNIPPET_WORDS, match, company.pk]
+        if account is not None:
+            sql += f' AND d.account_id IN ({subtree})'
+            params.append(account.pk)
+        queries.append((sql, params))
+
+    hits = []
+    with connection.cursor() as cursor:
+        # each index ranks its own matches; the best `limit` of each are merged
+        for sql, params in queries:
+            cursor.execute(f'{sql} ORDER BY 6 LIMIT %s', params + [limit])
+            hits.extend(
+                SearchHit(kind, object_id, datetime.date.fromisoformat(date) if isinstance(date, str) else date, account_id, snippet, rank)
+                for kind, object_id, date, account_id, snippet, rank in cursor.fetchall()
+            )
+
+    hits.sort(key=lambda hit: hit.rank)
+    return hits[:limit]
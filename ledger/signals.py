@@ -0,0 +1,138 @@
+import datetime
+from typing import Any
+
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .attributes import build_items, rebuild_attribute_values
+from .balances import apply_detail_deltas, move_subtree_balance
+from .caching import bump_tree_version
+from .history import apply_history_deltas, invalidate_checkpoints, move_history_date
+from .models import Account, Detail, Transaction, UserDefinedAttribute, UserDefinedAttributeDetailThrough, UserDefinedAttributeItem
+from .tree import insert_account_links, move_account_links
+
+
+@receiver(connection_created)
+def use_write_ahead_log(sender: type[BaseDatabaseWrapper], connection: BaseDatabaseWrapper, **kwargs: Any) -> None:
+    # lets a long read, such as a backup's snapshot, run while requests commit; the mode is kept in the file
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+
+
+@receiver(pre_save, sender=Detail)
+def remember_previous_detail(sender: type[Detail], instance: Detail, **kwargs: Any) -> None:
+    instance._previous_totals = None
+    if instance.pk is not None:
+        instance._previous_totals = (
+            sender._base_manager
+            .filter(pk=instance.pk)
+            .values_list('account_id', 'debit', 'credit', 'transaction__date')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Detail)
+def update_balance_on_detail_save(sender: type[Detail], instance: Detail, **kwargs: Any) -> None:
+    deltas = [(instance.account_id, instance.debit, instance.credit)]
+    history = [(instance.account_id, instance.transaction.date, instance.debit, instance.credit)]
+    previous = getattr(instance, '_previous_totals', None)
+    if previous is not None:
+        account_id, debit, credit, date = previous
+        deltas.append((account_id, -debit, -credit))
+        history.append((account_id, date, -debit, -credit))
+    apply_detail_deltas(deltas)
+    apply_history_deltas(history)
+
+
+@receiver(pre_delete, sender=Detail)
+def remember_deleted_detail_date(sender: type[Detail], instance: Detail, **kwargs: Any) -> None:
+    # when a whole transaction is deleted it is gone by the time post_delete runs for its details
+    instance._previous_date = instance.transaction.date
+
+
+@receiver(post_delete, sender=Detail)
+def update_balance_on_detail_delete(sender: type[Detail], instance: Detail, **kwargs: Any) -> None:
+    apply_detail_deltas([(instance.account_id, -instance.debit, -instance.credit)])
+    apply_history_deltas([(instance.account_id, instance._previous_date, -instance.debit, -instance.credit)])
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_previous_date(sender: type[Transaction], instance: Transaction, **kwargs: Any) -> None:
+    instance._previous_date = None
+    if instance.pk is not None:
+        instance._previous_date = sender._base_manager.filter(pk=instance.pk).values_list('date', flat=True).first()
+
+
+@receiver(post_save, sender=Transaction)
+def update_history_on_transaction_save(sender: type[Transaction], instance: Transaction, created: bool, **kwargs: Any) -> None:
+    previous_date = getattr(instance, '_previous_date', None)
+    if not created and previous_date is not None and previous_date != instance.date:
+        move_history_date(instance.pk, previous_date, instance.date)
+
+
+@receiver(pre_save, sender=Account)
+def remember_previous_parent(sender: type[Account], instance: Account, **kwargs: Any) -> None:
+    instance._previous_parent_id = None
+    if instance.pk is not None:
+        instance._previous_parent_id = sender._base_manager.filter(pk=instance.pk).values_list('parent_id', flat=True).first()
+
+
+@receiver(post_save, sender=Account)
+def update_hierarchy_on_account_save(sender: type[Account], instance: Account, created: bool, **kwargs: Any) -> None:
+    if created:
+        insert_account_links(instance)
+        return
+
+    previous_parent_id = getattr(instance, '_previous_parent_id', None)
+    if previous_parent_id != instance.parent_id:
+        move_account_links(instance)
+        move_subtree_balance(instance, previous_parent_id)
+        # every checkpoint of the old and new ancestors is off now
+        invalidate_checkpoints([instance.pk], datetime.date.min)
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def invalidate_tree_on_transaction_change(sender: type[Transaction], instance: Transaction, **kwargs: Any) -> None:
+    bump_tree_version([instance.company_id])
+
+
+@receiver(post_save, sender=Detail)
+@receiver(post_delete, sender=Detail)
+def invalidate_tree_on_detail_change(sender: type[Detail], instance: Detail, **kwargs: Any) -> None:
+    bump_tree_version([instance.transaction.company_id])
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+def invalidate_tree_on_account_change(sender: type[Account], instance: Account, **kwargs: Any) -> None:
+    bump_tree_version([instance.company_id])
+
+
+@receiver(pre_save, sender=UserDefinedAttributeDetailThrough)
+def set_typed_attribute_value(sender: type[UserDefinedAttributeDetailThrough], instance: UserDefinedAttributeDetailThrough, **kwargs: Any) -> None:
+    instance.set_typed_value()
+
+
+@receiver(post_save, sender=UserDefinedAttributeDetailThrough)
+def update_attribute_items(sender: type[UserDefinedAttributeDetailThrough], instance: UserDefinedAttributeDetailThrough, created: bool, **kwargs: Any) -> None:
+    if not created:
+        instance.items.all().delete()
+    UserDefinedAttributeItem.objects.bulk_create(build_items([instance]))
+
+
+@receiver(pre_save, sender=UserDefinedAttribute)
+def remember_previous_kind(sender: type[UserDefinedAttribute], instance: UserDefinedAttribute, **kwargs: Any) -> None:
+    instance._previous_kind = None
+    if instance.pk is not None:
+        instance._previous_kind = sender._base_manager.filter(pk=instance.pk).values_list('kind', 'metadata').first()
+
+
+@receiver(post_save, sender=UserDefinedAttribute)
+def retype_attribute_values(sender: type[UserDefinedAttribute], instance: UserDefinedAttribute, created: bool, **kwargs: Any) -> None:
+    previous_kind = getattr(instance, '_previous_kind', None)
+    if not created and previous_kind is not None and previous_kind != (instance.kind, instance.metadata):
+        rebuild_attribute_values([instance])
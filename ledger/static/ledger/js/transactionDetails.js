@@ -1,62 +1,40 @@
-const LAST_DETAIL_ROW_SELECTOR = 'table > tbody > tr:last-child';
+const DETAIL_TABLE_BODY_SELECTOR = '#DetailTable > tbody';
+const VISIBLE_DETAIL_ROWS_SELECTOR = '#DetailTable > tbody > tr:not([hidden])';
+const EMPTY_ROW_TEMPLATE_SELECTOR = '#EmptyDetailRow';
 const TOTAL_FORMS_SELECTOR = 'input[name="details-TOTAL_FORMS"]';
-const INPUT_ID_PATTERN = /id_details-([0-9]+)-(.+)/i;
-const INPUT_NAME_PATTERN = /details-([0-9]+)-(.+)/i;
-const ADD_ROW_BUTTON_SELECTOR = '#AddRowButton';
+const FORM_INDEX_PLACEHOLDER = /__prefix__/g;
 
 
 /**
- * Add a row to the transaction details table
+ * Add a row to the transaction details table, rendered from the formset's empty form
  */
 const addRowToDetailTable = () => {
-    let row = document.querySelector(LAST_DETAIL_ROW_SELECTOR);
-    if (!row) return
-    row = row.cloneNode(true);
-    for (let child of row.children) {
-        for (let element of child.children) {
-            if (element instanceof HTMLInputElement || element instanceof HTMLSelectElement || element instanceof HTMLTextAreaElement) {
-                let idMatch = element.id.match(INPUT_ID_PATTERN);
-                let idNum = parseInt(idMatch[1]) + 1;
-                let idField = idMatch[2];
-                element.id = `id_details-${idNum}-${idField}`;
-
-                let nameMatch = element.name.match(INPUT_NAME_PATTERN);
-                let nameNum = parseInt(nameMatch[1]) + 1;
-                let nameField = nameMatch[2];
-                element.name = `details-${nameNum}-${nameField}`;
-
-                if (element instanceof HTMLInputElement || element instanceof HTMLTextAreaElement) {
-                    element.value = null;
-                } else {
-                    element.selectedIndex = 0
-                }
-            }
-        }
-    }
-    row.querySelectorAll('.errorlist').forEach(elem => elem.remove());
-
-    let tableBody = document.querySelector(LAST_DETAIL_ROW_SELECTOR).parentElement;
-    tableBody.appendChild(row);
+    let template = document.querySelector(EMPTY_ROW_TEMPLATE_SELECTOR);
+    let totalFormsInput = document.querySelector(TOTAL_FORMS_SELECTOR);
+    if (!template || !totalFormsInput) return
+    let tableBody = document.querySelector(DETAIL_TABLE_BODY_SELECTOR);
+    tableBody.insertAdjacentHTML('beforeend', template.innerHTML.replace(FORM_INDEX_PLACEHOLDER, totalFormsInput.value));
 
     incrementTotalFormAmount();
     checkDeleteButtonDisabledStatus();
 }
 
 /**
- * Delete a row from the detail table.
- * @param {HTMLButtonElement} deleteButton 
+ * Delete a row from the detail table. The row is hidden and marked for deletion rather than removed,
+ * so the indexes of the rows after it still match the formset.
+ * @param {HTMLButtonElement} deleteButton
  */
 const deleteDetailTableRow = (deleteButton) => {
-    let td = deleteButton.parentElement;
-    let tr = td.parentElement;
-    tr.remove();
-    decrementTotalFormAmount();
+    let tr = deleteButton.closest('tr');
+    let deleteInput = tr.querySelector('input[name$="-DELETE"]');
+    if (deleteInput) deleteInput.value = 'on';
+    tr.hidden = true;
     checkDeleteButtonDisabledStatus();
     updateTableTotals();
 }
 
 const checkDeleteButtonDisabledStatus = () => {
-    let buttons = document.querySelectorAll('.delete-row-btn');
+    let buttons = document.querySelectorAll(`${VISIBLE_DETAIL_ROWS_SELECTOR} .delete-row-btn`);
     let disable = buttons.length <= 1;
     if (disable) {
         buttons.forEach(elem => elem.setAttribute('disabled', ''))
@@ -75,15 +53,14 @@ const changeTotalFormAmount = (value) => {
 
 const incrementTotalFormAmount = () => changeTotalFormAmount(1);
 
-const decrementTotalFormAmount = () => changeTotalFormAmount(-1);
+/**
+ * Sum the amounts of the visible rows in whole cents, so the totals match what the server will store
+ * @param {string} column debit or credit
+ */
+const sumColumnCents = (column) => ([...document.querySelectorAll(`${VISIBLE_DETAIL_ROWS_SELECTOR} input[name$="-${column}"]`)])
+    .map(elem => Math.round((elem.valueAsNumber || 0) * 100)).reduce((acc, cur) => acc + cur, 0);
 
-const calculateDebitsAndCredits = () => {
-    let debits = ([...document.querySelectorAll('input[name^="details-"][name$="-debit"]')])
-        .map(elem => elem.valueAsNumber || 0).reduce((acc, cur) => acc + cur, 0);
-    let credits = ([...document.querySelectorAll('input[name^="details-"][name$="-credit"]')])
-        .map(elem => elem.valueAsNumber || 0).reduce((acc, cur) => acc + cur, 0);
-    return [debits, credits]
-};
+const calculateDebitsAndCredits = () => [sumColumnCents('debit') / 100, sumColumnCents('credit') / 100];
 
 const updateTableTotals = () => {
     let debitTotal = document.querySelector('#DebitTotal');
@@ -95,7 +72,11 @@ const updateTableTotals = () => {
 
 document.addEventListener('DOMContentLoaded', () => {
     updateTableTotals();
-    document.querySelectorAll('input[name^="details-"][name$="-debit"], input[name^="details-"][name$="-credit"]').forEach(
-        elem => elem.addEventListener('change', () => updateTableTotals())
-    )
-})
\ No newline at end of file
+    checkDeleteButtonDisabledStatus();
+    // listen on the table body so rows added later update the totals too
+    let tableBody = document.querySelector(DETAIL_TABLE_BODY_SELECTOR);
+    if (!tableBody) return
+    tableBody.addEventListener('change', event => {
+        if (event.target.matches('input[name$="-debit"], input[name$="-credit"]')) updateTableTotals();
+    });
+})
@@ -0,0 +1,366 @@
+import datetime
+import json
+import random
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from itertools import accumulate
+from typing import Iterable, Iterator, NamedTuple
+
+import django
+from django.db import connection, connections, transaction as db_transaction
+
+from .attributes import bulk_create_attribute_values
+from .balances import rebuild_balance_snapshots
+from .caching import bump_tree_version
+from .history import rebuild_balance_history, write_checkpoints
+from .scheduling import due_dates
+from .models import (Account, Company, Detail, QuickTransaction, RecurringTransaction, RecurringTransactionDetail,
+                     Transaction, UserDefinedAttribute, UserDefinedAttributeDetailThrough)
+from .tree import rebuild_account_links
+
+SYNTHETIC_START = datetime.date(2020, 1, 1)
+SYNTHETIC_DAYS = 3 * 365
+SYNTHETIC_END = SYNTHETIC_START + datetime.timedelta(days=SYNTHETIC_DAYS - 1)
+POST_CHUNK_SIZE = 2000
+
+# relative number of transactions by month (January first) and by weekday (Monday first)
+MONTH_WEIGHTS = (0.8, 0.8, 0.9, 1.0, 1.0, 1.1, 1.2, 1.2, 1.0, 1.0, 1.2, 1.6)
+WEEKDAY_WEIGHTS = (0.9, 0.9, 0.9, 1.0, 1.2, 1.5, 1.3)
+SYNTHETIC_DATES = [SYNTHETIC_START + datetime.timedelta(days=day) for day in range(SYNTHETIC_DAYS)]
+DATE_CUM_WEIGHTS = list(accumulate(MONTH_WEIGHTS[date.month - 1] * WEEKDAY_WEIGHTS[date.weekday()] for date in SYNTHETIC_DATES))
+
+# (weight, kind) of the random transactions; paychecks, rent and card payments are scheduled separately
+TRANSACTION_KINDS = ((45, 'expense'), (35, 'card'), (10, 'transfer'), (10, 'income'))
+SALARY_CENTS = 250000
+RENT_CENTS = 150000
+CARD_PAYMENT_CENTS = 80000
+
+
+class ExpenseCategory(NamedTuple):
+    key: str
+    description: str
+    # amounts in cents
+    low: int
+    high: int
+    weight: float
+    # weight multiplier by month (January first)
+    season: tuple[float, ...]
+    merchants: tuple[str, ...]
+
+
+FLAT_SEASON = (1.0,) * 12
+EXPENSE_CATEGORIES = (
+    ExpenseCategory('321', 'Housing', 2000, 40000, 1, FLAT_SEASON, ('Hardware Barn', 'Home Goods')),
+    ExpenseCategory('322', 'Groceries', 1500, 25000, 5, FLAT_SEASON, ('Corner Market', 'Fresh Foods', 'Bulk Barn')),
+    ExpenseCategory('323', 'Dining', 800, 12000, 3, (0.8, 0.8, 0.9, 1.0, 1.1, 1.2, 1.2, 1.2, 1.0, 1.0, 1.0, 1.4), ('Noodle House', 'Taqueria', 'Diner')),
+    ExpenseCategory('324', 'Utilities', 4000, 30000, 1, (1.6, 1.5, 1.2, 1.0, 0.8, 1.0, 1.3, 1.3, 1.0, 0.8, 1.1, 1.5), ('Power Co', 'Water Works', 'Gas Co')),
+    ExpenseCategory('325', 'Travel', 5000, 150000, 0.5, (0.5, 0.5, 0.7, 0.8, 1.0, 1.5, 2.0, 2.0, 1.0, 0.7, 0.6, 1.2), ('Airline', 'Hotel', 'Car Rental')),
+    ExpenseCategory('326', 'Gifts', 1000, 20000, 0.5, (0.5, 0.8, 0.5, 0.5, 0.8, 0.5, 0.5, 0.5, 0.5, 0.6, 1.5, 4.0), ('Toy Store', 'Book Shop')),
+)
+
+# name -> (kind, metadata) of the user defined attributes every synthetic company gets
+SYNTHETIC_ATTRIBUTES = {
+    'Merchant': (UserDefinedAttribute.AttributeKind.TEXT, None),
+    'Receipt': (UserDefinedAttribute.AttributeKind.NUMBER, None),
+    'Tags': (UserDefinedAttribute.AttributeKind.ARRAY, None),
+    'Payment Method': (UserDefinedAttribute.AttributeKind.CHOICE, json.dumps(['Card', 'Debit', 'Transfer'])),
+    'Cleared': (UserDefinedAttribute.AttributeKind.DATE, None),
+}
+SYNTHETIC_TAGS = ('household', 'work', 'shared', 'reimbursable')
+
+
+class LedgerScale(NamedTuple):
+    companies: int
+    # levels of asset accounts below the Assets root; each level doubles the number of accounts
+    depth: int
+    # transactions per company
+    transactions: int
+
+
+class AccountSpec(NamedTuple):
+    key: str
+    description: str
+    kind: int
+    parent_key: str | None
+    is_leaf: bool
+
+
+class PlannedLine(NamedTuple):
+    account_key: str
+    # amounts in cents
+    debit: int
+    credit: int
+    # (attribute name, value) pairs
+    attributes: tuple[tuple[str, str], ...] = ()
+
+
+class PlannedTransaction(NamedTuple):
+    date: datetime.date
+    notes: str | None
+    lines: tuple[PlannedLine, ...]
+
+
+def asset_leaf_keys(depth: int) -> list[str]:
+    keys = ['1']
+    for _ in range(depth):
+        keys = [f'{key}{branch}' for key in keys for branch in (1, 2)]
+    return keys
+
+
+def synthetic_chart(depth: int) -> list[AccountSpec]:
+    """
+    The chart of accounts of a synthetic company, parents first: a binary tree of asset accounts `depth`
+    levels deep, a credit card, income and a tree of expense categories.
+    """
+    specs = [AccountSpec('1', 'Assets', Account.AccountKind.ASSET, None, depth == 0)]
+    level = ['1']
+    for number in range(1, depth + 1):
+        level = [f'{key}{branch}' for key in level for branch in (1, 2)]
+        specs.extend(
+            AccountSpec(key, f'Assets {key}', Account.AccountKind.ASSET, key[:-1], number == depth)
+            for key in level
+        )
+
+    specs += [
+        AccountSpec('2', 'Liabilities', Account.AccountKind.LIABILITY, None, False),
+        AccountSpec('21', 'Credit Card', Account.AccountKind.LIABILITY, '2', True),
+        AccountSpec('3', 'Equity', Account.AccountKind.EQUITY, None, False),
+        AccountSpec('31', 'Income', Account.AccountKind.EQUITY, '3', True),
+        AccountSpec('32', 'Expenses', Account.AccountKind.EQUITY, '3', False),
+    ]
+    specs.extend(AccountSpec(category.key, category.description, Account.AccountKind.EQUITY, '32', True) for category in EXPENSE_CATEGORIES)
+    return specs
+
+
+def scheduled_transactions(depth: int) -> list[PlannedTransaction]:
+    """Paychecks on the 1st and 15th, rent on the 1st and a credit card payment on the 20th of every month."""
+    checking = asset_leaf_keys(depth)[-1]
+    scheduled = []
+    for date in SYNTHETIC_DATES:
+        # a 3% raise every year
+        salary = SALARY_CENTS * 103 ** (date.year - SYNTHETIC_START.year) // 100 ** (date.year - SYNTHETIC_START.year)
+        if date.day in (1, 15):
+            scheduled.append(PlannedTransaction(date, 'Paycheck', (PlannedLine(checking, salary, 0), PlannedLine('31', 0, salary))))
+        if date.day == 1:
+            scheduled.append(PlannedTransaction(date, 'Rent', (PlannedLine('321', RENT_CENTS, 0), PlannedLine(checking, 0, RENT_CENTS))))
+        if date.day == 20:
+            scheduled.append(PlannedTransaction(date, 'Card payment', (PlannedLine('21', CARD_PAYMENT_CENTS, 0), PlannedLine(checking, 0, CARD_PAYMENT_CENTS))))
+    return scheduled
+
+
+def expense_attributes(category: ExpenseCategory, date: datetime.date, method: str, rng: random.Random) -> tuple[tuple[str, str], ...]:
+    attributes = [('Merchant', rng.choice(category.merchants)), ('Payment Method', method)]
+    if rng.random() < 0.3:
+        attributes.append(('Receipt', str(rng.randrange(100000, 1000000))))
+    if rng.random() < 0.2:
+        attributes.append(('Tags', json.dumps(rng.sample(SYNTHETIC_TAGS, rng.randint(1, 2)))))
+    # some lines have not cleared the bank yet
+    if rng.random() < 0.9:
+        attributes.append(('Cleared', (date + datetime.timedelta(days=rng.randint(1, 3))).isoformat()))
+    return tuple(attributes)
+
+
+def random_transaction(date: datetime.date, assets: list[str], rng: random.Random) -> PlannedTransaction:
+    kinds = [(weight, kind) for weight, kind in TRANSACTION_KINDS if kind != 'transfer' or len(assets) > 1]
+    kind = rng.choices([kind for _, kind in kinds], [weight for weight, _ in kinds])[0]
+    asset = rng.choice(assets)
+    match kind:
+        case 'income':
+            amount = rng.randint(100, 20000)
+            return PlannedTransaction(date, 'Interest', (PlannedLine(asset, amount, 0), PlannedLine('31', 0, amount)))
+        case 'transfer':
+            source, target = rng.sample(assets, 2)
+            amount = rng.randint(1000, 100000)
+            return PlannedTransaction(date, 'Transfer', (PlannedLine(target, amount, 0), PlannedLine(source, 0, amount)))
+
+    category = rng.choices(EXPENSE_CATEGORIES, [category.weight * category.season[date.month - 1] for category in EXPENSE_CATEGORIES])[0]
+    amount = rng.randint(category.low, category.high)
+    method, source = ('Card', '21') if kind == 'card' else ('Debit', asset)
+    return PlannedTransaction(date, category.description, (
+        PlannedLine(category.key, amount, 0, expense_attributes(category, date, method, rng)),
+        PlannedLine(source, 0, amount),
+    ))
+
+
+def plan_transactions(depth: int, transactions: int, rng: random.Random) -> Iterator[list[PlannedTransaction]]:
+    """
+    Plan a company's transactions in chunks of POST_CHUNK_SIZE.
+
+    The first quarter are its most recent scheduled transactions; the rest fall on random days weighted
+    by month and weekday.
+    """
+    schedule = scheduled_transactions(depth)
+    planned = schedule[len(schedule) - min(len(schedule), transactions // 4):]
+    assets = asset_leaf_keys(depth)
+    for date in rng.choices(SYNTHETIC_DATES, cum_weights=DATE_CUM_WEIGHTS, k=transactions - len(planned)):
+        planned.append(random_transaction(date, assets, rng))
+        if len(planned) == POST_CHUNK_SIZE:
+            yield planned
+            planned = []
+    if planned:
+        yield planned
+
+
+def create_synthetic_company(name: str, depth: int) -> Company:
+    """Bulk insert a company with its synthetic chart of accounts, transaction templates and attributes."""
+    company = Company.objects.create(name=name)
+    accounts: dict[str, int] = {}
+    pending = synthetic_chart(depth)
+    # one insert per tree level, so every parent has a pk before its children
+    while pending:
+        level = [spec for spec in pending if spec.parent_key is None or spec.parent_key in accounts]
+        created = Account.objects.bulk_create([
+            Account(
+                company=company,
+                key=spec.key,
+                description=spec.description,
+                kind=spec.kind,
+                parent_id=accounts.get(spec.parent_key),
+                is_leaf=spec.is_leaf,
+            )
+            for spec in level
+        ])
+        accounts.update((account.key, account.pk) for account in created)
+        pending = [spec for spec in pending if spec.key not in accounts]
+    rebuild_account_links(company)
+
+    checking = accounts[asset_leaf_keys(depth)[-1]]
+    QuickTransaction.objects.bulk_create([
+        QuickTransaction(
+            company=company,
+            name='Paycheck',
+            account_from_id=accounts['31'],
+            account_from_charge_kind=QuickTransaction.ChargeKind.CREDIT,
+            account_to_id=checking,
+            account_to_charge_kind=QuickTransaction.ChargeKind.DEBIT,
+        ),
+        QuickTransaction(
+            company=company,
+            name='Groceries',
+            account_from_id=accounts['21'],
+            account_from_charge_kind=QuickTransaction.ChargeKind.CREDIT,
+            account_to_id=accounts['322'],
+            account_to_charge_kind=QuickTransaction.ChargeKind.DEBIT,
+        ),
+    ])
+    # the generated history already holds every due date through SYNTHETIC_END
+    schedules = [(SYNTHETIC_START, RecurringTransaction.Cadence.MONTHLY), (SYNTHETIC_START.replace(day=20), RecurringTransaction.Cadence.MONTHLY)]
+    rent, card_payment = RecurringTransaction.objects.bulk_create([
+        RecurringTransaction(
+            company=company,
+            name=name,
+            cadence=cadence,
+            starts_on=starts_on,
+            next_due=due_dates(starts_on, cadence, starts_on, SYNTHETIC_END)[1],
+        )
+        for name, (starts_on, cadence) in zip(['Rent', 'Card payment'], schedules)
+    ])
+    RecurringTransactionDetail.objects.bulk_create([
+        RecurringTransactionDetail(parent=rent, account_id=accounts['321'], debit=Decimal(RENT_CENTS).scaleb(-2), credit=Decimal(0)),
+        RecurringTransactionDetail(parent=rent, account_id=checking, debit=Decimal(0), credit=Decimal(RENT_CENTS).scaleb(-2)),
+        RecurringTransactionDetail(parent=card_payment, account_id=accounts['21'], debit=Decimal(CARD_PAYMENT_CENTS).scaleb(-2), credit=Decimal(0)),
+        RecurringTransactionDetail(parent=card_payment, account_id=checking, debit=Decimal(0), credit=Decimal(CARD_PAYMENT_CENTS).scaleb(-2)),
+    ])
+
+    UserDefinedAttribute.objects.bulk_create([
+        UserDefinedAttribute(company=company, name=name, kind=kind, metadata=metadata)
+        for name, (kind, metadata) in SYNTHETIC_ATTRIBUTES.items()
+    ])
+    return company
+
+
+def insert_planned(company: Company, accounts: dict[str, int], attributes: dict[str, UserDefinedAttribute], planned: Iterable[PlannedTransaction]) -> None:
+    """
+    Bulk insert planned transactions with their details and attribute values.
+
+    Balance snapshots and history buckets are not touched; rebuild them once everything is in.
+    """
+    transactions = []
+    details = []
+    lines = []
+    for plan in planned:
+        transaction = Transaction(company=company, date=plan.date, notes=plan.notes)
+        transactions.append(transaction)
+        for line in plan.lines:
+            details.append(Detail(
+                transaction=transaction,
+                account_id=accounts[line.account_key],
+                debit=Decimal(line.debit).scaleb(-2),
+                credit=Decimal(line.credit).scaleb(-2),
+            ))
+            lines.append(line)
+
+    with db_transaction.atomic():
+        Transaction.objects.bulk_create(transactions)
+        Detail.objects.bulk_create(details)
+        bulk_create_attribute_values([
+            UserDefinedAttributeDetailThrough(detail=detail, attribute=attributes[name], value=value)
+            for detail, line in zip(details, lines)
+            for name, value in line.attributes
+        ])
+
+
+def plan_company(depth: int, transactions: int, seed: str) -> list[list[PlannedTransaction]]:
+    return list(plan_transactions(depth, transactions, random.Random(seed)))
+
+
+def generate_transactions(company_pk: int, depth: int, transactions: int, seed: str, planned: Iterable[list[PlannedTransaction]] | None = None) -> int:
+    """
+    Insert the transactions of a company made by `create_synthetic_company` (planned here unless `planned`
+    chunks are given), then rebuild its balance snapshots, history buckets and checkpoints and invalidate its
+    cached account tree. Returns the number of details written.
+    """
+    company = Company.objects.get(pk=company_pk)
+    accounts = dict(Account.objects.prefetch_related(None).filter(company=company).values_list('key', 'pk'))
+    attributes = {attribute.name: attribute for attribute in UserDefinedAttribute.objects.filter(company=company)}
+    if planned is None:
+        planned = plan_transactions(depth, transactions, random.Random(seed))
+
+    written = 0
+    for chunk in planned:
+        insert_planned(company, accounts, attributes, chunk)
+        written += sum(len(plan.lines) for plan in chunk)
+
+    rebuild_balance_snapshots(company)
+    rebuild_balance_history(company)
+    write_checkpoints(company, SYNTHETIC_END)
+    bump_tree_version([company.pk])
+    return written
+
+
+def setup_worker() -> None:
+    django.setup()
+
+
+def generate_ledger(scale: LedgerScale, seed: int = 0, prefix: str = 'Synthetic', workers: int = 1) -> list[Company]:
+    """
+    Generate `scale.companies` synthetic companies; the same seed always produces the same ledger.
+
+    Companies and their charts are created here, so their pks do not depend on scheduling. With `workers`
+    above one their transactions are planned by that many processes, one company each; on SQLite the
+    planned transactions are written here, company by company, and elsewhere by the workers themselves.
+    """
+    companies = []
+    for index in range(scale.companies):
+        with db_transaction.atomic():
+            companies.append(create_synthetic_company(f'{prefix} {index + 1}', scale.depth))
+    jobs = [(company.pk, scale.depth, scale.transactions, f'{seed}:{index}') for index, company in enumerate(companies)]
+
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            generate_transactions(*job)
+        return companies
+
+    # forked workers must open connections of their own
+    connections.close_all()
+    with ProcessPoolExecutor(min(workers, len(jobs)), initializer=setup_worker) as executor:
+        if connection.vendor == 'sqlite':
+            # SQLite has a single write lock, and concurrent deferred transactions fail with "database is
+            # locked" instead of waiting for it: only the planning runs in parallel
+            plans = executor.map(plan_company, *zip(*[job[1:] for job in jobs]))
+            for job, planned in zip(jobs, plans):
+                generate_transactions(*job, planned=planned)
+        else:
+            # surface the first failure
+            list(executor.map(generate_transactions, *zip(*jobs)))
+    return companies
@@ -0,0 +1,121 @@
+import datetime
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import QuerySet, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Account, AccountClosure, Company
+from .money import money_value
+
+
+@dataclass
+class AccountNode:
+    account: Account
+    debit: Decimal = Decimal(0)
+    credit: Decimal = Decimal(0)
+    children: list['AccountNode'] = field(default_factory=list)
+
+    @property
+    def balance(self) -> Decimal:
+        return Account.signed_total(self.account.kind, self.debit, self.credit)
+
+
+def account_totals(company: Company) -> QuerySet[Account]:
+    # every account of a company annotated with the debit/credit totals of its own details
+    zero = money_value(0)
+    return (
+        Account.objects
+        .filter(company=company)
+        .prefetch_related(None)
+        .annotate(
+            own_debit=Coalesce(Sum('transaction_details__debit'), zero),
+            own_credit=Coalesce(Sum('transaction_details__credit'), zero),
+        )
+    )
+
+
+def build_account_tree(company: Company, as_of: datetime.date | None = None) -> list[AccountNode]:
+    """
+    Load every account of a company with its own debit/credit totals in one grouped
+    query and roll the totals up the tree in memory. Returns the root nodes.
+
+    With `as_of` the subtree totals come from the nearest balance checkpoint plus the
+    history buckets since then instead.
+    """
+    if as_of is None:
+        nodes = {account.pk: AccountNode(account, account.own_debit, account.own_credit) for account in account_totals(company)}
+    else:
+        from .history import subtree_totals_as_of
+
+        totals = subtree_totals_as_of(company.pk, as_of)
+        accounts = Account.objects.filter(company=company).prefetch_related(None)
+        nodes = {account.pk: AccountNode(account, *totals.get(account.pk, (Decimal(0), Decimal(0)))) for account in accounts}
+
+    roots = []
+    for node in nodes.values():
+        parent = nodes.get(node.account.parent_id)
+        if parent is None:
+            roots.append(node)
+        else:
+            parent.children.append(node)
+
+    def rollup(node: AccountNode) -> None:
+        for child in node.children:
+            rollup(child)
+            node.debit += child.debit
+            node.credit += child.credit
+
+    if as_of is None:
+        for root in roots:
+            rollup(root)
+
+    return roots
+
+
+def insert_account_links(account: Account) -> None:
+    """Add closure rows for a newly created account."""
+    links = [AccountClosure(ancestor_id=account.pk, descendant_id=account.pk, depth=0)]
+    if account.parent_id is not None:
+        links.extend(
+            AccountClosure(ancestor_id=ancestor_id, descendant_id=account.pk, depth=depth + 1)
+            for ancestor_id, depth in AccountClosure.objects.filter(descendant_id=account.parent_id).values_list('ancestor_id', 'depth')
+        )
+    AccountClosure.objects.bulk_create(links)
+
+
+def move_account_links(account: Account) -> None:
+    """Re-link an account's whole subtree under its current parent."""
+    subtree = list(AccountClosure.objects.filter(ancestor_id=account.pk).values_list('descendant_id', 'depth'))
+    subtree_ids = [descendant_id for descendant_id, _ in subtree]
+    AccountClosure.objects.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+
+    if account.parent_id is None:
+        return
+
+    new_ancestors = AccountClosure.objects.filter(descendant_id=account.parent_id).values_list('ancestor_id', 'depth')
+    AccountClosure.objects.bulk_create([
+        AccountClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=ancestor_depth + descendant_depth + 1)
+        for ancestor_id, ancestor_depth in new_ancestors
+        for descendant_id, descendant_depth in subtree
+    ])
+
+
+def rebuild_account_links(company: Company | None = None) -> None:
+    """Recompute closure rows from the parent pointers, e.g. after accounts were bulk inserted."""
+    accounts = Account.objects.all()
+    if company is not None:
+        accounts = accounts.filter(company=company)
+
+    parents = dict(accounts.values_list('pk', 'parent_id'))
+    links = []
+    for account_id in parents:
+        ancestor_id, depth = account_id, 0
+        while ancestor_id is not None:
+            links.append(AccountClosure(ancestor_id=ancestor_id, descendant_id=account_id, depth=depth))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+
+    with db_transaction.atomic():
+        AccountClosure.objects.filter(descendant_id__in=parents).delete()
+        AccountClosure.objects.bulk_create(links, batch_size=1000)
@@ -1,19 +1,29 @@
 from django.urls import path, include
-from . import views
+from . import api, views
 
 app_name = 'ledger'
 company_relative_urlpatterns = [
     path('', views.company_index, name='company_index'),
     path('qt/create/', views.create_quick_transaction, name='create_quick_transaction'),
     path('qt/submit/', views.submit_quick_transaction, name='submit_quick_transaction'),
+    path('qt/submit/batch/', views.submit_quick_transactions, name='submit_quick_transactions'),
+    path('statement/import/', views.import_bank_statement, name='import_bank_statement'),
     path('account/create/', views.create_account, name='create_account'),
     path('account/<int:pk>/activity/', views.account_overview, name='account_overview'),
+    path('account/<int:pk>/activity/export/', views.export_account_activity, name='export_account_activity'),
+    path('account/<int:pk>/history/', views.balance_history, name='account_balance_history'),
+    path('history/', views.balance_history, name='balance_history'),
     path('transaction/<int:pk>/detail/', views.transaction_detail, name='transaction_detail'),
+    path('reports/', views.reports, name='reports'),
+    path('search/', views.search, name='search'),
+    path('attributes/', views.attribute_report, name='attribute_report'),
     path('rec_trans/from/<int:pk>/', views.create_rec_trans, name='create_rec_trans'),
     path('rec_trans/list/', views.list_rec_trans, name='list_rec_trans'),
     path('rec_trans/<int:rec_trans_pk>/edit/', views.edit_recurring_transaction, name='edit_recurring_transaction'),
     path('transaction/submit/', views.submit_transaction, name='submit_transaction'),
     path('transaction/<int:transaction_pk>/edit/', views.edit_transaction, name='edit_transaction'),
+    path('api/transactions/', api.submit_transactions, name='api_submit_transactions'),
+    path('api/accounts/', api.account_tree, name='api_account_tree'),
 ]
 
 urlpatterns = [
@@ -0,0 +1,47 @@
+from decimal import Decimal
+from typing import Iterable, NamedTuple
+
+from django.core.exceptions import ValidationError
+
+from .models import Account
+
+
+class DetailLine(NamedTuple):
+    account_id: int
+    debit: Decimal
+    credit: Decimal
+
+
+class AccountInfo(NamedTuple):
+    company_id: int
+    kind: int
+
+
+def load_account_info(account_ids: Iterable[int]) -> dict[int, AccountInfo]:
+    """Fetch company and kind for a set of accounts in one query."""
+    return {
+        pk: AccountInfo(company_id, kind)
+        for pk, company_id, kind in Account.objects.filter(pk__in=set(account_ids)).values_list('pk', 'company_id', 'kind')
+    }
+
+
+def validate_detail_lines(lines: Iterable[DetailLine], accounts: dict[int, AccountInfo], company_id: int) -> None:
+    """Check the accounting equation for a set of unsaved detail lines without touching the DB."""
+    assets = Decimal(0)
+    liabilities = Decimal(0)
+    equities = Decimal(0)
+    for line in lines:
+        account = accounts.get(line.account_id)
+        if account is None or account.company_id != company_id:
+            raise ValidationError('All detail lines must use accounts from the same company.')
+
+        match account.kind:
+            case Account.AccountKind.ASSET:
+                assets += line.debit - line.credit
+            case Account.AccountKind.LIABILITY:
+                liabilities += line.credit - line.debit
+            case Account.AccountKind.EQUITY:
+                equities += line.credit - line.debit
+
+    if assets - liabilities != equities:
+        raise ValidationError(f'Detail lines do not balance (i.e., ASSETS({assets}) - LIABILITIES({liabilities}) != EQUITIES({equities})).')
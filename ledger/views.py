@@ -1,16 +1,42 @@
+import datetime
+import io
+import math
+from functools import partial
+
 from django.contrib import messages
 from django.core.exceptions import ValidationError
 from django.db import transaction as db_transaction
-from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest
+from django.http import (HttpRequest, HttpResponse, HttpResponseBadRequest,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
-
-from .forms import (CompanyForm, CreateAccount, CreateQuickTransaction,
-                    CreateRecurringTransaction, RecurringTransactionDetailFormset, RecurringTransactionForm, SubmitQuickTransaction,
-                    TransactionDetailFormset, TransactionForm)
-from .models import (Account, Company, Detail, QuickTransaction,
+from django.utils.dateparse import parse_date
+
+from .activity import ActivityCursor, get_activity_page, iter_activity_csv
+from .attributes import ATTRIBUTE_REPORT_LINES, filter_details, summarize_details
+from .caching import TREE_CACHE_TIMEOUT, cached_account_tree
+from .forms import (AttributeFilterFormset, AttributeReportForm, BatchQuickTransactionFormset, CompanyForm, CreateAccount, CreateQuickTransaction,
+                    CreateRecurringTransaction, ImportStatementForm, RecurringTransactionDetailFormset, RecurringTransactionForm, ReportForm, SearchForm, SubmitQuickTransaction,
+                    TransactionDetailFormset, TransactionForm, get_quick_transaction_choices)
+from .history import Granularity, get_balance_history, get_net_worth_history
+from .importers import import_statement, parse_csv, parse_ofx
+from .models import (Account, Company, QuickTransaction,
                      RecurringTransaction, RecurringTransactionDetail,
-                     Transaction)
+                     Transaction, UserDefinedAttribute)
+from .posting import QuickTransactionEntry, post_quick_transactions
+from .reports import ReportKind, build_report
+from .search import search_notes
+
+
+def parse_as_of(request: HttpRequest) -> datetime.date | None:
+    # optional ?as_of=YYYY-MM-DD; raises ValueError when it is not a valid date
+    value = request.GET.get('as_of')
+    if not value:
+        return None
+    as_of = parse_date(value)
+    if as_of is None:
+        raise ValueError(f'Invalid as_of date: {value!r}')
+    return as_of
 
 
 # Create your views here.
@@ -21,8 +47,19 @@ def index(request: HttpRequest) -> HttpResponse:
 
 def company_index(request: HttpRequest, company_pk: int) -> HttpResponse:
     company = get_object_or_404(Company, pk=company_pk)
-    root_accounts = Account.objects.filter(company=company, parent=None)  # .prefetch_related('children')
-    return render(request, 'ledger/company_index.html', {'root_accounts': root_accounts, 'company': company})
+    try:
+        as_of = parse_as_of(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    # the template only calls this when the rendered tree is not cached either
+    root_nodes = partial(cached_account_tree, company, as_of)
+    return render(request, 'ledger/company_index.html', {
+        'root_nodes': root_nodes,
+        'company': company,
+        'as_of': as_of,
+        'tree_cache_timeout': TREE_CACHE_TIMEOUT,
+    })
 
 
 # view to create quick transaction
@@ -54,38 +91,14 @@ def submit_quick_transaction(request: HttpRequest, company_pk: int) -> HttpRespo
         form = SubmitQuickTransaction(request.POST, company=company)
         if form.is_valid():
             try:
-                with db_transaction.atomic():
-                    quick_transaction: QuickTransaction = form.cleaned_data['quick_transaction']
-                    notes = form.cleaned_data.get('notes')
-
-                    transaction = Transaction(
+                post_quick_transactions(company, [
+                    QuickTransactionEntry(
+                        quick_transaction_id=form.cleaned_data['quick_transaction'].pk,
                         date=form.cleaned_data['date'],
-                        notes=notes,
-                        company=company,
-                    )
-
-                    from_detail = Detail(
-                        transaction=transaction,
-                        account=quick_transaction.account_from,
-                        credit=0 if quick_transaction.account_from_charge_kind == QuickTransaction.ChargeKind.DEBIT else form.cleaned_data['amount'],
-                        debit=0 if quick_transaction.account_from_charge_kind == QuickTransaction.ChargeKind.CREDIT else form.cleaned_data['amount'],
-                        notes=notes,
+                        amount=form.cleaned_data['amount'],
+                        notes=form.cleaned_data.get('notes'),
                     )
-
-                    to_detail = Detail(
-                        transaction=transaction,
-                        account=quick_transaction.account_to,
-                        credit=0 if quick_transaction.account_to_charge_kind == QuickTransaction.ChargeKind.DEBIT else form.cleaned_data['amount'],
-                        debit=0 if quick_transaction.account_to_charge_kind == QuickTransaction.ChargeKind.CREDIT else form.cleaned_data['amount'],
-                        notes=notes,
-                    )
-
-                    transaction.save()
-                    from_detail.save()
-                    to_detail.save()
-                    transaction.full_clean()
-                    from_detail.full_clean()
-                    to_detail.full_clean()
+                ])
             except Exception as e:
                 messages.error(request, 'Unable to submit quick transaction.')
             else:
@@ -96,6 +109,66 @@ def submit_quick_transaction(request: HttpRequest, company_pk: int) -> HttpRespo
 
     return render(request, 'ledger/submit_quick_transaction.html', {'form': form, 'company': company})
 
+# view to submit many quick transactions at once
+def submit_quick_transactions(request: HttpRequest, company_pk: int) -> HttpResponse:
+    company = get_object_or_404(Company, pk=company_pk)
+    form_kwargs = {'quick_transaction_choices': get_quick_transaction_choices(company)}
+    if request.method == 'POST':
+        formset = BatchQuickTransactionFormset(request.POST, form_kwargs=form_kwargs)
+        if formset.is_valid():
+            entries = [
+                QuickTransactionEntry(
+                    quick_transaction_id=data['quick_transaction'],
+                    date=data['date'],
+                    amount=data['amount'],
+                    notes=data.get('notes') or None,
+                )
+                for data in formset.cleaned_data
+                if data
+            ]
+            try:
+                transactions = post_quick_transactions(company, entries)
+            except ValidationError as e:
+                for message in e.messages:
+                    messages.error(request, message)
+            else:
+                messages.success(request, f'Successfully posted {len(transactions)} quick transactions.')
+                return redirect(reverse('ledger:company_index', kwargs={'company_pk': company.pk}))
+    else:
+        formset = BatchQuickTransactionFormset(form_kwargs=form_kwargs)
+
+    return render(request, 'ledger/submit_quick_transactions.html', {'formset': formset, 'company': company})
+
+# view to import a bank statement
+def import_bank_statement(request: HttpRequest, company_pk: int) -> HttpResponse:
+    company = get_object_or_404(Company, pk=company_pk)
+    if request.method == 'POST':
+        form = ImportStatementForm(request.POST, request.FILES, company=company)
+        if form.is_valid():
+            file = io.TextIOWrapper(form.cleaned_data['file'], encoding='utf-8-sig', newline='')
+            match form.cleaned_data['statement_format']:
+                case ImportStatementForm.StatementFormat.CSV:
+                    lines = parse_csv(file)
+                case ImportStatementForm.StatementFormat.OFX:
+                    lines = parse_ofx(file)
+            try:
+                result = import_statement(
+                    company,
+                    lines,
+                    withdrawal_template=form.cleaned_data['withdrawal_template'],
+                    deposit_template=form.cleaned_data['deposit_template'],
+                )
+            except ValidationError as e:
+                form.add_error(None, e)
+                messages.error(request, 'Unable to import statement.')
+            else:
+                messages.success(request, f'Imported {result.created} transactions ({result.duplicates} duplicates, {result.skipped} skipped).')
+                return redirect(reverse('ledger:company_index', kwargs={'company_pk': company.pk}))
+    else:
+        form = ImportStatementForm(company=company)
+
+    return render(request, 'ledger/import_statement.html', {'form': form, 'company': company})
+
 # view to create an account
 def create_account(request: HttpRequest, company_pk: int) -> HttpResponse:
     company = get_object_or_404(Company, pk=company_pk)
@@ -122,31 +195,39 @@ def create_account(request: HttpRequest, company_pk: int) -> HttpResponse:
 # view individual account activity
 def account_overview(request: HttpRequest, company_pk: int, pk: int) -> HttpResponse:
     company = get_object_or_404(Company, pk=company_pk)
-    account = get_object_or_404(Account, pk=pk)
+    account = get_object_or_404(Account.objects.prefetch_related(None).select_related('parent', 'balance_snapshot'), pk=pk)
     if company != account.company:
         return HttpResponseBadRequest('That account does not belong to that company.')
 
-    details = account.get_details()
-    activity = [
-        {
-            'account': detail.account,
-            'credit': detail.credit,
-            'debit': detail.debit,
-            'notes': detail.notes,
-            'transaction': {
-                'pk': detail.transaction_id,
-                'date': detail.transaction.date
-            }
-        }
-        for detail in details
-    ]
-    activity.extend(account.get_all_opening_balance_details())
-    activity.sort(key=lambda record: record.get('date', record.get('transaction', {}).get('date')))
-    balance = 0
-    activity = [data | {
-        'balance': (balance := (balance + data['credit'] - data['debit']) if account.kind != Account.AccountKind.ASSET else (balance + data['debit'] - data['credit']))
-    } for data in activity]
-    return render(request, 'ledger/account_overview.html', {'account': account, 'activity': activity, 'company': company})
+    cursor = request.GET.get('cursor')
+    try:
+        cursor = ActivityCursor.decode(cursor) if cursor else None
+        as_of = parse_as_of(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    activity, next_cursor = get_activity_page(account, cursor, until=as_of)
+    return render(request, 'ledger/account_overview.html', {
+        'account': account,
+        'activity': activity,
+        'children': account.children.prefetch_related(None),
+        'as_of': as_of,
+        'balance': account.balance if as_of is None else account.balance_as_of(as_of),
+        'is_first_page': cursor is None,
+        'next_cursor': next_cursor.encode() if next_cursor is not None else None,
+        'company': company,
+    })
+
+# view to download an account's full activity
+def export_account_activity(request: HttpRequest, company_pk: int, pk: int) -> StreamingHttpResponse:
+    company = get_object_or_404(Company, pk=company_pk)
+    account = get_object_or_404(Account.objects.prefetch_related(None), pk=pk)
+    if company != account.company:
+        return HttpResponseBadRequest('That account does not belong to that company.')
+
+    response = StreamingHttpResponse(iter_activity_csv(account), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="account_{account.key}_activity.csv"'
+    return response
 
 # view transaction detail
 def transaction_detail(request: HttpRequest, company_pk: int, pk: int) -> HttpResponse:
@@ -175,7 +256,7 @@ def submit_transaction(request: HttpRequest, company_pk: int) -> HttpResponse:
 
     if request.method == 'POST':
         transaction_form = TransactionForm(request.POST)
-        formset = TransactionDetailFormset(request.POST, form_kwargs={'company': company})
+        formset = TransactionDetailFormset(request.POST, company=company)
         if transaction_form.is_valid() and formset.is_valid():
             try:
                 with db_transaction.atomic():
@@ -185,11 +266,6 @@ def submit_transaction(request: HttpRequest, company_pk: int) -> HttpResponse:
                     transaction_form.save_m2m()
                     formset.instance = transaction
                     formset.save()
-                    try:
-                        transaction.full_clean()
-                    except ValidationError as e:
-                        transaction_form.add_error(None, e)
-                        raise
             except Exception as e:
                 messages.error(request, 'Unable to save transaction.')
             else:
@@ -200,19 +276,20 @@ def submit_transaction(request: HttpRequest, company_pk: int) -> HttpResponse:
             transaction_form = TransactionForm(initial={
                 'notes': rec_trans.notes
             })
-            formset = TransactionDetailFormset(initial=[
+            initial = [
                 {
                     'debit': detail.debit,
                     'credit': detail.credit,
-                    'account': detail.account,
+                    'account': detail.account_id,
                     'notes': detail.notes
                 }
-                for detail in rec_trans.details.iterator()
-            ], form_kwargs={'company': company})
-            formset.extra = min(formset.extra, rec_trans.details.count() - formset.min_num)
+                for detail in rec_trans.details.all()
+            ]
+            formset = TransactionDetailFormset(initial=initial, company=company)
+            formset.extra = max(len(initial) - formset.min_num, 0)
         else:
             transaction_form = TransactionForm()
-            formset = TransactionDetailFormset(form_kwargs={'company': company})
+            formset = TransactionDetailFormset(company=company)
     
     return render(request, 'ledger/submit_transaction.html', {'transaction_form': transaction_form, 'formset': formset, 'company': company})
 
@@ -258,6 +335,122 @@ def list_rec_trans(request: HttpRequest, company_pk: int) -> HttpResponse:
     return render(request, 'ledger/list_rec_trans.html', {'recs': recs, 'company': company})
 
 
+# view a chart of net worth, or of one account's balance, over time
+def balance_history(request: HttpRequest, company_pk: int, pk: int | None = None) -> HttpResponse:
+    from .charts import balance_history_chart
+
+    company = get_object_or_404(Company, pk=company_pk)
+    granularity = request.GET.get('granularity', Granularity.MONTH)
+    if granularity not in Granularity.values:
+        return HttpResponseBadRequest('Invalid granularity.')
+
+    account = None
+    if pk is None:
+        title = f'{company.name} - Net Worth'
+        history = get_net_worth_history(company, granularity)
+    else:
+        account = get_object_or_404(Account.objects.prefetch_related(None), pk=pk, company=company)
+        title = f'{account} - Balance'
+        history = get_balance_history(account, granularity)
+
+    return render(request, 'ledger/balance_history.html', {
+        'company': company,
+        'account': account,
+        'title': title,
+        'granularity': granularity,
+        'granularities': Granularity.choices,
+        **balance_history_chart(title, history),
+    })
+
+
+# view financial statements for a range of periods
+def reports(request: HttpRequest, company_pk: int) -> HttpResponse:
+    company = get_object_or_404(Company, pk=company_pk)
+    today = datetime.date.today()
+    form = ReportForm(request.GET or {
+        'kind': ReportKind.BALANCE_SHEET,
+        'start': today.replace(month=1, day=1),
+        'end': today,
+        'freq': 'M',
+    })
+
+    report = None
+    if form.is_valid():
+        report = build_report(
+            company,
+            form.cleaned_data['kind'],
+            form.cleaned_data['start'],
+            form.cleaned_data['end'],
+            form.cleaned_data['freq'],
+        )
+
+    rows = []
+    if report is not None:
+        rows = [
+            {
+                'pk': pk,
+                'account': f'{row["key"]} - {row["description"]}',
+                'depth': row['depth'],
+                'amounts': [row[period] for period in report.periods],
+                # a single period has nothing to compare with
+                'change': None if math.isnan(row['change']) else row['change'],
+                'change_pct': None if math.isnan(row['change_pct']) else row['change_pct'],
+            }
+            for pk, row in report.frame.iterrows()
+        ]
+
+    return render(request, 'ledger/reports.html', {'form': form, 'report': report, 'rows': rows, 'company': company})
+
+
+# view to search the notes of transactions, their details and recurring transactions
+def search(request: HttpRequest, company_pk: int) -> HttpResponse:
+    company = get_object_or_404(Company, pk=company_pk)
+    form = SearchForm(request.GET or None, company=company)
+
+    hits = []
+    accounts = {}
+    if form.is_valid():
+        hits = search_notes(
+            company,
+            form.cleaned_data['q'],
+            form.cleaned_data['account'],
+            form.cleaned_data['start'],
+            form.cleaned_data['end'],
+        )
+        accounts = Account.objects.prefetch_related(None).in_bulk({hit.account_id for hit in hits if hit.account_id is not None})
+
+    rows = [{'hit': hit, 'account': accounts.get(hit.account_id)} for hit in hits]
+    return render(request, 'ledger/search.html', {'form': form, 'rows': rows, 'company': company})
+
+
+# view to filter detail lines by their user defined attributes and total them, optionally per attribute value
+def attribute_report(request: HttpRequest, company_pk: int) -> HttpResponse:
+    company = get_object_or_404(Company, pk=company_pk)
+    attributes = UserDefinedAttribute.objects.filter(company=company).order_by('name').in_bulk()
+    form = AttributeReportForm(request.GET or None, attributes=attributes)
+    filters = AttributeFilterFormset(request.GET or None, prefix='filter', form_kwargs={'attributes': attributes})
+
+    totals = group_by = groups = lines = None
+    if form.is_valid() and filters.is_valid():
+        details = filter_details(company, [filter_form.cleaned_data['filter'] for filter_form in filters if filter_form.cleaned_data])
+        totals = summarize_details(details)[0]
+        group_by = attributes.get(form.cleaned_data['group_by'])
+        if group_by is not None:
+            groups = summarize_details(details, group_by)
+        lines = details.select_related('account').order_by('-pk')[:ATTRIBUTE_REPORT_LINES]
+
+    return render(request, 'ledger/attribute_report.html', {
+        'form': form,
+        'filters': filters,
+        'totals': totals,
+        'group_by': group_by,
+        'groups': groups,
+        'lines': lines,
+        'line_limit': ATTRIBUTE_REPORT_LINES,
+        'company': company,
+    })
+
+
 def tax_calculator(request: HttpRequest) -> HttpResponse:
     return render(request, 'ledger/tax_calculator.html')
 
@@ -270,17 +463,12 @@ def edit_transaction(request: HttpRequest, company_pk: int, transaction_pk: int)
 
     if request.method == 'POST':
         transaction_form = TransactionForm(request.POST, instance=transaction)
-        formset = TransactionDetailFormset(request.POST, instance=transaction, form_kwargs={'company': company})
+        formset = TransactionDetailFormset(request.POST, instance=transaction, company=company)
         if transaction_form.is_valid() and formset.is_valid():
             try:
                 with db_transaction.atomic():
                     transaction_form.save()
                     formset.save()
-                    try:
-                        transaction.full_clean()
-                    except ValidationError as e:
-                        transaction_form.add_error(None, e)
-                        raise
             except Exception as e:
                 messages.error(request, 'Unable to save transaction.')
             else:
@@ -289,7 +477,7 @@ def edit_transaction(request: HttpRequest, company_pk: int, transaction_pk: int)
 
     else:
         transaction_form = TransactionForm(instance=transaction)
-        formset = TransactionDetailFormset(instance=transaction, form_kwargs={'company': company})
+        formset = TransactionDetailFormset(instance=transaction, company=company)
 
     return render(request, 'ledger/edit_transaction.html', {'company': company, 'transaction_form': transaction_form, 'formset': formset})
 
@@ -302,17 +490,12 @@ def edit_recurring_transaction(request: HttpRequest, company_pk: int, rec_trans_
 
     if request.method == 'POST':
         transaction_form = RecurringTransactionForm(request.POST, instance=rec_trans)
-        formset = RecurringTransactionDetailFormset(request.POST, instance=rec_trans)
+        formset = RecurringTransactionDetailFormset(request.POST, instance=rec_trans, company=company)
         if transaction_form.is_valid() and formset.is_valid():
             try:
                 with db_transaction.atomic():
                     transaction_form.save()
                     formset.save()
-                    try:
-                        rec_trans.full_clean()
-                    except ValidationError as e:
-                        transaction_form.add_error(None, e)
-                        raise
             except Exception as e:
                 messages.error(request, 'Unable to save rec_trans.')
             else:
@@ -321,7 +504,7 @@ def edit_recurring_transaction(request: HttpRequest, company_pk: int, rec_trans_
 
     else:
         transaction_form = RecurringTransactionForm(instance=rec_trans)
-        formset = RecurringTransactionDetailFormset(instance=rec_trans)
+        formset = RecurringTransactionDetailFormset(instance=rec_trans, company=company)
 
     return render(request, 'ledger/edit_recurring_transaction.html', {'company': company, 'transaction_form': transaction_form, 'formset': formset})
 
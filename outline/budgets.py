@@ -0,0 +1,92 @@
+import datetime
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+from django.db.models import F
+
+from ledger.models import Account, AccountPeriodDelta, Company
+from ledger.money import as_cents
+from ledger.reports import KIND_SIGNS, load_accounts_frame, load_closure_frame
+
+from .models import BudgetLine
+
+
+class BudgetReport(NamedTuple):
+    periods: list[str]
+    # one row per income/expense account in key order, one column per period; subtree totals, signed like the
+    # income statement
+    budget: pd.DataFrame
+    actual: pd.DataFrame
+    # per account over all periods: key, description, depth, budget, actual, variance (actual - budget, so
+    # positive is favourable for income and expenses alike), used_pct and projected (actual at the current
+    # burn rate, extended to the end of the last period)
+    summary: pd.DataFrame
+
+
+def elapsed_fraction(start: datetime.date, end: datetime.date, today: datetime.date) -> float:
+    # share of the days from start through end that have passed by the end of today
+    days = (end - start).days + 1
+    return min(max((today - start).days + 1, 0), days) / days
+
+
+def month_frame(rows: list[tuple[int, datetime.date, int]], closure: pd.DataFrame, periods: pd.PeriodIndex) -> pd.DataFrame:
+    """Sum (account, month, cents) rows into account subtree (rows) by period (columns) totals in cents."""
+    frame = pd.DataFrame.from_records(rows, columns=['account_id', 'month', 'amount'])
+    frame['amount'] = frame['amount'].astype('int64')
+    frame['period'] = pd.to_datetime(frame['month']).dt.to_period(periods.freq)
+    subtree = (
+        frame
+        .merge(closure, left_on='account_id', right_on='descendant_id')
+        .groupby(['ancestor_id', 'period'])['amount']
+        .sum()
+        .unstack('period')
+    )
+    return subtree.reindex(columns=periods, fill_value=0).fillna(0).astype('int64')
+
+
+def build_budget_report(company: Company, start: datetime.date, end: datetime.date, freq: str = 'M', today: datetime.date | None = None) -> BudgetReport:
+    """
+    Compare the budget of every income and expense account of a company with its actual change, for the
+    periods from the month of `start` through the month of `end`.
+
+    Actuals come from the monthly balance history buckets and budgets from their own table, one query each;
+    both are rolled up the account tree with the closure table, so a parent's figures cover its subtree.
+    """
+    today = today or datetime.date.today()
+    periods = pd.period_range(start=start, end=end, freq=freq)
+    first_day = periods[0].start_time.date()
+    last_day = periods[-1].end_time.date()
+
+    accounts = load_accounts_frame(company)
+    accounts = accounts[accounts['kind'] == Account.AccountKind.EQUITY]
+    closure = load_closure_frame(company)
+
+    deltas = (
+        AccountPeriodDelta.objects
+        .filter(account__company=company, granularity=AccountPeriodDelta.Granularity.MONTH, period__range=(first_day, last_day))
+        .values_list('account_id', 'period', as_cents(F('debit') - F('credit')))
+    )
+    sign = KIND_SIGNS[Account.AccountKind.EQUITY]
+    actual = month_frame([(account_id, period, sign * cents) for account_id, period, cents in deltas], closure, periods)
+    lines = BudgetLine.objects.filter(account__company=company, period__range=(first_day, last_day)).values_list('account_id', 'period', as_cents(F('amount')))
+    budget = month_frame(list(lines), closure, periods)
+
+    # totals stay integer cents until they are turned into amounts for display
+    labels = [str(period) for period in periods]
+    frames = []
+    for frame in (budget, actual):
+        frame = frame.reindex(index=accounts.index, fill_value=0).fillna(0).astype('int64')
+        frame.columns = labels
+        frames.append(frame.loc[accounts.sort_values('key').index])
+    budget, actual = frames
+
+    summary = accounts.loc[budget.index, ['key', 'description', 'depth']].copy()
+    summary['budget'] = budget.sum(axis=1) / 100
+    summary['actual'] = actual.sum(axis=1) / 100
+    summary['variance'] = (actual.sum(axis=1) - budget.sum(axis=1)) / 100
+    summary['used_pct'] = (summary['actual'] / summary['budget'].replace(0, np.nan) * 100).round(1)
+    elapsed = elapsed_fraction(first_day, last_day, today)
+    summary['projected'] = (summary['actual'] / elapsed).round(2) if elapsed else np.nan
+
+    return BudgetReport(labels, budget / 100, actual / 100, summary)
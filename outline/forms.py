@@ -0,0 +1,43 @@
+from typing import Any
+
+from django import forms
+
+from ledger.models import Account, Company
+from ledger.reports import FREQUENCIES
+
+from .models import BudgetLine
+
+MONTH_FORMATS = ['%Y-%m']
+
+
+class BudgetReportForm(forms.Form):
+    start = forms.DateField(input_formats=MONTH_FORMATS, widget=forms.DateInput(attrs={'type': 'month'}, format='%Y-%m'))
+    end = forms.DateField(input_formats=MONTH_FORMATS, widget=forms.DateInput(attrs={'type': 'month'}, format='%Y-%m'))
+    freq = forms.ChoiceField(choices=FREQUENCIES, label='Period')
+
+    def clean(self) -> dict[str, Any]:
+        cleaned_data = super().clean()
+        if cleaned_data.get('start') and cleaned_data.get('end') and cleaned_data['start'] > cleaned_data['end']:
+            raise forms.ValidationError('Start month must not be after end month.')
+        return cleaned_data
+
+
+class BudgetLineForm(forms.ModelForm):
+    class Meta:
+        model = BudgetLine
+        fields = ['account', 'period', 'amount']
+        widgets = {
+            'period': forms.DateInput(attrs={'type': 'month'}, format='%Y-%m'),
+        }
+        help_texts = {
+            'amount': 'Income positive, expenses negative',
+        }
+
+    def __init__(self, *args, company: Company, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['account'].queryset = Account.objects.filter(company=company, kind=Account.AccountKind.EQUITY).prefetch_related(None)
+        self.fields['period'].input_formats = MONTH_FORMATS
+
+    def validate_unique(self) -> None:
+        # an existing line for the month is replaced rather than rejected
+        pass
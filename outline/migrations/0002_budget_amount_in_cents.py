@@ -0,0 +1,24 @@
+# Generated by Django 4.0.3 on 2026-10-18 15:10
+
+from django.db import migrations
+import ledger.money
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ledger', '0029_money_in_cents'),
+        ('outline', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'UPDATE outline_budgetline SET amount = CAST(ROUND(amount * 100) AS INTEGER)',
+            'UPDATE outline_budgetline SET amount = amount / 100.0',
+        ),
+        migrations.AlterField(
+            model_name='budgetline',
+            name='amount',
+            field=ledger.money.MoneyField(max_digits=12),
+        ),
+    ]
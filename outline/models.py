@@ -1,3 +1,32 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 
-# Create your models here.
+from ledger.models import Account
+from ledger.money import MoneyField
+
+
+class BudgetLine(models.Model):
+    # planned change of an income or expense account (and everything below it) within one month, signed like the
+    # income statement: income positive, expenses negative
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='budget_lines')
+    # first day of the month
+    period = models.DateField()
+    amount = MoneyField(max_digits=12)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['account', 'period'],
+                name='budget_line_unique_month',
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f'BudgetLine(account={self.account_id}, period={self.period}, amount={self.amount})'
+
+    def clean(self) -> None:
+        if self.account_id is not None and self.account.kind != Account.AccountKind.EQUITY:
+            raise ValidationError('Only income and expense (equity) accounts can be budgeted.')
+        if self.period is not None and self.period.day != 1:
+            raise ValidationError('A budget period starts on the first day of a month.')
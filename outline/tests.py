@@ -1,3 +1,90 @@
+import datetime
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+
+from ledger.models import Account, Company, Detail, Transaction
+
+from .budgets import build_budget_report
+from .models import BudgetLine
+
+
+def post_transaction(company: Company, lines: list[tuple[Account, str, str]], date: datetime.date) -> Transaction:
+    transaction = Transaction.objects.create(company=company, date=date)
+    for account, debit, credit in lines:
+        Detail.objects.create(transaction=transaction, account=account, debit=Decimal(debit), credit=Decimal(credit))
+    return transaction
+
+
+class BudgetTests(TestCase):
+    def setUp(self) -> None:
+        self.company = Company.objects.create(name='Test Co')
+        Kind = Account.AccountKind
+        self.cash = Account.objects.create(company=self.company, key='10000', description='Cash', kind=Kind.ASSET, is_leaf=True)
+        self.equity = Account.objects.create(company=self.company, key='30000', description='Equity', kind=Kind.EQUITY)
+        self.income = Account.objects.create(company=self.company, key='31000', description='Income', kind=Kind.EQUITY, parent=self.equity, is_leaf=True)
+        self.expenses = Account.objects.create(company=self.company, key='32000', description='Expenses', kind=Kind.EQUITY, parent=self.equity)
+        self.groceries = Account.objects.create(company=self.company, key='32100', description='Groceries', kind=Kind.EQUITY, parent=self.expenses, is_leaf=True)
+        self.rent = Account.objects.create(company=self.company, key='32200', description='Rent', kind=Kind.EQUITY, parent=self.expenses, is_leaf=True)
+
+        post_transaction(self.company, [(self.cash, '1000.00', '0'), (self.income, '0', '1000.00')], datetime.date(2022, 1, 31))
+        post_transaction(self.company, [(self.groceries, '120.00', '0'), (self.cash, '0', '120.00')], datetime.date(2022, 1, 10))
+        post_transaction(self.company, [(self.rent, '500.00', '0'), (self.cash, '0', '500.00')], datetime.date(2022, 1, 1))
+        post_transaction(self.company, [(self.groceries, '30.00', '0'), (self.cash, '0', '30.00')], datetime.date(2022, 2, 3))
+        for account, amount in [(self.income, '1000.00'), (self.groceries, '-100.00'), (self.rent, '-500.00')]:
+            for month in (1, 2):
+                BudgetLine.objects.create(account=account, period=datetime.date(2022, month, 1), amount=Decimal(amount))
+
+    def test_budget_versus_actual(self):
+        with self.assertNumQueries(4):
+            report = build_budget_report(self.company, datetime.date(2022, 1, 1), datetime.date(2022, 2, 1), today=datetime.date(2022, 1, 31))
+
+        self.assertEqual(report.periods, ['2022-01', '2022-02'])
+        self.assertNotIn(self.cash.pk, report.summary.index)
+        self.assertEqual(list(report.budget.loc[self.expenses.pk]), [-600.0, -600.0])
+        self.assertEqual(list(report.actual.loc[self.groceries.pk]), [-120.0, -30.0])
+
+        groceries = report.summary.loc[self.groceries.pk]
+        self.assertEqual((groceries['budget'], groceries['actual'], groceries['variance']), (-200.0, -150.0, 50.0))
+        self.assertEqual(groceries['used_pct'], 75.0)
+        # 31 of 59 days have passed
+        self.assertEqual(groceries['projected'], round(-150 / (31 / 59), 2))
+        self.assertEqual(report.summary.loc[self.equity.pk, 'actual'], 350.0)
+
+    def test_quarterly_periods_and_empty_range(self):
+        report = build_budget_report(self.company, datetime.date(2022, 1, 1), datetime.date(2022, 6, 30), freq='Q', today=datetime.date(2021, 12, 1))
+        self.assertEqual(report.periods, ['2022Q1', '2022Q2'])
+        self.assertEqual(list(report.budget.loc[self.income.pk]), [2000.0, 0.0])
+        self.assertTrue(report.summary['projected'].isna().all())
+
+        report = build_budget_report(self.company, datetime.date(2023, 1, 1), datetime.date(2023, 1, 1))
+        self.assertEqual(report.summary['actual'].sum(), 0)
+
+    def test_budget_page_sets_lines(self):
+        url = reverse('outline:budget_report', kwargs={'company_pk': self.company.pk})
+        response = self.client.get(url, {'start': '2022-01', 'end': '2022-02', 'freq': 'M'})
+        self.assertContains(response, '32100 - Groceries')
+        self.assertEqual(len(response.context['rows']), 5)
+
+        response = self.client.post(f'{url}?start=2022-01&end=2022-02&freq=M', {'account': self.groceries.pk, 'period': '2022-02', 'amount': '-80.00'})
+        self.assertRedirects(response, f'{url}?start=2022-01&end=2022-02&freq=M')
+        self.assertEqual(BudgetLine.objects.get(account=self.groceries, period=datetime.date(2022, 2, 1)).amount, Decimal('-80.00'))
+
+        response = self.client.post(url, {'account': self.cash.pk, 'period': '2022-02', 'amount': '1.00'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(BudgetLine.objects.filter(account=self.cash).exists())
+
+    def test_budget_lines_are_backed_up(self):
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('backup', directory=Path(directory), stdout=StringIO())
+            BudgetLine.objects.filter(account=self.rent).delete()
+            BudgetLine.objects.filter(account=self.income).update(amount=Decimal('1.00'))
+            call_command('restore', directory=Path(directory), stdout=StringIO())
 
-# Create your tests here.
+        self.assertEqual(BudgetLine.objects.count(), 6)
+        self.assertEqual(set(BudgetLine.objects.filter(account=self.income).values_list('amount', flat=True)), {Decimal('1000.00')})
@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+app_name = 'outline'
+
+urlpatterns = [
+    path('company/<int:company_pk>/budget/', views.budget_report, name='budget_report'),
+]
@@ -1,3 +1,63 @@
-from django.shortcuts import render
+import datetime
 
-# Create your views here.
+from django.contrib import messages
+from django.http import HttpRequest, HttpResponse
+from django.shortcuts import get_object_or_404, redirect, render
+
+from ledger.models import Company
+
+from .budgets import build_budget_report
+from .forms import BudgetLineForm, BudgetReportForm
+from .models import BudgetLine
+
+
+# view to compare budgets with actuals for every income and expense account, and to set a month's budget
+def budget_report(request: HttpRequest, company_pk: int) -> HttpResponse:
+    company = get_object_or_404(Company, pk=company_pk)
+    today = datetime.date.today()
+
+    if request.method == 'POST':
+        line_form = BudgetLineForm(request.POST, company=company)
+        if line_form.is_valid():
+            BudgetLine.objects.update_or_create(
+                account=line_form.cleaned_data['account'],
+                period=line_form.cleaned_data['period'],
+                defaults={'amount': line_form.cleaned_data['amount']},
+            )
+            messages.success(request, 'Saved budget.')
+            return redirect(request.get_full_path())
+    else:
+        line_form = BudgetLineForm(company=company, initial={'period': today.replace(day=1)})
+
+    form = BudgetReportForm(request.GET or {
+        'start': today.strftime('%Y-01'),
+        'end': today.strftime('%Y-12'),
+        'freq': 'M',
+    })
+
+    report = None
+    rows = []
+    if form.is_valid():
+        report = build_budget_report(company, form.cleaned_data['start'], form.cleaned_data['end'], form.cleaned_data['freq'], today)
+        rows = [
+            {
+                'pk': pk,
+                'account': f'{row["key"]} - {row["description"]}',
+                'depth': row['depth'],
+                'periods': list(zip(report.budget.loc[pk], report.actual.loc[pk])),
+                'budget': row['budget'],
+                'actual': row['actual'],
+                'variance': row['variance'],
+                'used_pct': row['used_pct'],
+                'projected': row['projected'],
+            }
+            for pk, row in report.summary.iterrows()
+        ]
+
+    return render(request, 'outline/budget_report.html', {
+        'form': form,
+        'line_form': line_form,
+        'report': report,
+        'rows': rows,
+        'company': company,
+    })